@@ -0,0 +1,14 @@
+"""
+    Headless benchmarks, run from the repository root, e.g.
+        
+        python -m bench.scopes
+        python -m bench.frames
+    
+    The editor modules live in src/ and import each other as top level modules, so src/ is put on sys.path here.
+"""
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
@@ -0,0 +1,60 @@
+"""
+    Build time and query times of the connectivity index (see src/connectivity.py) on synthetic designs. A design with
+    n instances of the default leaf has about 6 n edges (3 wires and 3 input -> output cells per instance), so
+    --instances 170000 is about a million edges.
+        
+        python -m bench.connectivity [--instances 10000,170000] [--repeat N]
+    
+    Cones are one breadth first search with scipy installed, frontier by frontier in numpy otherwise; both are
+    reported as the engine in use.
+"""
+import argparse
+import time
+import timeit
+from typing import Dict, List
+
+from bench.synthetic import generate
+import connectivity
+
+
+def run(instances: List[int], repeat: int, seed: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for n in instances:
+        structure = generate(n, seed = seed)
+        start = time.perf_counter()
+        index = connectivity.ConnectivityIndex(structure)
+        build = time.perf_counter() - start
+        
+        top_out = index.vertex_of_pin((), (("io", "out0"), "out0"))
+        top_in = index.vertex_of_pin((), (("io", "in0"), "in0"))
+        middle = index.vertex_of_pin((), (("subs", f"u{n // 2}"), "i0"))
+        queries = {
+            "trace_driver": lambda: index.trace_driver(middle),
+            "trace_sinks": lambda: index.trace_sinks(middle),
+            "fan_in": lambda: index.cone([top_out], False),
+            "fan_out": lambda: index.cone([top_in], True),
+        }
+        metrics = {"edges": index.edge_count, "vertices": index.vertex_count, "build_s": build, "mib": index.nbytes() / 2 ** 20}
+        for name, query in queries.items():
+            metrics[f"{name}_ms"] = min(timeit.repeat(query, number = 1, repeat = repeat)) * 1000
+        results[f"{n} instances"] = metrics
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--instances", default = "10000,170000", help = "comma separated design sizes (substructure instances)")
+    parser.add_argument("--repeat", type = int, default = 5)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+    
+    print(f"engine: {'scipy' if connectivity.breadth_first_order is not None else 'numpy'}")
+    results = run([int(n) for n in args.instances.split(",")], args.repeat, args.seed)
+    
+    print(f"{'case':20s} {'edges':>8s} {'build s':>8s} {'MiB':>6s} {'driver ms':>9s} {'sinks ms':>9s} {'fan-in ms':>9s} {'fan-out ms':>10s}")
+    for case, m in results.items():
+        print(f"{case:20s} {m['edges']:8d} {m['build_s']:8.2f} {m['mib']:6.1f} {m['trace_driver_ms']:9.2f} {m['trace_sinks_ms']:9.2f} {m['fan_in_ms']:9.2f} {m['fan_out_ms']:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
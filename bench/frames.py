@@ -0,0 +1,169 @@
+"""
+    Per-frame cost of StructureEditor.gui on synthetic designs, against the recording imgui stub (bench.stub_imgui), so
+    it runs without a display. For every design size and zoom level it reports the wall time per frame, the memory
+    allocated within a frame (tracemalloc peak), the blocks still allocated after the frames (leaks) and the imgui /
+    node editor calls per submitted node.
+        
+        python -m bench.frames [--instances 1000,10000] [--frames N] [--renderer stack|fast] [--json out.json]
+        python -m bench.frames --baseline bench_baseline.json [--tolerance 1.25]
+    
+    With --baseline the run fails (exit code 1) if a metric got worse than baseline * tolerance. Calls per node do not
+    depend on the machine, so they are the reliable check on shared CI runners; times are compared as well.
+"""
+import argparse
+import gc
+import json
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+from bench import stub_imgui
+stub_imgui.install()
+
+from bench.synthetic import generate
+import layout
+import layout_store
+from structure_editor import StructureEditor
+
+
+RECORDER = stub_imgui.RECORDER
+ZOOMS = {"detailed": 1.0, "boxes": 4.0} # inverse view scales, see StructureEditor.LOD_INV_SCALE
+
+
+def warm_up(editor: StructureEditor, timeout: float = 120.0):
+    # frames until the layout is applied and every node has been measured once
+    deadline = time.perf_counter() + timeout
+    while True:
+        editor.gui()
+        if editor.layout_future is None and editor.layout_view_model is editor.view_model and not editor.node_rects.unmeasured:
+            break
+        if time.perf_counter() > deadline:
+            raise TimeoutError("editor did not settle, layout still running or nodes never measured")
+        time.sleep(0.001)
+    editor.gui()
+
+
+def center_view(editor: StructureEditor, zoom: float):
+    # looks at the middle of the laid out design, like after navigating there
+    rects = editor.node_rects.rects
+    x = statistics.median(r[0] for r in rects)
+    y = statistics.median(r[1] for r in rects)
+    RECORDER.zoom = zoom
+    RECORDER.view_origin = (x - RECORDER.view_size[0] * zoom * 0.5, y - RECORDER.view_size[1] * zoom * 0.5)
+
+
+def measure(editor: StructureEditor, frames: int) -> Dict[str, float]:
+    # time
+    gc.collect()
+    times = []
+    for _ in range(frames):
+        t = time.perf_counter()
+        editor.gui()
+        times.append(time.perf_counter() - t)
+    
+    # calls, of one frame
+    RECORDER.reset_calls()
+    editor.gui()
+    calls = RECORDER.calls.copy()
+    nodes = max(calls["imgui_node_editor.begin_node"], 1)
+    
+    # memory
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    peaks = []
+    for _ in range(min(frames, 10)):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        editor.gui()
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    gc.collect()
+    
+    return {
+        "ms_per_frame": statistics.median(times) * 1e3,
+        "ms_per_frame_p95": sorted(times)[int(0.95 * (len(times) - 1))] * 1e3,
+        "nodes_submitted": calls["imgui_node_editor.begin_node"],
+        "links_submitted": calls["imgui_node_editor.link"],
+        "calls_per_frame": sum(calls.values()),
+        "calls_per_node": sum(calls.values()) / nodes,
+        "kib_allocated_per_frame": statistics.median(peaks) / 1024,
+        "blocks_leaked": max(sys.getallocatedblocks() - blocks, 0),
+    }
+
+
+def run(instances: List[int], frames: int, seed: int, clock: bool = False, renderer: str = StructureEditor.RENDERER_STACK) -> Dict[str, Dict[str, float]]:
+    results = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        layout.set_default_engine(layout.LayoutEngine(cache_dir = cache_dir)) # no stale or shared layout cache
+        layout_store.set_default_store(layout_store.LayoutStore(store_dir = cache_dir))
+        for n in instances:
+            t = time.perf_counter()
+            structure = generate(n, clock = clock, seed = seed)
+            t_generate = time.perf_counter() - t
+            
+            RECORDER.zoom, RECORDER.view_origin = 1.0, (0.0, 0.0)
+            RECORDER.node_positions.clear()
+            editor = StructureEditor(structure)
+            editor.renderer = renderer
+            t = time.perf_counter()
+            warm_up(editor)
+            t_warm_up = time.perf_counter() - t
+            print(f"{n} instances: generated in {t_generate:.2f} s, view model + layout + first measurement in {t_warm_up:.2f} s", file = sys.stderr)
+            
+            for zoom_name, zoom in ZOOMS.items():
+                center_view(editor, zoom)
+                editor.gui() # nodes entering the view
+                results[f"{n}/{zoom_name}"] = measure(editor, frames)
+            del editor
+        layout.default_engine().shutdown()
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    checked = ("ms_per_frame", "calls_per_node", "kib_allocated_per_frame")
+    regressions = []
+    for case, metrics in results.items():
+        for metric in checked:
+            old = baseline.get(case, {}).get(metric)
+            if old is not None and metrics[metric] > old * tolerance + 1e-9:
+                regressions.append(f"{case} {metric}: {metrics[metric]:.3f} > {old:.3f} * {tolerance}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--instances", default = "1000,10000", help = "comma separated design sizes (substructure instances)")
+    parser.add_argument("--frames", type = int, default = 30)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--clock", action = "store_true", help = "add a clock net driving every instance")
+    parser.add_argument("--renderer", default = StructureEditor.RENDERER_STACK, choices = (StructureEditor.RENDERER_STACK, StructureEditor.RENDERER_FAST))
+    parser.add_argument("--json", help = "write the results to this file, e.g. to be used as a baseline later")
+    parser.add_argument("--baseline", help = "results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type = float, default = 1.25)
+    args = parser.parse_args()
+    
+    results = run([int(n) for n in args.instances.split(",")], args.frames, args.seed, args.clock, args.renderer)
+    
+    print(f"{'case':20s} {'ms/frame':>9s} {'p95':>7s} {'nodes':>6s} {'links':>6s} {'calls/node':>10s} {'KiB/frame':>9s} {'leaked':>7s}")
+    for case, m in results.items():
+        print(f"{case:20s} {m['ms_per_frame']:9.2f} {m['ms_per_frame_p95']:7.2f} {m['nodes_submitted']:6d} {m['links_submitted']:6d} {m['calls_per_node']:10.1f} {m['kib_allocated_per_frame']:9.1f} {m['blocks_leaked']:7d}")
+    
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent = 4)
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file = sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+    Per-frame cost of the create/delete scopes in ed_ctx, compared with the sys.settrace based scope skipping they
+    replaced (kept below verbatim as _Legacy*). Runs against bench.stub_imgui, so only the Python side is measured.
+        
+        python -m bench.scopes [--frames N]
+"""
+import argparse
+import sys
+import timeit
+
+from bench import stub_imgui
+stub_imgui.install()
+
+from imgui_bundle import imgui_node_editor as ed # type: ignore
+import ed_ctx
+
+
+"""
+    the replaced implementation
+"""
+class _LegacyAbortable:
+    class AbortException(Exception): pass
+    
+    def _trace(self, frame, event, arg):
+        sys.settrace(None)
+        raise _LegacyAbortable.AbortException()
+    
+    def set_abort_hook(self):
+        sys.settrace(lambda *args, **keys: None)
+        f = sys._getframe(0)
+        while f.f_locals.get("self") is self:
+            f = f.f_back
+        f.f_trace = self._trace
+
+class _LegacyBeginEndCreate(_LegacyAbortable):
+    def __enter__(self):
+        if not ed.begin_create():
+            self.set_abort_hook()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is _LegacyAbortable.AbortException:
+            return True
+        
+        ed.end_create()
+
+class _LegacyQueryNewLink(_LegacyAbortable):
+    def __enter__(self):
+        input_pin_id, output_pin_id = ed.PinId(), ed.PinId()
+        if not ed.query_new_link(input_pin_id, output_pin_id):
+            self.set_abort_hook()
+        if not input_pin_id or not output_pin_id:
+            self.set_abort_hook()
+        return input_pin_id, output_pin_id
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is _LegacyAbortable.AbortException:
+            return True
+
+
+"""
+    one frame worth of link creation handling, as in StructureEditor.gui
+"""
+def frame_legacy():
+    with _LegacyBeginEndCreate():
+        with _LegacyQueryNewLink() as (input_pin_id, output_pin_id):
+            if ed.accept_new_item():
+                pass
+
+def frame_current():
+    with ed_ctx.on_create() as creating:
+        if creating:
+            new_link = ed_ctx.new_link()
+            if new_link is not None:
+                input_pin_id, output_pin_id = new_link
+                if ed.accept_new_item():
+                    pass
+
+
+def measure(frame, frames: int) -> float:
+    return min(timeit.repeat(frame, number = frames, repeat = 5)) / frames * 1e9 # ns per frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type = int, default = 100000)
+    args = parser.parse_args()
+    
+    for label, begin_create in (("idle (begin_create() is False)", False), ("creating, no link hovered", True)):
+        ed.begin_create = lambda *a, result = begin_create: result
+        legacy = measure(frame_legacy, args.frames)
+        current = measure(frame_current, args.frames)
+        print(f"{label:32s} legacy {legacy:8.0f} ns/frame   current {current:8.0f} ns/frame   x{legacy / current:.1f}")
+    
+    # the legacy scopes also drop any tracer (coverage, debuggers) installed by someone else
+    tracer = lambda *args: None
+    ed.begin_create = lambda *a: False
+    for label, frame in (("legacy", frame_legacy), ("current", frame_current)):
+        sys.settrace(tracer)
+        frame()
+        kept = sys.gettrace() is tracer
+        sys.settrace(None)
+        print(f"{label:8s} keeps an installed sys.settrace tracer: {kept}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import sys
+import types
+from collections import Counter
+from typing import Dict, Tuple
+
+
+"""
+    Recording stand-in for imgui_bundle (imgui, imgui_ctx, imgui_node_editor, hello_imgui), enough to import and
+    drive ed_ctx and StructureEditor without a window or a GPU. Every call is counted in RECORDER.calls; functions
+    that are not defined explicitly are no-ops returning None. The node editor part keeps node positions so that
+    culling and layout behave as with the real editor.
+"""
+class ImVec2:
+    __slots__ = ("x", "y")
+    
+    def __init__(self, x: float = 0.0, y: float = 0.0):
+        self.x = x
+        self.y = y
+    
+    def __add__(self, other):
+        return ImVec2(self.x + other.x, self.y + other.y)
+    
+    def __sub__(self, other):
+        return ImVec2(self.x - other.x, self.y - other.y)
+
+
+class ImVec4:
+    __slots__ = ("x", "y", "z", "w")
+    
+    def __init__(self, x: float = 0.0, y: float = 0.0, z: float = 0.0, w: float = 0.0):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.w = w
+
+
+class _ObjectId:
+    __slots__ = ("value",)
+    
+    def __init__(self, value: int = 0):
+        self.value = value
+    
+    def id(self) -> int:
+        return self.value
+    
+    def __bool__(self):
+        return self.value != 0
+
+
+class _Enum:
+    def __getattr__(self, name: str) -> int:
+        return 0
+
+
+class _Style:
+    node_border_width = 1.0
+    node_rounding = 8.0
+
+
+"""
+    call counting and the bits of node editor state the editor reads back
+"""
+class Recorder:
+    calls: Counter
+    
+    zoom: float # value returned by ed.get_current_zoom(), i.e. the inverse of the view scale
+    view_size: Tuple[float, float]
+    view_origin: Tuple[float, float] # canvas position of the top left corner of the editor
+    
+    node_positions: Dict[int, Tuple[float, float]]
+    node_size: Tuple[float, float]
+    current_node: int
+    
+    def __init__(self):
+        self.calls = Counter()
+        self.zoom = 1.0
+        self.view_size = (1280.0, 720.0)
+        self.view_origin = (0.0, 0.0)
+        self.node_positions = {}
+        self.node_size = (160.0, 90.0)
+        self.current_node = 0
+    
+    def reset_calls(self):
+        self.calls = Counter()
+    
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+RECORDER = Recorder()
+
+
+class _Scope:
+    __slots__ = ("name",)
+    
+    def __init__(self, name: str):
+        self.name = name
+    
+    def __enter__(self):
+        RECORDER.calls[self.name] += 1
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class _DrawList:
+    def __getattr__(self, name: str):
+        key = f"draw_list.{name}"
+        def record(*args, **kwargs):
+            RECORDER.calls[key] += 1
+        return record
+
+_DRAW_LIST = _DrawList()
+
+
+def _recorded(module_name: str, name: str, result = None):
+    key = f"{module_name}.{name}"
+    if callable(result):
+        def record(*args, **kwargs):
+            RECORDER.calls[key] += 1
+            return result(*args, **kwargs)
+    else:
+        def record(*args, **kwargs):
+            RECORDER.calls[key] += 1
+            return result
+    return record
+
+
+class _StubModule(types.ModuleType):
+    def __getattr__(self, name: str):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        function = _recorded(self.__name__.rsplit(".", 1)[-1], name)
+        setattr(self, name, function) # cache, so later lookups are plain attribute hits
+        return function
+
+
+def _define(module: _StubModule, name: str, result):
+    setattr(module, name, _recorded(module.__name__.rsplit(".", 1)[-1], name, result))
+
+
+"""
+    node editor state
+"""
+def _begin_node(node_id):
+    RECORDER.current_node = node_id.id()
+
+def _end_node():
+    RECORDER.current_node = 0
+
+def _get_cursor_screen_pos() -> ImVec2:
+    # inside a node: its position plus the node padding, like imgui-node-editor places the content
+    if RECORDER.current_node:
+        x, y = RECORDER.node_positions.get(RECORDER.current_node, (0.0, 0.0))
+        return ImVec2(x + 8.0, y + 4.0)
+    return ImVec2(0.0, 0.0)
+
+def _get_node_position(node_id) -> ImVec2:
+    x, y = RECORDER.node_positions.get(node_id.id(), (0.0, 0.0))
+    return ImVec2(x, y)
+
+def _set_node_position(node_id, position):
+    RECORDER.node_positions[node_id.id()] = (position.x, position.y)
+
+def _get_node_size(node_id) -> ImVec2:
+    return ImVec2(*RECORDER.node_size)
+
+def _screen_to_canvas(position) -> ImVec2:
+    return ImVec2(RECORDER.view_origin[0] + position.x * RECORDER.zoom, RECORDER.view_origin[1] + position.y * RECORDER.zoom)
+
+
+def install() -> types.ModuleType:
+    # registers the stub as imgui_bundle in sys.modules, must run before anything imports imgui_bundle
+    imgui_bundle = _StubModule("imgui_bundle")
+    imgui = _StubModule("imgui_bundle.imgui")
+    imgui_ctx = _StubModule("imgui_bundle.imgui_ctx")
+    ed = _StubModule("imgui_bundle.imgui_node_editor")
+    hello_imgui = _StubModule("imgui_bundle.hello_imgui")
+    pfd = _StubModule("imgui_bundle.portable_file_dialogs")
+    
+    # imgui
+    imgui.ImVec2 = imgui.ImVec2Like = ImVec2
+    imgui.ImVec4 = imgui.ImVec4Like = ImVec4
+    imgui.StyleVar_ = imgui.ImDrawFlags_ = imgui.Col_ = imgui.FocusedFlags_ = imgui.Key = _Enum()
+    imgui.IM_COL32 = lambda *args: 0
+    _define(imgui, "get_item_rect_min", lambda: ImVec2(0.0, 0.0))
+    _define(imgui, "get_item_rect_max", lambda: ImVec2(1.0, 1.0))
+    _define(imgui, "get_cursor_screen_pos", _get_cursor_screen_pos)
+    _define(imgui, "get_font_size", 13.0)
+    _define(imgui, "get_text_line_height", 13.0)
+    _define(imgui, "get_io", types.SimpleNamespace(font_global_scale = 1.0))
+    _define(imgui, "get_content_region_avail", lambda: ImVec2(*RECORDER.view_size))
+    _define(imgui, "calc_text_size", lambda text, *args: ImVec2(7.0 * len(text), 13.0))
+    _define(imgui, "get_window_draw_list", _DRAW_LIST)
+    
+    # imgui_ctx, every scope is a counted no-op context manager
+    for name in ("begin_vertical", "begin_horizontal", "push_id", "push_style_var", "begin", "begin_child", "begin_menu", "tree_node", "begin_tooltip"):
+        key = f"imgui_ctx.{name}"
+        setattr(imgui_ctx, name, lambda *args, _key = key, **kwargs: _Scope(_key))
+    
+    # imgui_node_editor
+    ed.NodeId = type("NodeId", (_ObjectId,), {})
+    ed.PinId = type("PinId", (_ObjectId,), {})
+    ed.LinkId = type("LinkId", (_ObjectId,), {})
+    ed.EditorContext = object
+    ed.PinKind = types.SimpleNamespace(input = 0, output = 1)
+    ed.StyleVar = _Enum()
+    ed.Config = types.SimpleNamespace
+    _define(ed, "create_editor", lambda *args: object())
+    _define(ed, "get_style", _Style())
+    _define(ed, "get_node_background_draw_list", _DRAW_LIST)
+    _define(ed, "get_current_zoom", lambda: RECORDER.zoom)
+    _define(ed, "screen_to_canvas", _screen_to_canvas)
+    _define(ed, "begin_node", _begin_node)
+    _define(ed, "end_node", _end_node)
+    _define(ed, "get_node_position", _get_node_position)
+    _define(ed, "set_node_position", _set_node_position)
+    _define(ed, "get_node_size", _get_node_size)
+    _define(ed, "get_hovered_pin", lambda: ed.PinId(0))
+    _define(ed, "get_double_clicked_node", lambda: ed.NodeId(0))
+    for name in ("begin_create", "begin_delete", "query_new_link", "query_new_node", "query_deleted_link", "query_deleted_node", "accept_new_item"):
+        _define(ed, name, False)
+    
+    # hello_imgui
+    hello_imgui.LogLevel = _Enum()
+    
+    imgui_bundle.imgui = imgui
+    imgui_bundle.imgui_ctx = imgui_ctx
+    imgui_bundle.imgui_node_editor = ed
+    imgui_bundle.hello_imgui = hello_imgui
+    imgui_bundle.portable_file_dialogs = pfd
+    sys.modules["imgui_bundle"] = imgui_bundle
+    sys.modules["imgui_bundle.imgui"] = imgui
+    sys.modules["imgui_bundle.imgui_ctx"] = imgui_ctx
+    sys.modules["imgui_bundle.imgui_node_editor"] = ed
+    sys.modules["imgui_bundle.hello_imgui"] = hello_imgui
+    sys.modules["imgui_bundle.portable_file_dialogs"] = pfd
+    return imgui_bundle
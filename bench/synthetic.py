@@ -0,0 +1,48 @@
+"""
+    Synthetic nodalhdl designs for the benchmarks: one top level structure with `instances` leaf substructures wired
+    into a random, mostly feed-forward netlist.
+"""
+from nodalhdl.core.structure import Structure
+from nodalhdl.core.signal import Input, Output, UInt
+
+import random
+
+
+def leaf_structure(inputs: int, outputs: int, width: int = 4, clock: bool = False) -> Structure:
+    s = Structure()
+    if clock:
+        s.add_port("clk", Input[UInt[1]])
+    for i in range(inputs):
+        s.add_port(f"i{i}", Input[UInt[width]])
+    for i in range(outputs):
+        s.add_port(f"o{i}", Output[UInt[width]])
+    return s
+
+
+def generate(instances: int, inputs: int = 3, outputs: int = 1, fan_out: float = 2.0, top_ports: int = 8, window: int = 64, clock: bool = False, seed: int = 0) -> Structure:
+    # inputs / outputs: ports per instance
+    # fan_out: mean number of sinks per driving net, drivers are drawn from the last `window` ones so that the nets
+    #          stay local, like in a real design
+    # clock: one more top level input driving a "clk" input of every instance, a net with `instances` sinks
+    rng = random.Random(seed)
+    top = Structure()
+    top_inputs = [top.add_port(f"in{i}", Input[UInt[4]]) for i in range(top_ports)]
+    top_outputs = [top.add_port(f"out{i}", Output[UInt[4]]) for i in range(top_ports)]
+    top_clock = top.add_port("clk", Input[UInt[1]]) if clock else None
+    
+    # only part of the outputs drive something, so that a net has fan_out sinks on average
+    p_active = min(1.0, inputs / max(outputs * fan_out, 1e-9))
+    drivers = list(top_inputs)
+    for k in range(instances):
+        name = f"u{k}"
+        top.add_substructure(name, leaf_structure(inputs, outputs, clock = clock))
+        ports = top.get_subs_ports_outside(name)
+        if clock:
+            top.connect(top_clock, ports["clk"])
+        for i in range(inputs):
+            top.connect(rng.choice(drivers[-window:]), ports[f"i{i}"])
+        drivers.extend(ports[f"o{i}"] for i in range(outputs) if rng.random() < p_active)
+    
+    for port in top_outputs:
+        top.connect(rng.choice(drivers[-window:]), port)
+    return top
@@ -0,0 +1,232 @@
+from nodalhdl.core.structure import Structure
+
+import io
+import sys
+import threading
+import traceback
+import multiprocessing
+from collections import deque
+from typing import Deque, Dict, Hashable, List, Tuple
+
+import dill
+
+
+"""
+    worker process side: one process per job, started by AnalysisPool; everything goes back over one pipe as
+    (kind, ...) messages:
+        
+        ("log", level, text)     a line the structure printed, or a note of the worker
+        ("status", text)         the step running now
+        ("done", port types)     pin key -> str(deduced signal type), see view_model.PinView.key
+        ("failed", error, traceback)
+"""
+class _PipeWriter(io.TextIOBase):
+    # stdout / stderr of the worker, forwarded line by line
+    def __init__(self, conn, level: str):
+        self.conn = conn
+        self.level = level
+        self.buffer = ""
+    
+    def write(self, text: str) -> int:
+        self.buffer += text
+        *lines, self.buffer = self.buffer.split("\n")
+        for line in lines:
+            if line:
+                self.conn.send(("log", self.level, line))
+        return len(text)
+    
+    def flush(self):
+        if self.buffer:
+            self.conn.send(("log", self.level, self.buffer))
+            self.buffer = ""
+
+def _port_types(structure: Structure) -> Dict[Hashable, str]:
+    # keyed like the pins of StructureViewModel
+    types = {}
+    for port_full_name, port in structure.ports_inside_flipped.nodes():
+        types[(("io", port_full_name), port_full_name)] = str(port.signal_type)
+    for subs_inst_name in structure.substructures.keys():
+        for port_full_name, port in structure.get_subs_ports_outside(subs_inst_name).nodes():
+            types[(("subs", subs_inst_name), port_full_name)] = str(port.signal_type)
+    return types
+
+def _worker_main(conn, kind: str, output_dir: str):
+    sys.stdout = _PipeWriter(conn, "info")
+    sys.stderr = _PipeWriter(conn, "warning")
+    try:
+        from nodalhdl.core.structure import RuntimeId
+        from nodalhdl.core.hdl import emit_to_files
+        
+        conn.send(("status", "unpickling"))
+        structure = dill.loads(conn.recv_bytes())
+        
+        conn.send(("status", "deducing types"))
+        runtime_id = RuntimeId.create()
+        structure.deduction(runtime_id)
+        
+        if kind == AnalysisJob.GENERATE:
+            conn.send(("status", "generating HDL"))
+            model = structure.generation(runtime_id)
+            emit_to_files(model.emit_vhdl(), output_dir)
+            conn.send(("log", "info", f"HDL written to {output_dir}"))
+        
+        structure.apply_runtime(runtime_id)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        conn.send(("done", _port_types(structure)))
+    except BaseException as e:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        conn.send(("failed", f"{type(e).__name__}: {e}", traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+"""
+    one deduction (and, for GENERATE, HDL generation) run of a structure
+"""
+class AnalysisJob:
+    DEDUCE = "deduce"
+    GENERATE = "generate"
+    
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    
+    name: str # shown in the logs
+    kind: str
+    output_dir: str # GENERATE only
+    status: str # human readable step
+    state: str
+    
+    port_types: Dict[Hashable, str] # once done
+    error: str
+    messages: Deque[Tuple[str, str]] # (level, text) not handed to the UI yet, appended by the job's thread
+    
+    cancel_event: threading.Event
+    
+    def __init__(self, name: str, kind: str, output_dir: str = None):
+        self.name = name
+        self.kind = kind
+        self.output_dir = output_dir
+        self.status = "queued"
+        self.state = AnalysisJob.RUNNING
+        
+        self.port_types = None
+        self.error = None
+        self.messages = deque()
+        
+        self.cancel_event = threading.Event()
+    
+    def cancel(self):
+        self.cancel_event.set()
+    
+    def run(self, payload: bytes, pool: "AnalysisPool"):
+        # thread owned by the job: waits for a worker slot, then relays the worker's messages; payload is the pickled
+        # structure, taken on the UI thread (see AnalysisPool.submit)
+        try:
+            self.status = "waiting for a worker"
+            while not pool.slots.acquire(timeout = 0.1):
+                if self.cancel_event.is_set():
+                    raise _Cancelled()
+            try:
+                self._run_worker(payload, pool)
+            finally:
+                pool.slots.release()
+        except _Cancelled:
+            self.status = "cancelled"
+            self.state = AnalysisJob.CANCELLED
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.status = f"failed: {self.error}"
+            self.state = AnalysisJob.FAILED
+    
+    def _run_worker(self, payload: bytes, pool: "AnalysisPool"):
+        if self.cancel_event.is_set():
+            raise _Cancelled()
+        
+        receiver, sender = pool.mp_context.Pipe(duplex = True)
+        process = pool.mp_context.Process(target = _worker_main, args = (sender, self.kind, self.output_dir), name = f"analysis {self.name}", daemon = True)
+        process.start()
+        sender.close()
+        try:
+            receiver.send_bytes(payload)
+            del payload
+            
+            while True:
+                if self.cancel_event.is_set():
+                    raise _Cancelled()
+                if not receiver.poll(0.1):
+                    if not process.is_alive() and not receiver.poll():
+                        raise RuntimeError(f"worker exited with code {process.exitcode}")
+                    continue
+                
+                message = receiver.recv()
+                if message[0] == "log":
+                    self.messages.append((message[1], message[2]))
+                elif message[0] == "status":
+                    self.status = message[1]
+                elif message[0] == "done":
+                    self.port_types = message[1]
+                    self.status = "done"
+                    self.state = AnalysisJob.DONE
+                    return
+                else:
+                    self.messages.append(("debug", message[2]))
+                    self.error = message[1]
+                    self.status = f"failed: {self.error}"
+                    self.state = AnalysisJob.FAILED
+                    return
+        finally:
+            if process.is_alive(): # cancelled, or broken
+                process.terminate()
+            process.join()
+            receiver.close()
+
+
+class _Cancelled(Exception): pass
+
+
+"""
+    Runs AnalysisJobs in worker processes, at most max_workers at a time.
+    
+    Deduction and generation are pure Python and would hold the GIL, so unlike loading they run in processes; the
+    structure is pickled and sent over. It is pickled in submit(), on the UI thread: the structure can be edited as
+    soon as submit() returns, and dill's pure Python pickler would let an edit in halfway. Each job gets its own process instead of a slot in a
+    concurrent.futures pool, so that cancelling a running job can just terminate it. Processes are spawned, not
+    forked: the UI process has a GL context and a bunch of threads.
+"""
+class AnalysisPool:
+    mp_context: multiprocessing.context.BaseContext
+    slots: threading.Semaphore
+    jobs: List[AnalysisJob]
+    
+    def __init__(self, max_workers: int = 2):
+        self.mp_context = multiprocessing.get_context("spawn")
+        self.slots = threading.Semaphore(max_workers)
+        self.jobs = []
+    
+    def submit(self, name: str, structure: Structure, kind: str, output_dir: str = None) -> AnalysisJob:
+        # UI thread
+        job = AnalysisJob(name, kind, output_dir)
+        self.jobs.append(job)
+        try:
+            payload = dill.dumps(structure)
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = f"failed: {job.error}"
+            job.state = AnalysisJob.FAILED
+            return job
+        threading.Thread(target = job.run, args = (payload, self), name = f"analysis {name}", daemon = True).start()
+        return job
+    
+    def poll(self) -> List[AnalysisJob]:
+        # UI thread, returns the jobs finished since the last call; drain job.messages of all jobs before
+        finished = [job for job in self.jobs if job.state != AnalysisJob.RUNNING]
+        self.jobs = [job for job in self.jobs if job.state == AnalysisJob.RUNNING]
+        return finished
+    
+    def shutdown(self):
+        for job in self.jobs:
+            job.cancel()
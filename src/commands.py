@@ -0,0 +1,158 @@
+from nodalhdl.core.structure import Structure
+
+from collections import deque
+from typing import Deque, Hashable, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from structure_editor import StructureEditor
+
+
+"""
+    Undoable edits of the structure of a StructureEditor.
+    
+    A command records only what it changes (pin keys, one instance), never a copy of the structure, so undo and redo
+    cost as much as the edit itself. Pins are referred to by key, not by port object: deleting an instance and undoing
+    that brings back an equal instance with new port objects.
+"""
+class Command:
+    description: str
+    
+    def do(self, editor: "StructureEditor"):
+        raise NotImplementedError
+    
+    def undo(self, editor: "StructureEditor"):
+        raise NotImplementedError
+
+
+class ConnectCommand(Command):
+    # merges the nets of two pins; undo splits the pins of the smaller of the two old nets off again, so that connecting
+    # a pin to a large net and undoing that costs as much as the pin
+    def __init__(self, pin_key_a: Hashable, pin_key_b: Hashable):
+        self.pin_key_a = pin_key_a
+        self.pin_key_b = pin_key_b
+        self.split_off: List[Hashable] = [] # the smaller net before, at this level
+        self.description = f"Connect {_pin_name(pin_key_a)} and {_pin_name(pin_key_b)}"
+    
+    def do(self, editor: "StructureEditor"):
+        smaller = self.pin_key_a if editor.net_size(self.pin_key_a) < editor.net_size(self.pin_key_b) else self.pin_key_b
+        self.split_off = editor.net_pin_keys(smaller)
+        editor.connect_pins(self.pin_key_a, self.pin_key_b)
+    
+    def undo(self, editor: "StructureEditor"):
+        editor.split_pins(self.split_off)
+
+
+class DisconnectCommand(Command):
+    # takes one pin out of its net; undo connects it to one of the pins it was connected to
+    def __init__(self, pin_key: Hashable):
+        self.pin_key = pin_key
+        self.peer: Optional[Hashable] = None
+        self.description = f"Disconnect {_pin_name(pin_key)}"
+    
+    def do(self, editor: "StructureEditor"):
+        self.peer = editor.net_peer(self.pin_key)
+        editor.disconnect_pin(self.pin_key)
+    
+    def undo(self, editor: "StructureEditor"):
+        if self.peer is not None:
+            editor.connect_pins(self.peer, self.pin_key)
+
+
+class AddInstanceCommand(Command):
+    def __init__(self, name: str, structure: Structure, position: Tuple[float, float]):
+        self.name = name
+        self.structure = structure
+        self.position = position
+        self.description = f"Add {name}"
+    
+    def do(self, editor: "StructureEditor"):
+        editor.add_instance(self.name, self.structure, self.position)
+    
+    def undo(self, editor: "StructureEditor"):
+        editor.remove_instance(self.name)
+
+
+class DeleteInstanceCommand(Command):
+    # undo adds the same substructure again and connects each of its ports to one of its old peers
+    def __init__(self, name: str):
+        self.name = name
+        self.structure: Structure = None
+        self.position: Tuple[float, float] = None
+        self.peers: List[Tuple[Hashable, Hashable]] = [] # (pin key of the instance, pin key it was connected to)
+        self.description = f"Delete {name}"
+    
+    def do(self, editor: "StructureEditor"):
+        self.peers = []
+        for pin_key in editor.instance_pin_keys(self.name):
+            peer = editor.net_peer(pin_key, other_node = True)
+            if peer is not None:
+                self.peers.append((pin_key, peer))
+        self.structure, self.position = editor.remove_instance(self.name)
+    
+    def undo(self, editor: "StructureEditor"):
+        editor.add_instance(self.name, self.structure, self.position)
+        for pin_key, peer in self.peers:
+            editor.connect_pins(peer, pin_key)
+
+
+class CommandGroup(Command):
+    # several commands done and undone as one, e.g. a node deleted together with its links
+    def __init__(self, commands: List[Command]):
+        self.commands = commands
+        self.description = commands[0].description if len(commands) == 1 else f"{commands[-1].description} (+{len(commands) - 1})"
+    
+    def do(self, editor: "StructureEditor"):
+        for command in self.commands:
+            command.do(editor)
+    
+    def undo(self, editor: "StructureEditor"):
+        for command in reversed(self.commands):
+            command.undo(editor)
+
+
+def _pin_name(pin_key: Hashable) -> str:
+    (kind, node_name), label = pin_key
+    return node_name if kind == "io" else f"{node_name}.{label}"
+
+
+"""
+    Done and undone commands of one editor. At most depth commands can be undone, older ones are dropped, so the memory
+    held is bounded by depth times the size of an edit.
+"""
+class CommandLog:
+    DEPTH = 200
+    
+    done: Deque[Command]
+    undone: List[Command]
+    
+    def __init__(self, depth: int = DEPTH):
+        self.done = deque(maxlen = depth)
+        self.undone = []
+    
+    def run(self, editor: "StructureEditor", command: Command):
+        command.do(editor)
+        self.done.append(command)
+        self.undone.clear()
+    
+    def can_undo(self) -> bool:
+        return len(self.done) > 0
+    
+    def can_redo(self) -> bool:
+        return len(self.undone) > 0
+    
+    # like run(), the command moves only once it succeeded
+    def undo(self, editor: "StructureEditor"):
+        command = self.done[-1]
+        command.undo(editor)
+        self.done.pop()
+        self.undone.append(command)
+    
+    def redo(self, editor: "StructureEditor"):
+        command = self.undone[-1]
+        command.do(editor)
+        self.undone.pop()
+        self.done.append(command)
+    
+    def clear(self):
+        self.done.clear()
+        self.undone.clear()
@@ -0,0 +1,287 @@
+from nodalhdl.core.structure import Structure
+
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+try: # optional, queries walk the graph frontier by frontier in numpy without it (one numpy round per step)
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import breadth_first_order
+except ImportError:
+    csr_matrix = breadth_first_order = None
+
+from view_model import StructureViewModel
+
+
+"""
+    One structure definition, as the pins of its view model: its own ports (IO pins) and the ports of its
+    substructures (subs pins), with the links between them. Instances of the same definition share it.
+"""
+class _Template:
+    pin_keys: List[Hashable] # of the view model pins
+    pin_position: Dict[Hashable, int] # pin key -> index into pin_keys
+    io_pins: np.ndarray # pin indices of the own ports
+    io_position: Dict[str, int] # own port full name -> index into io_pins
+    subs_pins: np.ndarray # pin indices of the substructure ports, grouped by substructure
+    subs_labels: List[int] # string ids, parallel to subs_pins
+    links: np.ndarray # (link count, 2) driver pin, sink pin
+    cell_edges: np.ndarray # (count, 2) input pin -> output pin of the leaf substructures
+    children: List[Tuple[str, Structure, np.ndarray]] # (instance name, structure, pin indices) of the substructures with substructures of their own
+    leaf_children: List[str] # instance names of the others, parallel to the groups of subs_pins
+    subs_counts: np.ndarray # pins per substructure, children first, then leaf_children
+    
+    def __init__(self, structure: Structure, strings: "_Strings"):
+        view_model = StructureViewModel(structure)
+        pins = view_model.pins
+        self.pin_keys = [pin.key for pin in pins]
+        self.pin_position = {key: i for i, key in enumerate(self.pin_keys)}
+        self.io_pins = np.array([i for i, pin in enumerate(pins) if view_model.nodes[pin.node_index].is_io], dtype = np.int64)
+        self.io_position = {pins[i].label: k for k, i in enumerate(self.io_pins.tolist())}
+        self.links = np.array([link for link in view_model.links if link is not None], dtype = np.int64).reshape(-1, 2)
+        
+        # substructure pins, those that are expanded further first
+        self.children, self.leaf_children = [], []
+        expanded, leaves, cell_edges = [], [], []
+        for node in view_model.nodes[view_model.io_node_count:]:
+            node_pins = node.inputs + node.outputs
+            child = structure.substructures[node.name]
+            if child.substructures:
+                self.children.append((node.name, child, np.array(node_pins, dtype = np.int64)))
+                expanded.append(node_pins)
+            else: # a leaf (operator): every input reaches every output
+                self.leaf_children.append(node.name)
+                leaves.append(node_pins)
+                cell_edges.extend((i, o) for i in node.inputs for o in node.outputs)
+        groups = expanded + leaves
+        self.subs_pins = np.array([i for group in groups for i in group], dtype = np.int64)
+        self.subs_labels = [strings.add(pins[i].label) for i in self.subs_pins.tolist()]
+        self.subs_counts = np.array([len(group) for group in groups], dtype = np.int64)
+        self.cell_edges = np.array(cell_edges, dtype = np.int64).reshape(-1, 2)
+
+
+class _Strings:
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.strings: List[str] = []
+    
+    def add(self, s: str) -> int:
+        i = self.ids.get(s)
+        if i is None:
+            i = self.ids[s] = len(self.strings)
+            self.strings.append(s)
+        return i
+
+
+def _csr(src: np.ndarray, dst: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    # (indptr, indices): the targets of vertex v are indices[indptr[v]:indptr[v + 1]]; one more vertex than n, without
+    # edges, for _reach() to start from
+    order = np.argsort(src, kind = "stable")
+    indptr = np.searchsorted(src[order], np.arange(n + 2)).astype(np.int32)
+    return indptr, dst[order].astype(np.int32)
+
+def _neighbors(indptr: np.ndarray, indices: np.ndarray, frontier: np.ndarray) -> np.ndarray:
+    counts = indptr[frontier + 1] - indptr[frontier]
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype = np.int32)
+    offsets = np.repeat(indptr[frontier] - (np.cumsum(counts) - counts), counts)
+    return indices[offsets + np.arange(total)]
+
+def _reach(graph: Tuple[np.ndarray, np.ndarray], n: int, start: List[int]) -> np.ndarray:
+    # mask of the vertices reachable from start (included)
+    indptr, indices = graph
+    start = np.unique(np.asarray(start, dtype = np.int32))
+    visited = np.zeros(n + 1, dtype = bool)
+    if breadth_first_order is not None:
+        # one search from the spare vertex n, with the start vertices as its targets
+        indptr = indptr.copy()
+        indptr[n + 1] += start.size
+        matrix = csr_matrix((np.ones(indices.size + start.size, dtype = np.int8), np.concatenate([indices, start]), indptr), shape = (n + 1, n + 1))
+        visited[breadth_first_order(matrix, n, directed = True, return_predecessors = False)] = True
+    else:
+        # one numpy round per step, slow for deep logic (thousands of steps)
+        frontier = start
+        visited[frontier] = True
+        while frontier.size:
+            found = _neighbors(indptr, indices, frontier)
+            found = np.unique(found[~visited[found]])
+            visited[found] = True
+            frontier = found
+    return visited[:n]
+
+
+"""
+    Connectivity of a whole design, across all hierarchy levels, for tracing signals without walking nets and ports.
+    
+    A vertex is a port of an instance, (instance path, port full name); the outside of a substructure port (a pin in
+    its parent's level) and its inside (an IO pin in the substructure's own level) are the same vertex. Edges, as
+    integer arrays in CSR form, both directions:
+        
+        wire    driver -> sink of a net, in any level
+        cell    input -> output of a leaf substructure (an operator, no substructures of its own)
+    
+    so following wires backwards from a pin ends at the port that really drives it, and following wires and cells
+    gives fan-in / fan-out cones. Cones are one breadth first search in scipy (milliseconds for a million edges), or
+    frontier by frontier in numpy without scipy. Queries return masks over the vertices; level_pins() turns them into
+    the pins of one level, for an editor to highlight.
+    
+    Built from the Structure in one go: a view model per structure definition (shared by its instances), instantiated
+    for each instance by offsetting pin indices.
+"""
+class ConnectivityIndex:
+    vertex_count: int
+    vertex_instance: np.ndarray # int32, index into instance_paths
+    vertex_label: np.ndarray # int32, string id of the port full name
+    instance_paths: List[Tuple[str, ...]]
+    strings: List[str]
+    levels: Dict[Tuple[str, ...], Tuple[_Template, np.ndarray]] # instance path -> (template, vertex of each pin), for the instances with substructures
+    
+    wire_forward: Tuple[np.ndarray, np.ndarray] # CSR, see _csr()
+    wire_backward: Tuple[np.ndarray, np.ndarray]
+    forward: Tuple[np.ndarray, np.ndarray] # wires and cells
+    backward: Tuple[np.ndarray, np.ndarray]
+    edge_count: int
+    
+    def __init__(self, structure: Structure):
+        strings = _Strings()
+        templates: Dict[str, _Template] = {} # structure id -> template
+        def template_of(s: Structure) -> _Template:
+            t = templates.get(s.id)
+            if t is None:
+                t = templates[s.id] = _Template(s, strings)
+            return t
+        
+        self.instance_paths = [()]
+        self.levels = {}
+        instance_parts, label_parts = [], []
+        wire_parts, cell_parts = [], []
+        
+        # the top level's own ports
+        top = template_of(structure)
+        labels = [key[1] for key in (top.pin_keys[i] for i in top.io_pins.tolist())]
+        vertex_count = len(labels)
+        instance_parts.append(np.zeros(vertex_count, dtype = np.int32))
+        label_parts.append(np.array([strings.add(label) for label in labels], dtype = np.int32))
+        
+        stack: List[Tuple[Tuple[str, ...], _Template, np.ndarray]] = [((), top, np.arange(vertex_count, dtype = np.int64))]
+        while stack:
+            path, t, own = stack.pop()
+            
+            # pin -> vertex: the own ports were numbered by the parent, the substructure ports get new vertices here
+            pin_vertex = np.empty(len(t.pin_keys), dtype = np.int64)
+            pin_vertex[t.io_pins] = own
+            pin_vertex[t.subs_pins] = vertex_count + np.arange(len(t.subs_pins))
+            first_instance = len(self.instance_paths)
+            self.instance_paths.extend(path + (name, ) for name, _, _ in t.children)
+            self.instance_paths.extend(path + (name, ) for name in t.leaf_children)
+            instance_parts.append(np.repeat(np.arange(first_instance, len(self.instance_paths), dtype = np.int32), t.subs_counts))
+            label_parts.append(np.array(t.subs_labels, dtype = np.int32))
+            vertex_count += len(t.subs_pins)
+            self.levels[path] = (t, pin_vertex)
+            
+            wire_parts.append(pin_vertex[t.links])
+            cell_parts.append(pin_vertex[t.cell_edges])
+            
+            # the own ports of a child, in the order of its IO pins; ports its parent has no pin for are not connected
+            # outside, they still get a vertex
+            for k, (name, child, child_pins) in enumerate(t.children):
+                ct = template_of(child)
+                child_own = np.full(len(ct.io_pins), -1, dtype = np.int64)
+                for pin_index in child_pins.tolist():
+                    position = ct.io_position.get(t.pin_keys[pin_index][1])
+                    if position is not None:
+                        child_own[position] = pin_vertex[pin_index]
+                missing = np.flatnonzero(child_own == -1)
+                if missing.size:
+                    child_own[missing] = vertex_count + np.arange(missing.size)
+                    vertex_count += missing.size
+                    instance_parts.append(np.full(missing.size, first_instance + k, dtype = np.int32))
+                    label_parts.append(np.array([strings.add(ct.pin_keys[ct.io_pins[m]][1]) for m in missing.tolist()], dtype = np.int32))
+                stack.append((path + (name, ), ct, child_own))
+        
+        self.vertex_count = vertex_count
+        self.vertex_instance = np.concatenate(instance_parts)
+        self.vertex_label = np.concatenate(label_parts)
+        self.strings = strings.strings
+        
+        wires = np.concatenate(wire_parts) if wire_parts else np.zeros((0, 2), dtype = np.int64)
+        cells = np.concatenate(cell_parts) if cell_parts else np.zeros((0, 2), dtype = np.int64)
+        edges = np.concatenate([wires, cells])
+        self.wire_forward = _csr(wires[:, 0], wires[:, 1], vertex_count)
+        self.wire_backward = _csr(wires[:, 1], wires[:, 0], vertex_count)
+        self.forward = _csr(edges[:, 0], edges[:, 1], vertex_count)
+        self.backward = _csr(edges[:, 1], edges[:, 0], vertex_count)
+        self.edge_count = len(edges)
+    
+    def nbytes(self) -> int:
+        arrays = [self.vertex_instance, self.vertex_label, *self.wire_forward, *self.wire_backward, *self.forward, *self.backward]
+        arrays += [pin_vertex for _, pin_vertex in self.levels.values()]
+        return sum(a.nbytes for a in arrays)
+    
+    def vertex_name(self, vertex: int) -> str:
+        return ".".join(self.instance_paths[self.vertex_instance[vertex]] + (self.strings[self.vertex_label[vertex]], ))
+    
+    def instance_count(self, mask: np.ndarray) -> int:
+        # instances with a port in the mask, at any level; the top level is not one
+        return int(np.count_nonzero(np.unique(self.vertex_instance[mask])))
+    
+    """
+        queries
+    """
+    def vertex_of_pin(self, path: Tuple[str, ...], pin_key: Hashable) -> Optional[int]:
+        level = self.levels.get(path)
+        if level is None:
+            return None
+        t, pin_vertex = level
+        pin_index = t.pin_position.get(pin_key)
+        return None if pin_index is None else int(pin_vertex[pin_index])
+    
+    def pin_keys(self, path: Tuple[str, ...]) -> List[Hashable]:
+        # keys of the pins of the level (an instance with substructures), in the order level_pins() uses
+        level = self.levels.get(path)
+        return [] if level is None else level[0].pin_keys
+    
+    def level_pins(self, path: Tuple[str, ...], mask: np.ndarray) -> np.ndarray:
+        # mask over pin_keys(path): the pins of the level whose vertices are in the mask
+        level = self.levels.get(path)
+        if level is None:
+            return np.zeros(0, dtype = bool)
+        return mask[level[1]]
+    
+    def trace_driver(self, vertex: int) -> List[int]:
+        # from the vertex back to the port driving it, through the levels in between; a sink has one driver
+        indptr, indices = self.wire_backward
+        vertex = int(vertex)
+        route = [vertex]
+        seen = {vertex}
+        while indptr[vertex] != indptr[vertex + 1]:
+            vertex = int(indices[indptr[vertex]])
+            if vertex in seen: # only a broken structure has wire loops
+                break
+            seen.add(vertex)
+            route.append(vertex)
+        return route
+    
+    def trace_sinks(self, vertex: int) -> np.ndarray:
+        # mask of the whole signal the vertex is part of: its driver and everything it reaches through wires
+        return _reach(self.wire_forward, self.vertex_count, [self.trace_driver(vertex)[-1]])
+    
+    def sinks(self, mask: np.ndarray) -> np.ndarray:
+        # vertices of the mask no wire leaves, the ports a signal really ends at
+        indptr, _ = self.wire_forward
+        return np.flatnonzero(mask & (indptr[1:-1] == indptr[:-2]))
+    
+    def cone(self, vertices: List[int], forward: bool) -> np.ndarray:
+        # mask of the fan-out (forward) or fan-in cone of the vertices, through wires and leaf substructures
+        return _reach(self.forward if forward else self.backward, self.vertex_count, vertices)
+
+
+_executor: ThreadPoolExecutor = None
+
+def build(structure: Structure) -> Future:
+    # Future of the ConnectivityIndex, built in a background thread
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "connectivity")
+    return _executor.submit(ConnectivityIndex, structure)
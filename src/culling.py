@@ -0,0 +1,99 @@
+from typing import Dict, List, Set, Tuple
+
+
+"""
+    Uniform grid over node rects in canvas space, used to find the nodes intersecting the current view without
+    touching every node of the structure.
+"""
+class SpatialGrid:
+    cell_size: float
+    cells: Dict[Tuple[int, int], Set[int]]
+    item_cells: Dict[int, Tuple[int, int, int, int]] # item -> (cx0, cy0, cx1, cy1), inclusive
+    
+    def __init__(self, cell_size: float = 256.0):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.item_cells = {}
+    
+    def _cell_range(self, x0: float, y0: float, x1: float, y1: float) -> Tuple[int, int, int, int]:
+        s = self.cell_size
+        return int(x0 // s), int(y0 // s), int(x1 // s), int(y1 // s)
+    
+    def update(self, item: int, x0: float, y0: float, x1: float, y1: float):
+        cell_range = self._cell_range(x0, y0, x1, y1)
+        old_range = self.item_cells.get(item)
+        if old_range == cell_range:
+            return
+        if old_range is not None:
+            self.remove(item)
+        
+        cx0, cy0, cx1, cy1 = cell_range
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                self.cells.setdefault((cx, cy), set()).add(item)
+        self.item_cells[item] = cell_range
+    
+    def remove(self, item: int):
+        cell_range = self.item_cells.pop(item, None)
+        if cell_range is None:
+            return
+        
+        cx0, cy0, cx1, cy1 = cell_range
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = self.cells[(cx, cy)]
+                cell.discard(item)
+                if not cell:
+                    del self.cells[(cx, cy)]
+    
+    def clear(self):
+        self.cells.clear()
+        self.item_cells.clear()
+    
+    def query(self, x0: float, y0: float, x1: float, y1: float) -> Set[int]:
+        cx0, cy0, cx1, cy1 = self._cell_range(x0, y0, x1, y1)
+        result: Set[int] = set()
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) <= len(self.cells):
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    cell = self.cells.get((cx, cy))
+                    if cell is not None:
+                        result |= cell
+        else: # view spans more cells than are occupied (zoomed far out)
+            for (cx, cy), cell in self.cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    result |= cell
+        return result
+
+
+"""
+    Node rects of one editor, indexed like StructureViewModel.nodes.
+"""
+class NodeRects:
+    rects: List[Tuple[float, float, float, float]] # (x0, y0, x1, y1) in canvas space
+    unmeasured: Set[int] # nodes that have never been submitted, so their rect is not known yet
+    grid: SpatialGrid
+    
+    def __init__(self, count: int = 0):
+        self.rects = [(0.0, 0.0, 0.0, 0.0)] * count
+        self.unmeasured = set(range(count))
+        self.grid = SpatialGrid()
+    
+    def __len__(self):
+        return len(self.rects)
+    
+    def append(self) -> int:
+        # a new node, not measured yet
+        self.rects.append((0.0, 0.0, 0.0, 0.0))
+        self.unmeasured.add(len(self.rects) - 1)
+        return len(self.rects) - 1
+    
+    def set(self, index: int, x0: float, y0: float, x1: float, y1: float):
+        rect = (x0, y0, x1, y1)
+        self.unmeasured.discard(index)
+        if self.rects[index] != rect or index not in self.grid.item_cells:
+            self.rects[index] = rect
+            self.grid.update(index, x0, y0, x1, y1)
+    
+    def query(self, x0: float, y0: float, x1: float, y1: float) -> Set[int]:
+        return self.grid.query(x0, y0, x1, y1)
@@ -1,7 +1,59 @@
-import sys
-from typing import Union, List, Tuple
+import hashlib
+from typing import Union, List, Tuple, Dict, Hashable, Optional, Iterator
 
 from imgui_bundle import imgui, imgui_ctx, imgui_node_editor as ed # type: ignore
+import profiler
+
+
+"""
+    stable ids
+    
+    Maps hierarchical paths (e.g. ("subs", inst_name), (node_path, port_full_name), (driver_pin_path, sink_pin_path))
+    to ed ids and back. An id is derived from the path itself instead of from draw order, so it stays the same across
+    frames, reloads and edits, and the node editor keeps its cached state for the object.
+"""
+class IdRegistry:
+    _ID_MASK = (1 << 63) - 1
+    
+    id_of_key: Dict[Hashable, int]
+    key_of_id: Dict[int, Hashable]
+    
+    def __init__(self):
+        self.id_of_key = {}
+        self.key_of_id = {}
+    
+    def get_id(self, key: Hashable) -> int:
+        obj_id = self.id_of_key.get(key)
+        if obj_id is None:
+            obj_id = int.from_bytes(hashlib.blake2b(repr(key).encode(), digest_size = 8).digest(), "little") & IdRegistry._ID_MASK
+            while obj_id == 0 or obj_id in self.key_of_id: # 0 is the invalid id; collisions are probed linearly
+                obj_id = (obj_id + 1) & IdRegistry._ID_MASK
+            self.id_of_key[key] = obj_id
+            self.key_of_id[obj_id] = key
+        return obj_id
+    
+    def node_id(self, key: Hashable) -> ed.NodeId:
+        return ed.NodeId(self.get_id(("node", key)))
+    
+    def pin_id(self, key: Hashable) -> ed.PinId:
+        return ed.PinId(self.get_id(("pin", key)))
+    
+    def link_id(self, key: Hashable) -> ed.LinkId:
+        return ed.LinkId(self.get_id(("link", key)))
+    
+    def get_key(self, obj_id: Union[int, ed.NodeId, ed.PinId, ed.LinkId]) -> Hashable:
+        if not isinstance(obj_id, int):
+            obj_id = obj_id.id()
+        return self.key_of_id.get(obj_id)
+    
+    def forget(self, key: Hashable):
+        obj_id = self.id_of_key.pop(key, None)
+        if obj_id is not None:
+            del self.key_of_id[obj_id]
+    
+    def clear(self):
+        self.id_of_key.clear()
+        self.key_of_id.clear()
 
 
 """
@@ -11,30 +63,44 @@ class _BeginEndEditor:
     editor_id: str
     size: imgui.ImVec2Like
     
-    id_counter: int
+    registry: IdRegistry
+    
+    screen_min: imgui.ImVec2
+    screen_max: imgui.ImVec2
     
-    def __init__(self, editor_id: str, size: imgui.ImVec2Like = imgui.ImVec2(0.0, 0.0)):
+    profile_start: float
+    
+    def __init__(self, editor_id: str, size: imgui.ImVec2Like = imgui.ImVec2(0.0, 0.0), registry: IdRegistry = None):
         self.editor_id = editor_id
         self.size = size
         
-        self.id_counter = 0
+        self.registry = registry if registry is not None else IdRegistry()
     
     def __enter__(self):
+        # screen region the editor is going to occupy, size 0 means the available content region (as ed.begin does)
+        self.screen_min = imgui.get_cursor_screen_pos()
+        avail = imgui.get_content_region_avail()
+        size = imgui.ImVec2(self.size.x if self.size.x > 0 else avail.x, self.size.y if self.size.y > 0 else avail.y)
+        self.screen_max = imgui.ImVec2(self.screen_min.x + size.x, self.screen_min.y + size.y)
+        
+        if profiler.enabled:
+            self.profile_start = profiler.now()
         ed.begin(self.editor_id, self.size)
         return self
     
     def __exit__(self, exc_type, exc_value, traceback):
         ed.end()
-
-    def _reset_id(self):
-        self.id_counter = 0
+        if profiler.enabled:
+            profiler.record("ed_ctx.editor", self.profile_start)
     
-    def _next_id(self):
-        self.id_counter += 1
-        return self.id_counter
+    def get_view_rect(self) -> Tuple[float, float, float, float]:
+        # visible part of the canvas as (x0, y0, x1, y1) in canvas space, only valid inside the with block
+        view_min = ed.screen_to_canvas(self.screen_min)
+        view_max = ed.screen_to_canvas(self.screen_max)
+        return view_min.x, view_min.y, view_max.x, view_max.y
 
-def editor(editor_id: str, size: imgui.ImVec2Like = imgui.ImVec2(0.0, 0.0)) -> _BeginEndEditor:
-    return _BeginEndEditor(editor_id, size)
+def editor(editor_id: str, size: imgui.ImVec2Like = imgui.ImVec2(0.0, 0.0), registry: IdRegistry = None) -> _BeginEndEditor:
+    return _BeginEndEditor(editor_id, size, registry)
 
 
 """
@@ -42,21 +108,28 @@ def editor(editor_id: str, size: imgui.ImVec2Like = imgui.ImVec2(0.0, 0.0)) -> _
 """
 class _BeginEndNode:
     editor_ctx: _BeginEndEditor
+    key: Hashable
     node_id: ed.NodeId
+    profile_start: float
     
-    def __init__(self, editor_ctx: _BeginEndEditor):
+    def __init__(self, editor_ctx: _BeginEndEditor, key: Hashable):
         self.editor_ctx = editor_ctx
+        self.key = key
     
     def __enter__(self):
-        self.node_id = ed.NodeId(self.editor_ctx._next_id())
+        if profiler.enabled:
+            self.profile_start = profiler.now()
+        self.node_id = self.editor_ctx.registry.node_id(self.key)
         ed.begin_node(self.node_id)
         return self
     
     def __exit__(self, exc_type, exc_value, traceback):
         ed.end_node()
+        if profiler.enabled:
+            profiler.record("ed_ctx.node", self.profile_start)
 
-def node(editor_ctx: _BeginEndEditor) -> _BeginEndNode:
-    return _BeginEndNode(editor_ctx)
+def node(editor_ctx: _BeginEndEditor, key: Hashable) -> _BeginEndNode:
+    return _BeginEndNode(editor_ctx, key)
 
 
 """
@@ -64,90 +137,144 @@ def node(editor_ctx: _BeginEndEditor) -> _BeginEndNode:
 """
 class _BeginEndPin:
     editor_ctx: _BeginEndEditor
+    key: Hashable
     kind: ed.PinKind
     pin_id: ed.PinId
+    profile_start: float
     
-    def __init__(self, editor_ctx: _BeginEndEditor, kind: ed.PinKind):
+    def __init__(self, editor_ctx: _BeginEndEditor, key: Hashable, kind: ed.PinKind):
         self.editor_ctx = editor_ctx
+        self.key = key
         self.kind = kind
     
     def __enter__(self):
-        self.pin_id = ed.PinId(self.editor_ctx._next_id())
+        if profiler.enabled:
+            self.profile_start = profiler.now()
+        self.pin_id = self.editor_ctx.registry.pin_id(self.key)
         ed.begin_pin(self.pin_id, self.kind)
         return self
     
     def __exit__(self, exc_type, exc_value, traceback):
         ed.end_pin()
+        if profiler.enabled:
+            profiler.record("ed_ctx.pin", self.profile_start)
 
-def pin(editor_ctx: _BeginEndEditor, kind: ed.PinKind) -> _BeginEndPin:
-    return _BeginEndPin(editor_ctx, kind)
+def pin(editor_ctx: _BeginEndEditor, key: Hashable, kind: ed.PinKind) -> _BeginEndPin:
+    return _BeginEndPin(editor_ctx, key, kind)
 
 
 """
     ed.link()
 """
-def link(editor_ctx: _BeginEndEditor, input_pin_id: ed.PinId, output_pin_id: ed.PinId) -> None:
-    l_id = ed.LinkId(editor_ctx._next_id())
-    ed.link(l_id, input_pin_id, output_pin_id)
+def link(editor_ctx: _BeginEndEditor, key: Hashable, input_pin_id: ed.PinId, output_pin_id: ed.PinId, color: imgui.ImVec4Like = None, thickness: float = 1.0) -> None:
+    if profiler.enabled:
+        start = profiler.now()
+    l_id = editor_ctx.registry.link_id(key)
+    if color is None:
+        ed.link(l_id, input_pin_id, output_pin_id)
+    else:
+        ed.link(l_id, input_pin_id, output_pin_id, color, thickness)
+    if profiler.enabled:
+        profiler.record("ed_ctx.link", start)
 
 
 """
-    skip with block
+    ed.begin_create() / ed.end_create()
+    
+    with ed_ctx.on_create() as creating:
+        if creating:
+            ...
+    
+    __enter__ returns the result of ed.begin_create(), the body decides whether to go on with a plain if, so nothing
+    but one call is paid when there is nothing to create. ed.end_create() is only called after a successful
+    ed.begin_create(), imgui-node-editor asserts otherwise.
 """
-class _Abortable:
-    class AbortException(Exception): pass
+class _BeginEndCreate:
+    color: imgui.ImVec4Like
+    thickness: float
+    active: bool
+    profile_start: float
+    
+    def __init__(self, color: imgui.ImVec4Like = imgui.ImVec4(1, 1, 1, 1), thickness: float = 1.0):
+        self.color = color
+        self.thickness = thickness
     
-    def _trace(self, frame, event, arg):
-        sys.settrace(None)
-        raise _Abortable.AbortException()
+    def __enter__(self) -> bool:
+        if profiler.enabled:
+            self.profile_start = profiler.now()
+        self.active = ed.begin_create(self.color, self.thickness)
+        return self.active
     
-    def set_abort_hook(self):
-        # https://stackoverflow.com/questions/12594148/skipping-execution-of-with-block/12594789#12594789
-        # https://github.com/rfk/withhacks
-        sys.settrace(lambda *args, **keys: None)
-        f = sys._getframe(0)
-        while f.f_locals.get("self") is self:
-            f = f.f_back
-        f.f_trace = self._trace
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.active:
+            ed.end_create()
+        if profiler.enabled:
+            profiler.record("ed_ctx.on_create", self.profile_start)
+
+def on_create(color: imgui.ImVec4Like = imgui.ImVec4(1, 1, 1, 1), thickness: float = 1.0) -> _BeginEndCreate:
+    return _BeginEndCreate(color, thickness)
 
 
 """
-    ed.begin_create() / ed.end_create()
+    ed.query_new_link() / ed.query_new_node(), only valid while creating
 """
-class _BeginEndCreate(_Abortable):
-    def __enter__(self):
-        if not ed.begin_create():
-            self.set_abort_hook()
-        return self
-    
-    def __exit__(self, exc_type, exc_value, traceback):
-        if exc_type is _Abortable.AbortException:
-            return True
-        
-        ed.end_create()
+def new_link() -> Optional[Tuple[ed.PinId, ed.PinId]]:
+    input_pin_id, output_pin_id = ed.PinId(), ed.PinId()
+    if not ed.query_new_link(input_pin_id, output_pin_id) or not input_pin_id or not output_pin_id:
+        return None
+    return input_pin_id, output_pin_id
 
-def on_create() -> _BeginEndCreate:
-    return _BeginEndCreate()
+def new_node() -> Optional[ed.PinId]:
+    pin_id = ed.PinId()
+    if not ed.query_new_node(pin_id) or not pin_id:
+        return None
+    return pin_id
 
 
 """
-    ed.query_new_link()
+    ed.begin_delete() / ed.end_delete()
+    
+    with ed_ctx.on_delete() as deleting:
+        if deleting:
+            for link_id in ed_ctx.deleted_links():
+                ...
 """
-class _QueryNewLink(_Abortable):
-    def __enter__(self):
-        input_pin_id, output_pin_id = ed.PinId(), ed.PinId()
-        if not ed.query_new_link(input_pin_id, output_pin_id):
-            self.set_abort_hook()
-        if not input_pin_id or not output_pin_id:
-            self.set_abort_hook()
-        return input_pin_id, output_pin_id
+class _BeginEndDelete:
+    active: bool
+    profile_start: float
+    
+    def __enter__(self) -> bool:
+        if profiler.enabled:
+            self.profile_start = profiler.now()
+        self.active = ed.begin_delete()
+        return self.active
     
     def __exit__(self, exc_type, exc_value, traceback):
-        if exc_type is _Abortable.AbortException:
-            return True
+        if self.active:
+            ed.end_delete()
+        if profiler.enabled:
+            profiler.record("ed_ctx.on_delete", self.profile_start)
+
+def on_delete() -> _BeginEndDelete:
+    return _BeginEndDelete()
+
+
+"""
+    ed.query_deleted_link() / ed.query_deleted_node(), only valid while deleting
+"""
+def deleted_links() -> Iterator[ed.LinkId]:
+    while True:
+        link_id = ed.LinkId()
+        if not ed.query_deleted_link(link_id):
+            return
+        yield link_id
 
-def new_link() -> Tuple[ed.PinId, ed.PinId]:
-    return _QueryNewLink()
+def deleted_nodes() -> Iterator[ed.NodeId]:
+    while True:
+        node_id = ed.NodeId()
+        if not ed.query_deleted_node(node_id):
+            return
+        yield node_id
 
 
 """
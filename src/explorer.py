@@ -0,0 +1,319 @@
+from nodalhdl.core.structure import Structure
+
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Hashable, Iterator, List, Optional, Set, Tuple
+
+from imgui_bundle import hello_imgui, imgui # type: ignore
+
+from structure_index import StructureIndex
+
+
+"""
+    Where the Explorer gets the instance hierarchy from: the Structure once it is loaded, or the StructureIndex of an
+    editor opened from its index. Instances are identified by a source specific handle (the Structure, or the
+    position in the index hierarchy); a path is the tuple of instance names from the top level.
+"""
+class HierarchySource:
+    def root(self) -> Hashable:
+        raise NotImplementedError
+    
+    def instances(self, handle: Hashable) -> List[Tuple[str, Hashable]]:
+        # (instance name, handle) of the direct substructures
+        raise NotImplementedError
+    
+    def ports(self, path: Tuple[str, ...], handle: Hashable) -> List[str]:
+        # port full names of the instance
+        raise NotImplementedError
+    
+    def walk(self, limit: int) -> Iterator[Tuple[Tuple[str, ...], Optional[str]]]:
+        # (path, port full name or None) of every instance and port, depth first, at most limit of them
+        count = 0
+        stack = [((), self.root())]
+        while stack and count < limit:
+            path, handle = stack.pop()
+            if path:
+                yield path, None
+                count += 1
+            for port in self.ports(path, handle):
+                if count >= limit:
+                    return
+                yield path, port
+                count += 1
+            stack.extend((path + (name, ), child) for name, child in reversed(self.instances(handle)))
+
+
+class StructureSource(HierarchySource):
+    # the name index walks the source in the background while the top level can be edited; only the top level is
+    # (substructures are read only, see StructureEditor.editable), so it is copied here, on the UI thread
+    def __init__(self, structure: Structure):
+        self.structure = structure
+        self.top_instances = list(structure.substructures.items())
+        self.top_ports = [port_full_name for port_full_name, _ in structure.ports_inside_flipped.nodes()]
+    
+    def root(self) -> Structure:
+        return self.structure
+    
+    def instances(self, handle: Structure) -> List[Tuple[str, Structure]]:
+        return self.top_instances if handle is self.structure else list(handle.substructures.items())
+    
+    def ports(self, path: Tuple[str, ...], handle: Structure) -> List[str]:
+        return self.top_ports if handle is self.structure else [port_full_name for port_full_name, _ in handle.ports_inside_flipped.nodes()]
+
+
+class IndexSource(HierarchySource):
+    # the index only has the ports of the top level and of its direct substructures (the top level view model)
+    def __init__(self, index: StructureIndex):
+        self.index = index
+        self.subs_nodes: dict = None # instance name -> node index, built on first use
+    
+    def root(self) -> int:
+        return 0
+    
+    def instances(self, handle: int) -> List[Tuple[str, int]]:
+        return [(self.index.instance_name(i), i) for i in self.index.children(handle)]
+    
+    def _node_ports(self, node_index: int) -> List[str]:
+        a = self.index.arrays
+        start, end = int(a["node_pin_start"][node_index]), int(a["node_pin_start"][node_index + 1])
+        return [self.index.string(i) for i in a["pin_label"][start:end].tolist()]
+    
+    def ports(self, path: Tuple[str, ...], handle: int) -> List[str]:
+        a = self.index.arrays
+        if not path:
+            return [self.index.string(i) for i, is_io in zip(a["node_name"].tolist(), a["node_is_io"].tolist()) if is_io]
+        if len(path) > 1:
+            return []
+        if self.subs_nodes is None:
+            self.subs_nodes = {self.index.string(name): i for i, (name, is_io) in enumerate(zip(a["node_name"].tolist(), a["node_is_io"].tolist())) if not is_io}
+        node_index = self.subs_nodes.get(path[0])
+        return [] if node_index is None else self._node_ports(node_index)
+
+
+"""
+    Name search over the full names ("u_core.u_alu.a") of all instances and ports:
+        
+        prefix of the last name component, binary search over the sorted lower case names
+        substring of the full name, str.find over all lower case full names joined into one string
+    
+    Prefix matches come first, they are usually what is being typed. Built in the background, searching 100k+ names
+    takes a few milliseconds.
+"""
+class NameIndex:
+    entries: List[Tuple[Tuple[str, ...], Optional[str]]] # (path, port full name or None)
+    full_names: List[str]
+    truncated: bool # more names than the index was allowed to hold
+    
+    def __init__(self, entries: List[Tuple[Tuple[str, ...], Optional[str]]], truncated: bool = False):
+        self.entries = entries
+        self.truncated = truncated
+        self.full_names = [".".join(path if port is None else path + (port, )) for path, port in entries]
+        
+        lower = [full_name.lower() for full_name in self.full_names]
+        self.blob = "\n".join(lower)
+        self.starts: List[int] = []
+        start = 0
+        for name in lower:
+            self.starts.append(start)
+            start += len(name) + 1
+        
+        leaves = [(path[-1] if port is None else port).lower() for path, port in entries]
+        self.leaf_order: List[int] = sorted(range(len(leaves)), key = leaves.__getitem__)
+        self.sorted_leaves: List[str] = [leaves[i] for i in self.leaf_order]
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def search(self, query: str, limit: int) -> List[int]:
+        # entry indices, at most limit
+        query = query.lower()
+        if not query:
+            return []
+        
+        lo = bisect_left(self.sorted_leaves, query)
+        hi = bisect_left(self.sorted_leaves, query + "\U0010ffff", lo)
+        results = self.leaf_order[lo:min(hi, lo + limit)]
+        found = set(results)
+        
+        pos = self.blob.find(query)
+        while pos != -1 and len(results) < limit:
+            i = bisect_right(self.starts, pos) - 1
+            if i not in found:
+                results.append(i)
+                found.add(i)
+            pos = self.blob.find(query, self.starts[i + 1]) if i + 1 < len(self.starts) else -1
+        return results
+
+
+_executor: ThreadPoolExecutor = None
+
+def _build_name_index(source: HierarchySource, limit: int) -> NameIndex:
+    entries = list(source.walk(limit + 1))
+    return NameIndex(entries[:limit], len(entries) > limit)
+
+
+"""
+    row of the Explorer tree
+"""
+class ExplorerRow:
+    __slots__ = ("path", "port", "depth", "handle", "expanded")
+    
+    path: Tuple[str, ...] # the instance, or the instance the port belongs to
+    port: str # port full name, None for instances
+    depth: int
+    handle: Hashable # of the instance, None for ports
+    expanded: bool
+    
+    def __init__(self, path: Tuple[str, ...], port: Optional[str], depth: int, handle: Hashable):
+        self.path = path
+        self.port = port
+        self.depth = depth
+        self.handle = handle
+        self.expanded = False
+    
+    @property
+    def name(self) -> str:
+        return self.path[-1] if self.port is None else self.port
+
+
+"""
+    Instance hierarchy and ports of one structure, as a tree of rows.
+    
+    Only expanded instances have their children in the row list (built when expanded, dropped when collapsed), and
+    only the rows in view are submitted each frame (imgui.ListClipper), so the cost of a frame does not depend on the
+    size of the hierarchy. Clicking an instance or a port returns it from gui() for the editor to navigate to.
+"""
+class Explorer:
+    MAX_RESULTS = 1000 # search results listed
+    MAX_NAMES = 1 << 21 # names in the search index
+    
+    source: HierarchySource
+    rows: List[ExplorerRow]
+    expanded: Set[Tuple[str, ...]] # paths of the expanded instances, kept when the source is replaced
+    query: str
+    results: List[int] # entry indices into name_index
+    name_index_future: Future
+    name_index: NameIndex
+    name_index_failed: bool # built again with the next source
+    
+    def __init__(self, source: HierarchySource):
+        self.expanded = set()
+        self.query = ""
+        self.set_source(source)
+    
+    def set_source(self, source: HierarchySource):
+        # e.g. the structure of an editor opened from its index has been loaded
+        global _executor
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "explorer")
+        
+        self.source = source
+        self.rows = []
+        self.results = []
+        self.name_index = None
+        self.name_index_failed = False
+        self.name_index_future = _executor.submit(_build_name_index, source, Explorer.MAX_NAMES)
+        
+        root = source.root()
+        self._insert_children(0, (), root, 0)
+        
+        # expand what was expanded before, parents come before their children
+        for i, row in enumerate(self.rows):
+            if row.port is None and row.path in self.expanded:
+                self._expand(i)
+    
+    def _children(self, path: Tuple[str, ...], handle: Hashable, depth: int) -> List[ExplorerRow]:
+        rows = [ExplorerRow(path + (name, ), None, depth, child) for name, child in self.source.instances(handle)]
+        rows.extend(ExplorerRow(path, port, depth, None) for port in self.source.ports(path, handle))
+        return rows
+    
+    def _insert_children(self, row_index: int, path: Tuple[str, ...], handle: Hashable, depth: int):
+        self.rows[row_index:row_index] = self._children(path, handle, depth)
+    
+    def _expand(self, row_index: int):
+        row = self.rows[row_index]
+        row.expanded = True
+        self.expanded.add(row.path)
+        self._insert_children(row_index + 1, row.path, row.handle, row.depth + 1)
+    
+    def _collapse(self, row_index: int):
+        row = self.rows[row_index]
+        row.expanded = False
+        self.expanded.discard(row.path)
+        end = row_index + 1
+        while end < len(self.rows) and self.rows[end].depth > row.depth:
+            end += 1
+        del self.rows[row_index + 1:end]
+    
+    def _poll(self):
+        if self.name_index_future is not None and self.name_index_future.done():
+            future, self.name_index_future = self.name_index_future, None
+            if future.exception() is None:
+                self.name_index = future.result()
+                self.results = self.name_index.search(self.query, Explorer.MAX_RESULTS)
+            else:
+                self.name_index_failed = True
+                hello_imgui.log(hello_imgui.LogLevel.error, f"Could not index the names for the search: {future.exception()}")
+    
+    def gui(self) -> Optional[Tuple[Tuple[str, ...], Optional[str]]]:
+        # (path, port full name or None) of the clicked row or search result
+        self._poll()
+        clicked = None
+        
+        imgui.set_next_item_width(-1)
+        changed, self.query = imgui.input_text_with_hint("##search", "Search instances and ports", self.query)
+        if changed and self.name_index is not None:
+            self.results = self.name_index.search(self.query, Explorer.MAX_RESULTS)
+        
+        if self.query:
+            if self.name_index is None:
+                imgui.text_disabled("Search unavailable, see the logs" if self.name_index_failed else "Indexing names...")
+                return None
+            if self.name_index.truncated:
+                imgui.text_disabled(f"Only the first {len(self.name_index)} names are searched")
+            
+            with_more = len(self.results) >= Explorer.MAX_RESULTS
+            imgui.text_disabled(f"{len(self.results)}{'+' if with_more else ''} matches")
+            if imgui.begin_child("results"):
+                clipper = imgui.ListClipper()
+                clipper.begin(len(self.results))
+                while clipper.step():
+                    for i in range(clipper.display_start, clipper.display_end):
+                        entry_index = self.results[i]
+                        if imgui.selectable(f"{self.name_index.full_names[entry_index]}##{entry_index}", False)[0]:
+                            clicked = self.name_index.entries[entry_index]
+                clipper.end()
+            imgui.end_child()
+            return clicked
+        
+        # tree
+        if imgui.begin_child("tree"):
+            indent = imgui.get_style().indent_spacing
+            toggled = None
+            clipper = imgui.ListClipper()
+            clipper.begin(len(self.rows))
+            while clipper.step():
+                for i in range(clipper.display_start, clipper.display_end):
+                    row = self.rows[i]
+                    imgui.set_cursor_pos_x(imgui.get_cursor_pos_x() + row.depth * indent)
+                    flags = imgui.TreeNodeFlags_.no_tree_push_on_open | imgui.TreeNodeFlags_.span_avail_width
+                    if row.port is None:
+                        flags |= imgui.TreeNodeFlags_.open_on_arrow | imgui.TreeNodeFlags_.open_on_double_click
+                        imgui.set_next_item_open(row.expanded)
+                    else:
+                        flags |= imgui.TreeNodeFlags_.leaf
+                    is_open = imgui.tree_node_ex(f"{row.name}##{i}", flags)
+                    if row.port is None and is_open != row.expanded:
+                        toggled = i
+                    elif imgui.is_item_clicked() and not imgui.is_item_toggled_open():
+                        clicked = (row.path, row.port)
+            clipper.end()
+            
+            # changes the rows, so not while they are iterated
+            if toggled is not None:
+                if self.rows[toggled].expanded:
+                    self._collapse(toggled)
+                else:
+                    self._expand(toggled)
+        imgui.end_child()
+        return clicked
@@ -0,0 +1,399 @@
+"""
+    Headless schematic export, no window and no GPU:
+        
+        python src/export.py design.dill -o design.svg [--depth N] [--filter GLOB ...]
+        python src/export.py design.dill -o design.png [--scale S] [--depth N] [--filter GLOB ...]
+    
+    Nodes, pins and links come from the same StructureViewModel the editor draws, laid out like the editor does (the
+    positions saved by the editor, the automatic layout for the rest) and shaped by NodeGeometry, only with estimated
+    text widths instead of imgui's. The document is written while it is generated: SVG element by element, PNG in
+    bands of rows, each rasterized and compressed on its own, so memory does not grow with the size of the drawing.
+    
+    --depth N also exports the definitions of the substructures down to N levels, one section each (definitions used
+    by several instances once); --filter keeps only the instances whose name matches one of the patterns.
+"""
+import os
+import zlib
+import struct
+import fnmatch
+import argparse
+import time
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from view_model import StructureViewModel
+from node_geometry import TextMetrics, NodeGeometry
+from ed_ctx import IdRegistry
+from loader import LoadJob
+import layout
+import layout_store
+
+
+"""
+    text metrics without imgui: the default imgui font is monospaced, 7 x 13 px
+"""
+class ExportMetrics(TextMetrics):
+    char_width: float
+    
+    def __init__(self, char_width: float = 7.0, line_height: float = 13.0):
+        super().__init__()
+        self.char_width = char_width
+        self.line_height = line_height
+    
+    def update(self) -> bool:
+        return False
+    
+    def width(self, text: str) -> float:
+        return self.char_width * len(text)
+
+
+"""
+    one structure level in the exported document
+"""
+class Section:
+    PADDING = 40.0 # around the nodes
+    TITLE_HEIGHT = 32.0
+    
+    title: str
+    view_model: StructureViewModel
+    nodes: List[int] # kept node indices
+    geometry: Dict[int, NodeGeometry] # of the kept nodes
+    rects: np.ndarray # float64 (node count, 4), x0 y0 x1 y1 in the document, only valid for kept nodes
+    pivots: np.ndarray # float64 (pin count, 2), link end points in the document
+    links: List[Tuple[int, int]] # (driver pin, sink pin) between kept nodes
+    width: float
+    height: float
+    top: float # in the document, see offset()
+    
+    def __init__(self, title: str, view_model: StructureViewModel, positions: np.ndarray, patterns: List[str], metrics: TextMetrics):
+        self.title = title
+        self.view_model = view_model
+        self.top = 0.0
+        nodes, pins = view_model.nodes, view_model.pins
+        
+        # IO nodes are the boundary of the level and are always kept
+        self.nodes = [i for i, node in enumerate(nodes) if node.is_io or not patterns or any(fnmatch.fnmatchcase(node.name, p) for p in patterns)]
+        self.geometry = {i: NodeGeometry(view_model, i, metrics) for i in self.nodes}
+        
+        # node rect = padding (8, 4, 8, 8) around the content, like the editor's nodes
+        self.rects = np.zeros((len(nodes), 4))
+        if self.nodes:
+            kept = np.array(self.nodes)
+            sizes = np.array([(self.geometry[i].width + 16, self.geometry[i].height + 12) for i in self.nodes])
+            self.rects[kept, :2] = positions[kept]
+            self.rects[kept, 2:] = positions[kept] + sizes
+            x0, y0 = self.rects[kept, 0].min(), self.rects[kept, 1].min()
+            x1, y1 = self.rects[kept, 2].max(), self.rects[kept, 3].max()
+        else:
+            x0 = y0 = x1 = y1 = 0.0
+        self.rects -= (x0 - Section.PADDING, y0 - Section.PADDING - Section.TITLE_HEIGHT) * 2
+        self.width = x1 - x0 + 2 * Section.PADDING
+        self.height = y1 - y0 + 2 * Section.PADDING + Section.TITLE_HEIGHT
+        
+        self.pivots = np.zeros((len(pins), 2))
+        half_line = metrics.line_height * 0.5
+        for i, geometry in self.geometry.items():
+            ox, oy = self.rects[i, 0] + 8, self.rects[i, 1] + 4
+            for pin_index, (y, label_x0, _, _) in zip(nodes[i].inputs, geometry.input_rows):
+                self.pivots[pin_index] = (ox + label_x0, oy + y + half_line)
+            for pin_index, (y, label_x0, label_x1, _) in zip(nodes[i].outputs, geometry.output_rows):
+                self.pivots[pin_index] = (ox + (label_x0 if nodes[i].is_io else label_x1), oy + y + half_line) # like the editor
+        
+        kept_nodes = set(self.nodes)
+        self.links = [link for link in view_model.links if link is not None and pins[link[0]].node_index in kept_nodes and pins[link[1]].node_index in kept_nodes]
+    
+    def offset(self, dy: float):
+        # moves the section down in the document
+        self.rects[:, 1::2] += dy
+        self.pivots[:, 1] += dy
+        self.top += dy
+    
+    def link_points(self, segments: int = 12) -> np.ndarray:
+        # (link count, segments + 1, 2) points on the link curves, cubic beziers with horizontal tangents like the
+        # node editor's
+        if not self.links:
+            return np.zeros((0, segments + 1, 2))
+        ends = np.array(self.links)
+        p0, p3 = self.pivots[ends[:, 0]], self.pivots[ends[:, 1]]
+        dx = np.maximum(np.abs(p3[:, 0] - p0[:, 0]) * 0.5, 20.0)
+        p1, p2 = p0.copy(), p3.copy()
+        p1[:, 0] += dx
+        p2[:, 0] -= dx
+        t = np.linspace(0.0, 1.0, segments + 1)[None, :, None]
+        return ((1 - t) ** 3) * p0[:, None] + 3 * ((1 - t) ** 2) * t * p1[:, None] + 3 * (1 - t) * (t ** 2) * p2[:, None] + (t ** 3) * p3[:, None]
+
+
+"""
+    loading and laying out
+"""
+def node_positions(view_model: StructureViewModel) -> np.ndarray:
+    # what the editor would show: the saved positions, the (cached) automatic layout for the nodes without one
+    positions = layout.default_engine().request(view_model).result().astype(np.float64)
+    stored = layout_store.default_store().load(view_model.structure_id).result()
+    if stored is not None:
+        id_registry = IdRegistry()
+        node_ids = np.fromiter((id_registry.get_id(("node", node.key)) for node in view_model.nodes), dtype = np.uint64, count = len(view_model.nodes))
+        found, found_positions = stored.lookup(node_ids)
+        positions[found] = found_positions
+    return positions
+
+def _definitions(structure, depth: int) -> Iterator[Tuple[str, object, int]]:
+    # (first instance path, structure, instance count) of the substructure definitions down to depth levels, breadth
+    # first; leaves (no substructures of their own) are not worth a section
+    seen: Dict[str, list] = {}
+    level = [("", structure)]
+    for _ in range(depth):
+        next_level = []
+        for path, parent in level:
+            for name, child in parent.substructures.items():
+                child_path = f"{path}.{name}" if path else name
+                entry = seen.get(child.id)
+                if entry is not None:
+                    entry[2] += 1
+                    continue
+                seen[child.id] = entry = [child_path, child, 1]
+                next_level.append((child_path, child))
+        level = next_level
+    return (tuple(entry) for entry in seen.values() if entry[1].substructures)
+
+def build_sections(file_path: str, depth: int, patterns: List[str], metrics: TextMetrics) -> List[Section]:
+    # the index sidecar is enough for the top level alone, deeper levels need the structure
+    job = LoadJob(file_path, full = depth > 0)
+    job.run()
+    if job.state != LoadJob.DONE:
+        raise RuntimeError(job.status)
+    
+    sections = [Section(os.path.basename(file_path), job.view_model, node_positions(job.view_model), patterns, metrics)]
+    if depth > 0:
+        for path, structure, count in _definitions(job.structure, depth):
+            view_model = StructureViewModel(structure)
+            title = path if count == 1 else f"{path} (x{count})"
+            sections.append(Section(title, view_model, node_positions(view_model), patterns, metrics))
+    
+    # stacked top to bottom
+    top = 0.0
+    for section in sections:
+        section.offset(top)
+        top += section.height
+    return sections
+
+
+"""
+    SVG
+"""
+_COLORS = {
+    "background": (60, 60, 70),
+    "node": (32, 32, 36),
+    "border": (150, 150, 155),
+    "header": (80, 80, 86),
+    "text": (255, 255, 255),
+    "link": (220, 220, 220),
+    "title": (200, 200, 200)
+}
+
+def _hex(color: Tuple[int, int, int]) -> str:
+    return "#%02x%02x%02x" % color
+
+def _escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+def write_svg(sections: List[Section], f, metrics: TextMetrics):
+    width = max(section.width for section in sections)
+    height = sum(section.height for section in sections)
+    ascent = metrics.line_height * 0.8 # text y is its baseline
+    c = {name: _hex(color) for name, color in _COLORS.items()}
+    
+    f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    f.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" viewBox="0 0 {width:.0f} {height:.0f}">\n')
+    f.write(
+        "<style>"
+        f"text{{font-family:monospace;font-size:{metrics.line_height:g}px;fill:{c['text']}}}"
+        f".n{{fill:{c['node']};stroke:{c['border']};stroke-width:1}}"
+        f".h{{fill:{c['header']}}}"
+        f".l{{fill:none;stroke:{c['link']};stroke-width:1.5}}"
+        f".t{{font-size:{metrics.line_height * 1.5:g}px;fill:{c['title']}}}"
+        "</style>\n"
+    )
+    f.write(f'<rect width="100%" height="100%" fill="{c["background"]}"/>\n')
+    
+    for section in sections:
+        f.write(f'<g><text class="t" x="{Section.PADDING:g}" y="{section.top + Section.PADDING:.1f}">{_escape(section.title)}</text>\n')
+        
+        # links below the nodes, many per path element
+        links = section.links
+        for start in range(0, len(links), 1024):
+            parts = []
+            for d, s in links[start:start + 1024]:
+                (x0, y0), (x3, y3) = section.pivots[d], section.pivots[s]
+                dx = max(abs(x3 - x0) * 0.5, 20.0)
+                parts.append(f"M{x0:.1f} {y0:.1f}C{x0 + dx:.1f} {y0:.1f} {x3 - dx:.1f} {y3:.1f} {x3:.1f} {y3:.1f}")
+            f.write(f'<path class="l" d="{"".join(parts)}"/>\n')
+        
+        line_height = metrics.line_height
+        for i in section.nodes:
+            geometry = section.geometry[i]
+            x0, y0, x1, y1 = section.rects[i]
+            ox, oy = x0 + 8, y0 + 4
+            parts = [
+                f'<rect class="n" x="{x0:.1f}" y="{y0:.1f}" width="{x1 - x0:.1f}" height="{y1 - y0:.1f}" rx="8"/>',
+                f'<path class="h" d="M{x0:.1f} {y0 + 4 + geometry.header_height:.1f}V{y0 + 8:.1f}a8 8 0 0 1 8 -8H{x1 - 8:.1f}a8 8 0 0 1 8 8V{y0 + 4 + geometry.header_height:.1f}Z"/>',
+                f'<text x="{ox:.1f}" y="{oy + (geometry.header_height - line_height) * 0.5 + ascent:.1f}">{_escape(geometry.title)}</text>'
+            ]
+            for y, label_x0, _, label in geometry.input_rows + geometry.output_rows:
+                parts.append(f'<text x="{ox + label_x0:.1f}" y="{oy + y + ascent:.1f}">{_escape(label)}</text>')
+            f.write("".join(parts))
+            f.write("\n")
+        f.write("</g>\n")
+    f.write("</svg>\n")
+
+
+"""
+    PNG, rasterized with Pillow (comes with imgui-bundle) one band of rows at a time
+"""
+class _PngStream:
+    def __init__(self, f, width: int, height: int):
+        self.f = f
+        self.compressor = zlib.compressobj(1) # flat schematic colors compress well even at the fastest level
+        f.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) # 8 bit RGB
+    
+    def _chunk(self, kind: bytes, data: bytes):
+        self.f.write(struct.pack(">I", len(data)))
+        self.f.write(kind)
+        self.f.write(data)
+        self.f.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xffffffff))
+    
+    def write_rows(self, rgb: np.ndarray):
+        # (rows, width, 3) uint8, every row prefixed with filter type 0
+        rows = np.concatenate([np.zeros((rgb.shape[0], 1), dtype = np.uint8), rgb.reshape(rgb.shape[0], -1)], axis = 1)
+        data = self.compressor.compress(rows.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+    
+    def close(self):
+        self._chunk(b"IDAT", self.compressor.flush())
+        self._chunk(b"IEND", b"")
+
+class _TextMasks:
+    # rendered text, most labels ("i0", "o0", ...) repeat a lot and rendering is the slow part of a band
+    MAX_ENTRIES = 1 << 14
+    
+    def __init__(self, font):
+        self.font = font
+        self.masks = {}
+    
+    def get(self, text: str):
+        from PIL import Image, ImageDraw
+        
+        mask = self.masks.get(text)
+        if mask is None:
+            if len(self.masks) >= _TextMasks.MAX_ENTRIES:
+                self.masks.clear()
+            _, _, right, bottom = self.font.getbbox(text)
+            mask = Image.new("L", (max(int(right), 1), max(int(bottom), 1)))
+            ImageDraw.Draw(mask).text((0, 0), text, fill = 255, font = self.font)
+            self.masks[text] = mask
+        return mask
+
+def write_png(sections: List[Section], f, metrics: TextMetrics, scale: float = 1.0, band_bytes: int = 64 << 20):
+    # band_bytes: memory of one band of rows; layouts are wide (one column per signal flow layer), so the band height
+    # follows from the width
+    from PIL import Image, ImageDraw, ImageFont
+    
+    width = int(np.ceil(max(section.width for section in sections) * scale))
+    height = int(np.ceil(sum(section.height for section in sections) * scale))
+    band_height = int(min(256, max(8, band_bytes // (width * 3))))
+    try:
+        font = ImageFont.load_default(size = metrics.line_height * scale)
+    except TypeError: # Pillow < 10.1, fixed size bitmap font
+        font = ImageFont.load_default()
+    show_text = metrics.line_height * scale >= 6 # unreadable below, like the editor's zoomed out boxes
+    masks = _TextMasks(font)
+    
+    # everything in document pixels, with the bands each item touches
+    node_rects = np.concatenate([section.rects[section.nodes] for section in sections]) * scale
+    node_refs = [(section, i) for section in sections for i in section.nodes]
+    curves = [section.link_points() * scale for section in sections]
+    curves = np.concatenate(curves) if curves else np.zeros((0, 13, 2))
+    curve_y = np.stack([curves[:, :, 1].min(axis = 1), curves[:, :, 1].max(axis = 1)], axis = 1) if len(curves) else np.zeros((0, 2))
+    titles = [(section.title, section.top * scale) for section in sections]
+    
+    colors = _COLORS
+    png = _PngStream(f, width, height)
+    for band_top in range(0, height, band_height):
+        rows = min(band_height, height - band_top)
+        band_bottom = band_top + rows
+        image = Image.new("RGB", (width, rows), colors["background"])
+        draw = ImageDraw.Draw(image)
+        
+        for title, top in titles:
+            y = top + Section.PADDING * scale - band_top - metrics.line_height * 1.5 * scale
+            if -Section.TITLE_HEIGHT * scale < y < rows and show_text:
+                draw.text((Section.PADDING * scale, y), title, fill = colors["title"], font = font)
+        
+        for k in np.flatnonzero((curve_y[:, 1] >= band_top) & (curve_y[:, 0] < band_bottom)).tolist():
+            points = curves[k] - (0, band_top)
+            draw.line([tuple(p) for p in points.tolist()], fill = colors["link"], width = max(1, round(1.5 * scale)))
+        
+        for k in np.flatnonzero((node_rects[:, 3] >= band_top) & (node_rects[:, 1] < band_bottom)).tolist():
+            section, i = node_refs[k]
+            geometry = section.geometry[i]
+            x0, y0, x1, y1 = node_rects[k]
+            y0 -= band_top
+            y1 -= band_top
+            radius = 8 * scale
+            draw.rounded_rectangle((x0, y0, x1, y1), radius, fill = colors["node"], outline = colors["border"])
+            draw.rounded_rectangle((x0 + 1, y0 + 1, x1 - 1, y0 + (4 + geometry.header_height) * scale), radius, fill = colors["header"], corners = (True, True, False, False))
+            if show_text:
+                ox, oy = x0 + 8 * scale, y0 + 4 * scale
+                draw.bitmap((round(ox), round(oy + (geometry.header_height - metrics.line_height) * 0.5 * scale)), masks.get(geometry.title), fill = colors["text"])
+                for y, label_x0, _, label in geometry.input_rows + geometry.output_rows:
+                    draw.bitmap((round(ox + label_x0 * scale), round(oy + y * scale)), masks.get(label), fill = colors["text"])
+        
+        png.write_rows(np.asarray(image))
+    png.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Export the schematic of a structure file without opening a window")
+    parser.add_argument("file", help = "structure file (.dill)")
+    parser.add_argument("-o", "--output", required = True, help = "output file, .svg or .png")
+    parser.add_argument("--depth", type = int, default = 0, help = "also export substructure definitions this many levels down")
+    parser.add_argument("--filter", action = "append", default = [], metavar = "GLOB", help = "keep only instances whose name matches, may be repeated")
+    parser.add_argument("--scale", type = float, default = 1.0, help = "pixels per canvas unit (PNG)")
+    args = parser.parse_args()
+    
+    kind = os.path.splitext(args.output)[1].lower()
+    if kind not in (".svg", ".png"):
+        parser.error("the output must be a .svg or a .png file")
+    
+    t = time.perf_counter()
+    metrics = ExportMetrics()
+    sections = build_sections(args.file, args.depth, args.filter, metrics)
+    t_build = time.perf_counter() - t
+    
+    # written next to the output first, so a failed export does not leave half a file behind
+    tmp_path = f"{args.output}.tmp"
+    try:
+        if kind == ".svg":
+            with open(tmp_path, "w", encoding = "utf-8", buffering = 1 << 20) as f:
+                write_svg(sections, f, metrics)
+        else:
+            with open(tmp_path, "wb", buffering = 1 << 20) as f:
+                write_png(sections, f, metrics, args.scale)
+        os.replace(tmp_path, args.output)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    
+    nodes = sum(len(section.nodes) for section in sections)
+    links = sum(len(section.links) for section in sections)
+    print(f"{args.output}: {len(sections)} section(s), {nodes} nodes, {links} links; loaded and laid out in {t_build:.2f} s, written in {time.perf_counter() - t - t_build:.2f} s")
+    
+    layout.default_engine().shutdown()
+    layout_store.default_store().shutdown()
+
+
+if __name__ == "__main__":
+    main()
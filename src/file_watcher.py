@@ -0,0 +1,88 @@
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+"""
+    Polls the size and mtime of watched files in a background thread (no OS specific notification APIs, and a stat
+    per file and interval is nothing). A change is reported once the file has stayed the same for one more interval,
+    so that a file still being written by a generator script is not picked up half way.
+"""
+class FileWatcher:
+    INTERVAL = 0.5 # seconds
+    
+    watched: Dict[str, int] # path -> number of watchers
+    signatures: Dict[str, Optional[Tuple[int, int]]] # path -> (size, mtime_ns) last reported, None if missing
+    candidates: Dict[str, Optional[Tuple[int, int]]] # path -> changed signature seen in the last poll, not stable yet
+    changed: List[str] # stable changes not handed out by poll() yet
+    lock: threading.Lock
+    stop_event: threading.Event
+    thread: threading.Thread
+    
+    def __init__(self, interval: float = INTERVAL):
+        self.interval = interval
+        self.watched = {}
+        self.signatures = {}
+        self.candidates = {}
+        self.changed = []
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+    
+    @staticmethod
+    def _signature(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+    
+    def watch(self, path: str):
+        path = os.path.abspath(path)
+        with self.lock:
+            if path not in self.watched:
+                self.watched[path] = 0
+                self.signatures[path] = FileWatcher._signature(path)
+            self.watched[path] += 1
+        if self.thread is None:
+            self.thread = threading.Thread(target = self._run, name = "file_watcher", daemon = True)
+            self.thread.start()
+    
+    def unwatch(self, path: str):
+        path = os.path.abspath(path)
+        with self.lock:
+            if path not in self.watched:
+                return
+            self.watched[path] -= 1
+            if self.watched[path] == 0:
+                del self.watched[path]
+                self.signatures.pop(path, None)
+                self.candidates.pop(path, None)
+    
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            with self.lock:
+                paths = list(self.watched)
+            for path in paths:
+                signature = FileWatcher._signature(path)
+                with self.lock:
+                    if path not in self.watched:
+                        continue
+                    if signature == self.signatures[path]:
+                        self.candidates.pop(path, None)
+                    elif path in self.candidates and self.candidates[path] == signature: # settled
+                        del self.candidates[path]
+                        self.signatures[path] = signature
+                        if signature is not None: # deleted files are not reloaded, a new version will be
+                            self.changed.append(path)
+                    else:
+                        self.candidates[path] = signature
+    
+    def poll(self) -> List[str]:
+        # UI thread, absolute paths of the files changed since the last call
+        with self.lock:
+            changed, self.changed = self.changed, []
+        return changed
+    
+    def shutdown(self):
+        self.stop_event.set()
@@ -0,0 +1,289 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Tuple
+
+import numpy as np
+
+from view_model import StructureViewModel
+
+
+"""
+    graph of one structure level in array form, node indices follow StructureViewModel.nodes
+"""
+class LayoutGraph:
+    node_count: int
+    src: np.ndarray # edge sources (driver node), int64
+    dst: np.ndarray # edge targets (sink node), int64
+    side: np.ndarray # -1: structure input (left), 1: structure output (right), 0: substructure
+    widths: np.ndarray
+    heights: np.ndarray
+    
+    def __init__(self, view_model: StructureViewModel, char_width: float = 7.0, line_height: float = 17.0):
+        nodes, pins = view_model.nodes, view_model.pins
+        n = len(nodes)
+        self.node_count = n
+        
+        edges = np.array([(pins[d].node_index, pins[s].node_index) for d, s in filter(None, view_model.links)], dtype = np.int64).reshape(-1, 2)
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        edges = np.unique(edges, axis = 0) if len(edges) > 0 else edges
+        self.src, self.dst = edges[:, 0].copy(), edges[:, 1].copy()
+        
+        # an IO node driving the structure (output pin) is an input of the structure
+        self.side = np.zeros(n, dtype = np.int64)
+        self.side[:view_model.io_node_count] = [-1 if len(node.outputs) > 0 else 1 for node in nodes[:view_model.io_node_count]]
+        
+        # size estimates from the labels, close to what StructureEditor draws (padding 8/4/8/8, 28 px header)
+        name_len = np.array([len(node.name) for node in nodes], dtype = np.float64)
+        in_len = np.array([max((len(pins[i].label) for i in node.inputs), default = 0) for node in nodes], dtype = np.float64)
+        out_len = np.array([max((len(pins[i].label) for i in node.outputs), default = 0) for node in nodes], dtype = np.float64)
+        rows = np.array([max(len(node.inputs), len(node.outputs)) for node in nodes], dtype = np.float64)
+        is_io = self.side != 0
+        self.widths = np.where(is_io, 16 + char_width * name_len, 16 + char_width * np.maximum(name_len, in_len + out_len + 4))
+        self.heights = np.where(is_io, 12 + 2 * line_height, 12 + 28 + line_height * rows)
+    
+    def content_hash(self) -> str:
+        h = hashlib.blake2b(digest_size = 16)
+        for a in (self.src, self.dst, self.side, self.widths, self.heights):
+            h.update(np.ascontiguousarray(a).tobytes())
+        return h.hexdigest()
+
+
+"""
+    layering
+"""
+def _out_edges(starts: np.ndarray, frontier: np.ndarray) -> np.ndarray:
+    # indices (into the src-sorted edge arrays) of all out edges of the frontier nodes
+    counts = starts[frontier + 1] - starts[frontier]
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype = np.int64)
+    offsets = np.repeat(starts[frontier] - (np.cumsum(counts) - counts), counts)
+    return offsets + np.arange(total)
+
+def assign_layers(n: int, src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    # longest path layering, processed frontier by frontier; cycles (e.g. through registers) are broken by releasing
+    # the pending node with the fewest unresolved inputs
+    order = np.argsort(src, kind = "stable")
+    src_sorted, dst_sorted = src[order], dst[order]
+    starts = np.searchsorted(src_sorted, np.arange(n + 1))
+    
+    layer = np.zeros(n, dtype = np.int64)
+    indeg = np.bincount(dst, minlength = n).astype(np.int64)
+    done = np.zeros(n, dtype = bool)
+    frontier = np.flatnonzero(indeg == 0)
+    remaining = n
+    while remaining > 0:
+        if frontier.size == 0:
+            pending = np.flatnonzero(~done)
+            frontier = pending[np.argmin(indeg[pending])].reshape(1)
+        done[frontier] = True
+        remaining -= frontier.size
+        
+        edge_indices = _out_edges(starts, frontier)
+        targets = dst_sorted[edge_indices]
+        keep = ~done[targets] # back edges into placed nodes are ignored
+        targets, sources = targets[keep], src_sorted[edge_indices][keep]
+        if targets.size == 0:
+            frontier = np.zeros(0, dtype = np.int64)
+            continue
+        np.maximum.at(layer, targets, layer[sources] + 1)
+        indeg -= np.bincount(targets, minlength = n)
+        touched = np.unique(targets)
+        frontier = touched[indeg[touched] == 0]
+    return layer
+
+
+"""
+    crossing reduction, barycenter sweeps over all layers at once
+"""
+def _ranks(layer: np.ndarray, key: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    order = np.lexsort((key, layer))
+    layer_sizes = np.bincount(layer)
+    layer_starts = np.cumsum(layer_sizes) - layer_sizes
+    rank = np.empty_like(layer)
+    rank[order] = np.arange(layer.size) - layer_starts[layer[order]]
+    return rank, layer_sizes
+
+def order_layers(layer: np.ndarray, src: np.ndarray, dst: np.ndarray, iterations: int = 8) -> np.ndarray:
+    n = layer.size
+    rank, layer_sizes = _ranks(layer, np.arange(n))
+    for _ in range(iterations):
+        for a, b in ((src, dst), (dst, src)): # downwards by predecessors, upwards by successors
+            position = (rank + 0.5) / layer_sizes[layer] # normalized, layers differ in size
+            weight = np.bincount(b, weights = position[a], minlength = n)
+            count = np.bincount(b, minlength = n)
+            barycenter = np.where(count > 0, weight / np.maximum(count, 1), position)
+            rank, _ = _ranks(layer, barycenter)
+    return rank
+
+
+"""
+    coordinates
+"""
+def compute_layout(graph: LayoutGraph, gap_x: float = 80.0, gap_y: float = 24.0) -> np.ndarray:
+    n = graph.node_count
+    if n == 0:
+        return np.zeros((0, 2), dtype = np.float32)
+    
+    # structure inputs left, outputs right, substructures in between by signal flow
+    layer = assign_layers(n, graph.src, graph.dst)
+    is_subs = graph.side == 0
+    layer = np.where(is_subs, layer + 1, 0)
+    if is_subs.any():
+        layer = layer - (layer[is_subs].min() - 1) * is_subs # no empty layers before the first substructure
+    layer = np.where(graph.side > 0, layer.max() + 1, layer)
+    layer = np.unique(layer, return_inverse = True)[1].reshape(-1) # compact
+    
+    rank = order_layers(layer, graph.src, graph.dst)
+    
+    # x: layers side by side
+    layer_count = int(layer.max()) + 1
+    layer_widths = np.zeros(layer_count)
+    np.maximum.at(layer_widths, layer, graph.widths)
+    layer_x = np.concatenate(([0.0], np.cumsum(layer_widths + gap_x)[:-1]))
+    x = layer_x[layer] + (layer_widths[layer] - graph.widths) * 0.5
+    
+    # y: stacked within the layer, centered on 0
+    order = np.lexsort((rank, layer))
+    stacked = graph.heights[order] + gap_y
+    ends = np.cumsum(stacked)
+    layer_totals = np.bincount(layer, weights = graph.heights + gap_y, minlength = layer_count)
+    layer_ends = np.cumsum(layer_totals)
+    y = np.empty(n)
+    y[order] = ends - stacked - (layer_ends - layer_totals)[layer[order]] - layer_totals[layer[order]] * 0.5
+    
+    return np.stack([x, y], axis = 1).astype(np.float32)
+
+
+"""
+    Runs layouts in a background thread and caches them by structure id and content hash, in memory and on disk,
+    so reopening a design does not lay it out again.
+    
+    Every edit or reload of a design is a new content hash, so both caches are bounded: the memory cache drops the
+    least recently used layouts beyond CACHE_BYTES, and the cache directory is pruned on the worker thread (when the
+    engine starts, then every PRUNE_INTERVAL saves) of the files not used for CACHE_FILE_AGE seconds, then of the least
+    recently used ones beyond CACHE_DIR_BYTES. A file read from the cache is touched, its mtime is its last use.
+"""
+class LayoutEngine:
+    CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "nodalhdl_editor", "layouts")
+    CACHE_BYTES = 64 * 1024 * 1024 # positions kept in memory
+    CACHE_DIR_BYTES = 256 * 1024 * 1024 # files kept on disk
+    CACHE_FILE_AGE = 30 * 24 * 3600 # seconds
+    PRUNE_INTERVAL = 32 # saves
+    
+    executor: ThreadPoolExecutor
+    cache: "OrderedDict[str, np.ndarray]" # least recently used first
+    cache_nbytes: int
+    cache_dir: str
+    lock: threading.Lock
+    saves_since_prune: int # worker thread only
+    
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "layout")
+        self.cache = OrderedDict()
+        self.cache_nbytes = 0
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.saves_since_prune = 0
+        self.executor.submit(self.prune_cache_dir)
+    
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npy")
+    
+    def _remember(self, key: str, positions: np.ndarray):
+        with self.lock:
+            old = self.cache.pop(key, None)
+            if old is not None:
+                self.cache_nbytes -= old.nbytes
+            self.cache[key] = positions
+            self.cache_nbytes += positions.nbytes
+            while self.cache_nbytes > LayoutEngine.CACHE_BYTES and len(self.cache) > 1:
+                _, evicted = self.cache.popitem(last = False)
+                self.cache_nbytes -= evicted.nbytes
+    
+    def prune_cache_dir(self):
+        # worker thread; files another editor instance is writing at the same time are only ever .tmp files
+        try:
+            entries = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".npy") and entry.is_file()]
+        except OSError:
+            return
+        files = []
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort(reverse = True) # most recently used first
+        
+        now, total = time.time(), 0
+        for mtime, size, path in files:
+            total += size
+            if now - mtime > LayoutEngine.CACHE_FILE_AGE or total > LayoutEngine.CACHE_DIR_BYTES:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    
+    def _run(self, structure_id: str, graph: LayoutGraph) -> np.ndarray:
+        key = f"{structure_id}-{graph.content_hash()}"
+        
+        with self.lock:
+            positions = self.cache.get(key)
+            if positions is not None:
+                self.cache.move_to_end(key)
+        if positions is not None:
+            return positions
+        
+        path = self._cache_path(key)
+        if os.path.isfile(path):
+            try:
+                positions = np.load(path)
+                os.utime(path) # used now, see prune_cache_dir()
+            except (OSError, ValueError):
+                positions = None
+        if positions is None or positions.shape != (graph.node_count, 2):
+            positions = compute_layout(graph)
+            try:
+                os.makedirs(self.cache_dir, exist_ok = True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    np.save(f, positions)
+                os.replace(tmp_path, path)
+            except OSError:
+                pass # the cache is an optimization only
+            self.saves_since_prune += 1
+            if self.saves_since_prune >= LayoutEngine.PRUNE_INTERVAL:
+                self.saves_since_prune = 0
+                self.prune_cache_dir()
+        
+        self._remember(key, positions)
+        return positions
+    
+    def request(self, view_model: StructureViewModel) -> Future:
+        # Future of an (n, 2) float32 array of node positions, indexed like view_model.nodes; the graph arrays are
+        # taken here, on the caller's thread, the view model is updated in place by edits while the layout runs
+        return self.executor.submit(self._run, view_model.structure_id, LayoutGraph(view_model))
+    
+    def shutdown(self):
+        self.executor.shutdown(wait = False, cancel_futures = True)
+
+
+_default_engine: LayoutEngine = None
+
+def default_engine() -> LayoutEngine:
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = LayoutEngine()
+    return _default_engine
+
+def set_default_engine(engine: LayoutEngine):
+    # e.g. an engine with its own cache directory, for benchmarks
+    global _default_engine
+    if _default_engine is not None and _default_engine is not engine:
+        _default_engine.shutdown()
+    _default_engine = engine
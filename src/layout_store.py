@@ -0,0 +1,124 @@
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+"""
+    Node positions of a structure as saved by the user, one small binary file per Structure.id:
+        
+        magic b"NHLY", version (u32), count (u32), reserved (u32)
+        node ids, u64[count], sorted (IdRegistry ids of the node keys, stable across sessions)
+        positions, f32[count, 2]
+    
+    Loading is one read and two np.frombuffer, so even big designs come back in milliseconds.
+"""
+class StoredLayout:
+    node_ids: np.ndarray # uint64, sorted
+    positions: np.ndarray # float32 (count, 2), canvas space
+    
+    def __init__(self, node_ids: np.ndarray, positions: np.ndarray):
+        self.node_ids = node_ids
+        self.positions = positions
+    
+    def lookup(self, node_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # (found mask, positions of the found ones) for the given ids
+        if len(self.node_ids) == 0:
+            return np.zeros(len(node_ids), dtype = bool), np.zeros((0, 2), dtype = np.float32)
+        index = np.searchsorted(self.node_ids, node_ids)
+        index[index >= len(self.node_ids)] = 0
+        found = self.node_ids[index] == node_ids
+        return found, self.positions[index[found]]
+
+
+"""
+    Reads and writes StoredLayouts in a background thread. Writes are coalesced per structure: if a save is requested
+    while an older one for the same structure is still queued, only the newest data is written.
+"""
+class LayoutStore:
+    STORE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "nodalhdl_editor", "node_positions")
+    MAGIC = b"NHLY"
+    VERSION = 1
+    _HEADER = struct.Struct("<4sIII")
+    
+    executor: ThreadPoolExecutor
+    store_dir: str
+    pending: Dict[str, StoredLayout] # structure id -> newest data not written yet
+    lock: threading.Lock
+    
+    def __init__(self, store_dir: str = STORE_DIR):
+        self.executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "layout_store")
+        self.store_dir = store_dir
+        self.pending = {}
+        self.lock = threading.Lock()
+    
+    def _path(self, structure_id: str) -> str:
+        return os.path.join(self.store_dir, f"{structure_id}.nhly")
+    
+    def _read(self, structure_id: str) -> Optional[StoredLayout]:
+        with self.lock: # not written yet, still the newest
+            layout = self.pending.get(structure_id)
+        if layout is not None:
+            return layout
+        
+        try:
+            with open(self._path(structure_id), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        
+        if len(data) < LayoutStore._HEADER.size:
+            return None
+        magic, version, count, _ = LayoutStore._HEADER.unpack_from(data)
+        if magic != LayoutStore.MAGIC or version != LayoutStore.VERSION or len(data) != LayoutStore._HEADER.size + count * 16:
+            return None
+        node_ids = np.frombuffer(data, dtype = "<u8", count = count, offset = LayoutStore._HEADER.size)
+        positions = np.frombuffer(data, dtype = "<f4", count = count * 2, offset = LayoutStore._HEADER.size + count * 8).reshape(count, 2)
+        return StoredLayout(node_ids, positions)
+    
+    def _write(self, structure_id: str):
+        with self.lock:
+            layout = self.pending.pop(structure_id, None)
+        if layout is None: # coalesced into an earlier write
+            return
+        
+        path = self._path(structure_id)
+        os.makedirs(self.store_dir, exist_ok = True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(LayoutStore._HEADER.pack(LayoutStore.MAGIC, LayoutStore.VERSION, len(layout.node_ids), 0))
+            f.write(layout.node_ids.astype("<u8").tobytes())
+            f.write(layout.positions.astype("<f4").tobytes())
+        os.replace(tmp_path, path)
+    
+    def load(self, structure_id: str) -> Future:
+        # Future of the StoredLayout, None if nothing was saved for the structure
+        return self.executor.submit(self._read, structure_id)
+    
+    def save(self, structure_id: str, node_ids: np.ndarray, positions: np.ndarray) -> Future:
+        order = np.argsort(node_ids)
+        with self.lock:
+            self.pending[structure_id] = StoredLayout(node_ids[order], positions[order])
+        return self.executor.submit(self._write, structure_id)
+    
+    def shutdown(self, wait: bool = True):
+        # waits for the queued writes by default, so nothing saved is lost on exit
+        self.executor.shutdown(wait = wait)
+
+
+_default_store: LayoutStore = None
+
+def default_store() -> LayoutStore:
+    global _default_store
+    if _default_store is None:
+        _default_store = LayoutStore()
+    return _default_store
+
+def set_default_store(store: LayoutStore):
+    global _default_store
+    if _default_store is not None and _default_store is not store:
+        _default_store.shutdown()
+    _default_store = store
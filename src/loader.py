@@ -0,0 +1,171 @@
+from nodalhdl.core.structure import Structure
+
+import os
+import threading
+import dill
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List
+
+from view_model import StructureViewModel
+import structure_index
+from structure_index import StructureIndex
+
+
+class LoadCancelled(Exception): pass
+
+
+"""
+    file wrapper handed to the unpickler, reports the consumed bytes and aborts the unpickle once cancelled
+"""
+class _ProgressReader:
+    def __init__(self, file, job: "LoadJob"):
+        self.file = file
+        self.job = job
+    
+    def _advance(self, data: bytes) -> bytes:
+        if self.job.cancel_event.is_set():
+            raise LoadCancelled()
+        self.job.bytes_read += len(data)
+        return data
+    
+    def read(self, size: int = -1) -> bytes:
+        return self._advance(self.file.read(size))
+    
+    def readline(self, size: int = -1) -> bytes:
+        return self._advance(self.file.readline(size))
+
+
+"""
+    one structure file being loaded
+"""
+class LoadJob:
+    LOADING = "loading"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    
+    file_path: str
+    file_size: int
+    bytes_read: int
+    status: str # human readable step
+    state: str
+    
+    full: bool # unpickle the structure even if there is a valid index
+    
+    structure: Structure # None if only the index was read
+    view_model: StructureViewModel
+    index: StructureIndex
+    error: BaseException
+    
+    cancel_event: threading.Event
+    future: Future
+    
+    def __init__(self, file_path: str, full: bool = False):
+        self.file_path = file_path
+        self.full = full
+        self.file_size = 0
+        self.bytes_read = 0
+        self.status = "queued"
+        self.state = LoadJob.LOADING
+        
+        self.structure = None
+        self.view_model = None
+        self.index = None
+        self.error = None
+        
+        self.cancel_event = threading.Event()
+        self.future = None
+    
+    @property
+    def progress(self) -> float:
+        if self.state != LoadJob.LOADING:
+            return 1.0
+        if self.view_model is None and self.file_size > 0:
+            return 0.9 * min(self.bytes_read / self.file_size, 1.0) # the last 10% are the view model
+        return 0.9
+    
+    def cancel(self):
+        self.cancel_event.set()
+        if self.future is not None and self.future.cancel(): # not started yet
+            self.state = LoadJob.CANCELLED
+            self.status = "cancelled"
+    
+    def run(self):
+        # worker thread; the UI only reads the fields written here
+        try:
+            self.file_size = os.path.getsize(self.file_path)
+            
+            # index sidecar, the structure itself is unpickled later, when it is needed
+            if not self.full:
+                self.status = "reading index"
+                index = structure_index.open_index(self.file_path)
+                if index is not None:
+                    view_model = index.view_model()
+                    if self.cancel_event.is_set():
+                        raise LoadCancelled()
+                    self.index, self.view_model = index, view_model
+                    self.status = "done (index)"
+                    self.state = LoadJob.DONE
+                    return
+            
+            self.status = "reading"
+            with open(self.file_path, "rb") as f: # same as Structure.load_dill, but observable
+                structure = dill.load(_ProgressReader(f, self))
+            if not isinstance(structure, Structure):
+                raise TypeError(f"{self.file_path} does not contain a Structure")
+            
+            self.status = "building view"
+            view_model = StructureViewModel(structure)
+            if self.cancel_event.is_set():
+                raise LoadCancelled()
+            
+            self.status = "writing index"
+            try:
+                structure_index.write_index(self.file_path, structure, view_model)
+            except OSError: # e.g. a read-only directory, the next open is just not faster
+                pass
+            
+            self.structure, self.view_model = structure, view_model
+            self.status = "done"
+            self.state = LoadJob.DONE
+        except LoadCancelled:
+            self.status = "cancelled"
+            self.state = LoadJob.CANCELLED
+        except Exception as e:
+            self.error = e
+            self.status = f"failed: {e}"
+            self.state = LoadJob.FAILED
+
+
+"""
+    Loads structure files in background threads, several at a time.
+    
+    Threads rather than processes: the Structure has to end up in the UI process, and sending it back from a worker
+    process would mean unpickling it once more on the UI thread. The unpickle still runs under the GIL, but it gives
+    it up at the Python level calls it makes (_ProgressReader, dill's reconstructors), so the UI keeps drawing frames,
+    only slower, while a load is running.
+"""
+class StructureLoader:
+    executor: ThreadPoolExecutor
+    jobs: List[LoadJob]
+    
+    def __init__(self, max_workers: int = 4):
+        self.executor = ThreadPoolExecutor(max_workers = max_workers, thread_name_prefix = "structure_loader")
+        self.jobs = []
+    
+    def load(self, file_path: str, full: bool = False) -> LoadJob:
+        job = LoadJob(file_path, full)
+        job.future = self.executor.submit(job.run)
+        self.jobs.append(job)
+        return job
+    
+    def poll(self) -> List[LoadJob]:
+        # UI thread, returns the jobs finished (done, failed or cancelled) since the last call
+        finished = [job for job in self.jobs if job.state != LoadJob.LOADING]
+        self.jobs = [job for job in self.jobs if job.state == LoadJob.LOADING]
+        return finished
+    
+    def shutdown(self):
+        for job in self.jobs:
+            job.cancel()
+        self.executor.shutdown(wait = False)
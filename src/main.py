@@ -1,17 +1,363 @@
-from typing import Callable
+import os
+import time
+from typing import Callable, Dict, List, Tuple, Union
 
 from imgui_bundle import hello_imgui, imgui # type: ignore
 
 from imgui_bundle import portable_file_dialogs as pfd # type: ignore
 
 from structure_editor import StructureEditor
+from loader import StructureLoader, LoadJob
+from analysis import AnalysisPool, AnalysisJob
+from file_watcher import FileWatcher
+from explorer import Explorer, StructureSource, IndexSource
+import profiler
+import layout_store
 
 from nodalhdl.core.structure import Structure
 
 
+""" Editors """
+class EditorEntry:
+    label: str # dockable window label
+    job: LoadJob
+    editor: StructureEditor # None until the job is done
+    last_shown: int # frame index of the last frame the window was drawn in
+    explorer: Explorer # built when first shown in the Explorer window
+    explorer_of: tuple # (structure or index, edit count) the explorer was built from
+    path: Tuple[str, ...] # instance shown in the window (drilled down in place), () for the top level
+    reload_pending: bool # the file changed on disk, loaded again once the current job is done
+    reload_job: LoadJob # a reload done while the editor had edits, applied only once the user agrees
+    
+    def __init__(self, label: str, job: LoadJob):
+        self.label = label
+        self.job = job
+        self.editor = None
+        self.last_shown = 0
+        self.explorer = None
+        self.explorer_of = None
+        self.path = ()
+        self.reload_pending = False
+        self.reload_job = None
+
+
+"""
+    A substructure instance of an open file in a window of its own ("Open in New Tab"). It shows the editor of the
+    instance kept by the file's top level editor (see StructureEditor.child), and is closed with the file.
+"""
+class LevelTab:
+    label: str
+    entry: EditorEntry
+    path: Tuple[str, ...] # instance shown, drilling down in the tab changes it
+    
+    def __init__(self, label: str, entry: EditorEntry, path: Tuple[str, ...]):
+        self.label = label
+        self.entry = entry
+        self.path = path
+
+
+"""
+    Owns the structure editors and their windows. Closing an editor removes its window and destroys its node editor
+    context right away, instead of leaving both to the garbage collector (the window's gui lambda keeps everything
+    alive). Editors whose window was not drawn in the last frame (closed with the x, or behind another tab) are
+    candidates for eviction: while the editors together exceed memory_budget, the least recently shown ones drop their
+    view model and node editor context, which are rebuilt when they are shown again.
+    
+    Also starts the analysis jobs editors ask for, streams their output into the Logs window and hands the deduced
+    types back to the editor, and reloads the structure files that change on disk (e.g. rewritten by a generator
+    script) into their open editors, see StructureEditor.set_structure; an editor with edits keeps them until the
+    user agrees to reload.
+    
+    Substructure instances are opened from an editor either in place (the file's window shows the instance, with a
+    breadcrumb back up) or in a LevelTab; their editors belong to the file's top level editor either way.
+"""
+class EditorManager:
+    MEMORY_BUDGET = 1024 * 1024 * 1024 # bytes, see StructureEditor.cache_size
+    
+    loader: StructureLoader
+    analysis: AnalysisPool
+    watcher: FileWatcher
+    memory_budget: int
+    entries: Dict[str, EditorEntry]
+    closing: List[EditorEntry]
+    reloading: List[EditorEntry] # reloads the user agreed to, applied in the next update()
+    tabs: Dict[str, LevelTab]
+    drawn: List[StructureEditor] # editors drawn since the last activity()
+    frame_index: int
+    serial: int
+    
+    def __init__(self, loader: StructureLoader, analysis: AnalysisPool, memory_budget: int = MEMORY_BUDGET):
+        self.loader = loader
+        self.analysis = analysis
+        self.watcher = FileWatcher()
+        self.memory_budget = memory_budget
+        self.entries = {}
+        self.closing = []
+        self.reloading = []
+        self.tabs = {}
+        self.drawn = []
+        self.frame_index = 0
+        self.serial = 0
+    
+    def open(self, file_path: str) -> EditorEntry:
+        self.serial += 1
+        entry = EditorEntry(f"{os.path.basename(file_path)}###Editor_{self.serial}", self.loader.load(file_path))
+        self.entries[entry.label] = entry
+        self.watcher.watch(file_path)
+        add_window(entry.label, lambda: gui_structure_editor(self, entry), init_dockspace = "MainDockSpace")
+        return entry
+    
+    def open_tab(self, entry: EditorEntry, path: Tuple[str, ...]):
+        self.serial += 1
+        tab = LevelTab(f"{os.path.basename(entry.job.file_path)}: {'.'.join(path)}###Level_{self.serial}", entry, path)
+        self.tabs[tab.label] = tab
+        add_window(tab.label, lambda: gui_level_tab(self, tab), init_dockspace = "MainDockSpace", remember_is_visible = False)
+    
+    def _close_tab(self, tab: LevelTab):
+        hello_imgui.remove_dockable_window(tab.label)
+        self.tabs.pop(tab.label, None)
+    
+    def close(self, entry: EditorEntry):
+        # deferred to the next update(), the window may be in the middle of drawing
+        if entry not in self.closing:
+            self.closing.append(entry)
+    
+    def confirm_reload(self, entry: EditorEntry, accept: bool):
+        # answer to a held reload (see gui_reload_notice): apply it in the next update(), or keep the edits
+        if accept:
+            self.reloading.append(entry)
+        else:
+            entry.reload_job = None
+            hello_imgui.log(hello_imgui.LogLevel.info, f"Kept the edits of {entry.job.file_path}, not reloaded")
+    
+    def _reload(self, entry: EditorEntry, job: LoadJob):
+        entry.reload_job = None
+        diff = entry.editor.set_structure(job.structure, job.view_model)
+        job.view_model = None # the editor owns it now, and may drop it
+        hello_imgui.log(hello_imgui.LogLevel.info, f"Loaded {job.file_path}" + (f": {diff.summary()}" if diff else ""))
+    
+    def _close(self, entry: EditorEntry):
+        entry.job.cancel()
+        if entry.editor is not None:
+            if entry.editor.analysis_job is not None:
+                entry.editor.analysis_job.cancel()
+            if entry.editor.instance_job is not None:
+                entry.editor.instance_job.cancel()
+            for editor in entry.editor.editors():
+                if editor.layout_changed_time is not None: # moved, not saved yet
+                    editor.save_layout()
+            entry.editor.destroy_context()
+            entry.editor = None
+        for tab in [tab for tab in self.tabs.values() if tab.entry is entry]:
+            self._close_tab(tab)
+        hello_imgui.remove_dockable_window(entry.label)
+        self.entries.pop(entry.label, None)
+        self.watcher.unwatch(entry.job.file_path)
+    
+    def update(self):
+        # UI thread, before each frame
+        self.frame_index += 1
+        
+        for entry in self.closing:
+            self._close(entry)
+        self.closing = []
+        
+        # tabs closed with their x
+        docking_params = hello_imgui.get_runner_params().docking_params
+        for tab in list(self.tabs.values()):
+            window = docking_params.dockable_window_of_name(tab.label)
+            if window is not None and not window.is_visible:
+                self._close_tab(tab)
+        
+        # analysis requested in an editor, once its structure is there
+        for entry in self.entries.values():
+            editor = entry.editor
+            if editor is None or editor.analysis_request is None:
+                continue
+            if editor.structure is not None:
+                kind, output_dir = editor.analysis_request
+                editor.analysis_request = None
+                editor.analysis_job = self.analysis.submit(os.path.basename(entry.job.file_path), editor.structure, kind, output_dir)
+                editor.analysis_of = (editor.structure, editor.edit_count)
+            elif entry.job.full and entry.job.state != LoadJob.LOADING: # the full load failed
+                editor.analysis_request = None
+                hello_imgui.log(hello_imgui.LogLevel.error, f"Cannot analyze {entry.job.file_path} without its structure")
+            else:
+                editor.structure_requested = True
+        
+        # instances to add from a file, loaded like the file itself
+        for entry in self.entries.values():
+            editor = entry.editor
+            if editor is not None and editor.instance_request is not None and editor.instance_job is None:
+                editor.instance_job = self.loader.load(editor.instance_request[0], full = True)
+        
+        # editors opened from an index that need the structure now
+        for entry in self.entries.values():
+            if entry.editor is not None and entry.editor.structure_requested and entry.job.state != LoadJob.LOADING:
+                entry.editor.structure_requested = False
+                entry.job = self.loader.load(entry.job.file_path, full = True)
+        
+        # files rewritten on disk, reloaded in the background and patched into the editors showing them; a change
+        # while the file is being loaded is loaded again after that job, which may have read the old content
+        for file_path in self.watcher.poll():
+            for entry in self.entries.values():
+                if os.path.abspath(entry.job.file_path) == file_path:
+                    entry.reload_pending = True
+        for entry in self.entries.values():
+            if entry.reload_pending and entry.editor is not None and entry.job.state != LoadJob.LOADING:
+                entry.reload_pending = False
+                entry.job = self.loader.load(entry.job.file_path, full = True)
+                hello_imgui.log(hello_imgui.LogLevel.info, f"Reloading {entry.job.file_path}, it changed on disk")
+        
+        # reloads agreed to
+        reloading, self.reloading = self.reloading, []
+        for entry in reloading:
+            if entry.editor is not None and entry.reload_job is not None:
+                self._reload(entry, entry.reload_job)
+        
+        # hand finished loads over to their editor windows; a reload would throw the edits (the undo history) away,
+        # it waits for the user's answer then
+        for job in self.loader.poll():
+            adding = next((entry.editor for entry in self.entries.values() if entry.editor is not None and entry.editor.instance_job is job), None)
+            if adding is not None:
+                adding.add_loaded_instance(job)
+                job.view_model = None
+                continue
+            entry = next((entry for entry in self.entries.values() if entry.job is job), None)
+            if job.state == LoadJob.DONE:
+                if entry is not None and entry.editor is None:
+                    entry.editor = StructureEditor(job.structure, job.view_model, job.index)
+                    hello_imgui.log(hello_imgui.LogLevel.info, f"Loaded {job.file_path}" if job.structure is not None else f"Opened {job.file_path} from its index")
+                elif entry is not None and (entry.editor.commands.can_undo() or entry.editor.commands.can_redo()):
+                    entry.reload_job = job
+                    hello_imgui.log(hello_imgui.LogLevel.warning, f"{job.file_path} changed on disk, reloading it discards the edits made here")
+                    continue
+                elif entry is not None:
+                    self._reload(entry, job)
+                job.view_model = None # the editor owns it now, and may drop it
+            else:
+                if job.state == LoadJob.FAILED:
+                    hello_imgui.log(hello_imgui.LogLevel.error, f"Failed to load {job.file_path}: {job.error}")
+                else:
+                    hello_imgui.log(hello_imgui.LogLevel.warning, f"Cancelled loading {job.file_path}")
+                if entry is not None and entry.editor is not None and entry.editor.structure is None:
+                    entry.editor.drop_structure_requests()
+        
+        self._poll_analysis()
+        self._evict()
+    
+    def _poll_analysis(self):
+        finished = self.analysis.poll()
+        for job in self.analysis.jobs + finished: # finished ones may have said something last
+            while job.messages:
+                level, text = job.messages.popleft()
+                hello_imgui.log(getattr(hello_imgui.LogLevel, level), f"[{job.name}] {text}")
+        
+        for job in finished:
+            entry = next((entry for entry in self.entries.values() if entry.editor is not None and entry.editor.analysis_job is job), None)
+            if job.state == AnalysisJob.DONE:
+                hello_imgui.log(hello_imgui.LogLevel.info, f"[{job.name}] Deduced the types of {len(job.port_types)} ports")
+                if entry is not None and entry.editor.analysis_of != (entry.editor.structure, entry.editor.edit_count):
+                    hello_imgui.log(hello_imgui.LogLevel.warning, f"[{job.name}] Not shown, the structure was edited or reloaded since the analysis started")
+                elif entry is not None:
+                    entry.editor.set_port_types(job.port_types)
+            elif job.state == AnalysisJob.FAILED:
+                hello_imgui.log(hello_imgui.LogLevel.error, f"[{job.name}] Analysis failed: {job.error}")
+            else:
+                hello_imgui.log(hello_imgui.LogLevel.warning, f"[{job.name}] Analysis cancelled")
+    
+    def activity(self) -> Tuple[bool, bool]:
+        # (an editor drawn since the last call needs frames at full rate, one waits for background work); hidden
+        # editors do not draw, their pending work is picked up when they are shown again
+        drawn, self.drawn = self.drawn, []
+        redraw = any(editor.needs_redraw() for editor in drawn)
+        waiting = any(editor.is_waiting() or editor.analysis_request is not None for editor in drawn)
+        return redraw, waiting
+    
+    def _evict(self):
+        editors = [entry for entry in self.entries.values() if entry.editor is not None]
+        total = sum(entry.editor.cache_size() for entry in editors)
+        if total <= self.memory_budget:
+            return
+        
+        hidden = [entry for entry in editors if entry.last_shown < self.frame_index - 1 and entry.editor.cache_size() > 0]
+        for entry in sorted(hidden, key = lambda entry: entry.last_shown): # least recently shown first
+            if total <= self.memory_budget:
+                break
+            total -= entry.editor.cache_size()
+            entry.editor.release_caches()
+            hello_imgui.log(hello_imgui.LogLevel.debug, f"Released the caches of hidden editor {entry.job.file_path}")
+    
+    def shutdown(self):
+        self.watcher.shutdown()
+        for entry in self.entries.values():
+            for editor in entry.editor.editors() if entry.editor is not None else ():
+                if editor.layout_changed_time is not None:
+                    editor.save_layout()
+
+
+"""
+    Frames are only rendered when needed. Input wakes hello_imgui up by itself; everything else is reported by the
+    editors and the background jobs before each frame, and decides how fast hello_imgui idles:
+        
+        ACTIVE      a change is being drawn (an edit, a load handed over, a trace, navigation), full frame rate
+        WAITING     background work (loads, analysis, layouts, saves) is running, POLL_FPS to pick its results up
+        IDLE        nothing but input can change what is shown, IDLE_FPS
+    
+    cpu_percent is the CPU time of the process (all threads) per wall time over the last CPU_SAMPLE_TIME seconds, in
+    percent of one core; when idle it should stay below IDLE_CPU_TARGET.
+"""
 class AppState:
+    ACTIVE = "active"
+    WAITING = "waiting"
+    IDLE = "idle"
+    
+    POLL_FPS = 10.0
+    IDLE_FPS = 1.0 # still polls the file watcher, input events end the wait right away
+    CPU_SAMPLE_TIME = 2.0 # seconds
+    IDLE_CPU_TARGET = 2.0 # percent of one core
+    
     def __init__(self):
-        pass
+        self.loader: StructureLoader = StructureLoader()
+        self.analysis: AnalysisPool = AnalysisPool()
+        self.editors: EditorManager = EditorManager(self.loader, self.analysis)
+        self.explorer_label: str = None # editor shown in the Explorer, None for the most recently shown one
+        self.throttling: bool = True # False renders every frame at full rate
+        self.activity: str = AppState.ACTIVE
+        self.cpu_sample: Tuple[float, float] = (time.monotonic(), time.process_time())
+        self.cpu_percent: float = None # None until the first sample
+    
+    def update(self):
+        profiler.new_frame()
+        self.editors.update()
+        self._update_activity()
+        self._sample_cpu()
+    
+    def _update_activity(self):
+        redraw, waiting = self.editors.activity()
+        if redraw:
+            self.activity = AppState.ACTIVE
+        elif waiting or self.loader.jobs or self.analysis.jobs:
+            self.activity = AppState.WAITING
+        else:
+            self.activity = AppState.IDLE
+        
+        fps_idling = hello_imgui.get_runner_params().fps_idling
+        fps_idling.enable_idling = self.throttling and self.activity != AppState.ACTIVE
+        fps_idling.fps_idle = AppState.POLL_FPS if self.activity == AppState.WAITING else AppState.IDLE_FPS
+    
+    def _sample_cpu(self):
+        wall, cpu = time.monotonic(), time.process_time()
+        wall_start, cpu_start = self.cpu_sample
+        if wall - wall_start >= AppState.CPU_SAMPLE_TIME:
+            self.cpu_percent = (cpu - cpu_start) / (wall - wall_start) * 100.0
+            self.cpu_sample = (wall, cpu)
+    
+    def shutdown(self):
+        self.loader.shutdown()
+        self.analysis.shutdown()
+        self.editors.shutdown()
+        layout_store.default_store().shutdown(wait = True)
 
 
 """ Dockable Window """
@@ -33,17 +379,162 @@ def gui_menu(runner_params: hello_imgui.RunnerParams):
 def gui_app_menu(app_state: AppState):
     clicked_load_structure_from_file, _ = imgui.menu_item("Load Structure From File", "", False)
     if clicked_load_structure_from_file:
-        open_file_dialog = pfd.open_file("Select a structure file")
+        open_file_dialog = pfd.open_file("Select a structure file", options = pfd.opt.multiselect)
         res = open_file_dialog.result()
-        if open_file_dialog is not None and res is not None and len(res) > 0:
-            file_path = res[0]
-            
-            # 检查文件
-            
-            new_editor = StructureEditor(Structure.load_dill(file_path))
-            add_window(f"Editor_{hash(new_editor)}", lambda: new_editor.gui(), init_dockspace = "MainDockSpace")
+        if open_file_dialog is not None and res is not None:
+            for file_path in res:
+                # 检查文件
+                if not os.path.isfile(file_path):
+                    continue
+                
+                app_state.editors.open(file_path)
             
             # TODO check state in new_editor (e.g. events) 例如用 structure_editor 中的状态的引用传进去拿出来放到 appstate
+    
+    if imgui.begin_menu("Close Structure", len(app_state.editors.entries) > 0):
+        for entry in list(app_state.editors.entries.values()):
+            clicked, _ = imgui.menu_item(entry.job.file_path, "", False)
+            if clicked:
+                app_state.editors.close(entry)
+        imgui.end_menu()
+    
+    _, app_state.throttling = imgui.menu_item("Render Only When Needed", "", app_state.throttling)
+    
+    if imgui.begin_menu("Cancel Analysis", len(app_state.analysis.jobs) > 0):
+        for job in list(app_state.analysis.jobs):
+            clicked, _ = imgui.menu_item(f"{job.name}: {job.status}", "", False)
+            if clicked:
+                job.cancel()
+        imgui.end_menu()
+
+
+""" Structure Editor """
+def gui_breadcrumb(entry: EditorEntry, view: Union[EditorEntry, LevelTab]):
+    # the levels from the file down to the one shown, each one a button back to it
+    if imgui.small_button(f"{os.path.basename(entry.job.file_path)}##level_0"):
+        view.path = ()
+    for k, subs_inst_name in enumerate(view.path):
+        imgui.same_line()
+        imgui.text_disabled(">")
+        imgui.same_line()
+        if k == len(view.path) - 1:
+            imgui.text_unformatted(subs_inst_name)
+        elif imgui.small_button(f"{subs_inst_name}##level_{k + 1}"):
+            view.path = view.path[:k + 1]
+
+def gui_level(manager: EditorManager, entry: EditorEntry, view: Union[EditorEntry, LevelTab], breadcrumb: bool):
+    # the editor of the instance at view.path, created when first shown
+    top = entry.editor
+    editor = top.descendant(view.path)
+    if editor is None: # the instance is gone (reloaded, removed)
+        view.path = ()
+        editor = top
+    if breadcrumb or view.path:
+        gui_breadcrumb(entry, view)
+    editor.gui()
+    manager.drawn.append(editor)
+    
+    # drill down, here or in a new tab; an editor opened from an index loads its structure first
+    if editor.open_request is not None:
+        if top.structure is None:
+            top.structure_requested = True
+        else:
+            path, new_tab = editor.open_request
+            editor.open_request = None
+            if new_tab:
+                manager.open_tab(entry, path)
+            else:
+                view.path = path
+                editor.mark_dirty()
+
+def gui_level_tab(manager: EditorManager, tab: LevelTab):
+    entry = tab.entry
+    if entry.editor is None: # being reloaded
+        imgui.text_unformatted(entry.job.status)
+        return
+    entry.last_shown = manager.frame_index # the file's editors are in use
+    gui_level(manager, entry, tab, True)
+
+def gui_reload_notice(manager: EditorManager, entry: EditorEntry):
+    # a new version of the file is loaded but not shown, the editor has edits that would be lost
+    commands = entry.editor.commands
+    imgui.text_colored(imgui.ImVec4(1.0, 0.8, 0.3, 1.0), f"Changed on disk. Reloading discards {len(commands.done) + len(commands.undone)} edit(s).")
+    imgui.same_line()
+    if imgui.small_button("Reload"):
+        manager.confirm_reload(entry, True)
+    imgui.same_line()
+    if imgui.small_button("Keep Edits"):
+        manager.confirm_reload(entry, False)
+
+def gui_structure_editor(manager: EditorManager, entry: EditorEntry):
+    entry.last_shown = manager.frame_index
+    if entry.editor is not None:
+        if entry.reload_job is not None:
+            gui_reload_notice(manager, entry)
+        gui_level(manager, entry, entry, False)
+        return
+    
+    # placeholder until the structure is handed over
+    job = entry.job
+    imgui.text_unformatted(job.file_path)
+    imgui.progress_bar(job.progress, imgui.ImVec2(-1, 0), job.status)
+    if job.state == LoadJob.LOADING or job.state == LoadJob.DONE:
+        if imgui.button("Cancel"):
+            job.cancel()
+    else:
+        if imgui.button("Close"):
+            manager.close(entry)
+
+
+""" Profiler """
+def gui_profiler(app_state: AppState):
+    changed, enabled = imgui.checkbox("Enabled", profiler.enabled)
+    if changed:
+        profiler.set_enabled(enabled)
+    imgui.same_line()
+    if imgui.button("Clear"):
+        profiler.clear()
+    imgui.same_line()
+    if not profiler.is_tracing():
+        if imgui.button("Start Trace"):
+            profiler.start_trace()
+    elif imgui.button("Save Trace"):
+        events = profiler.stop_trace()
+        save_file_dialog = pfd.save_file("Save Chrome trace", "trace.json", ["Chrome trace", "*.json"])
+        file_path = save_file_dialog.result()
+        if file_path:
+            profiler.save_trace(file_path, events)
+            hello_imgui.log(hello_imgui.LogLevel.info, f"Saved {len(events)} profiler events to {file_path}")
+    
+    # per frame totals, over the last frames
+    table_flags = imgui.TableFlags_.borders | imgui.TableFlags_.row_bg | imgui.TableFlags_.scroll_y
+    if imgui.begin_table("profiler_stats", 5, table_flags):
+        imgui.table_setup_scroll_freeze(0, 1)
+        for column in ("Scope", "p50 ms", "p95 ms", "p99 ms", "Calls"):
+            imgui.table_setup_column(column)
+        imgui.table_headers_row()
+        for name, (p50, p95, p99, calls) in sorted(profiler.stats().items()):
+            imgui.table_next_row()
+            for column, text in enumerate((name, f"{p50:.3f}", f"{p95:.3f}", f"{p99:.3f}", f"{calls:.0f}")):
+                imgui.table_set_column_index(column)
+                imgui.text_unformatted(text)
+        imgui.end_table()
+
+def gui_status(app_state: AppState):
+    if app_state.cpu_percent is not None:
+        text = f"{app_state.activity}, CPU {app_state.cpu_percent:.1f}%"
+        if app_state.activity == AppState.IDLE and app_state.throttling and app_state.cpu_percent > AppState.IDLE_CPU_TARGET:
+            imgui.text_colored(imgui.ImVec4(1.0, 0.6, 0.2, 1.0), f"{text} (idle target {AppState.IDLE_CPU_TARGET:.0f}%)")
+        else:
+            imgui.text(text)
+        imgui.same_line()
+    if app_state.analysis.jobs:
+        imgui.text(f"analysis: {len(app_state.analysis.jobs)} running")
+        imgui.same_line()
+    if profiler.enabled:
+        frame = profiler.stats().get("frame")
+        if frame is not None:
+            imgui.text(f"frame p50 {frame[0]:.1f} ms  p95 {frame[1]:.1f} ms  p99 {frame[2]:.1f} ms")
 
 
 """ Inspector """
@@ -56,7 +547,50 @@ def gui_inspector(app_state: AppState):
 """ Explorer """
 def gui_explorer(app_state: AppState):
     imgui.begin("Explorer")
-    imgui.text("Explorer")
+    
+    entries = [entry for entry in app_state.editors.entries.values() if entry.editor is not None]
+    entry = app_state.editors.entries.get(app_state.explorer_label)
+    if entry is None or entry.editor is None:
+        entry = max(entries, key = lambda entry: entry.last_shown, default = None)
+    
+    # editor
+    imgui.set_next_item_width(-1)
+    if imgui.begin_combo("##editor", entry.job.file_path if entry is not None else "No structure open"):
+        clicked, _ = imgui.selectable("Most recently shown", app_state.explorer_label is None)
+        if clicked:
+            app_state.explorer_label = None
+        for other in entries:
+            clicked, _ = imgui.selectable(f"{other.job.file_path}##{other.label}", other.label == app_state.explorer_label)
+            if clicked:
+                app_state.explorer_label = other.label
+        imgui.end_combo()
+    
+    if entry is not None:
+        # rebuilt when the structure of an editor opened from its index is loaded, or edited
+        editor = entry.editor
+        shown = editor.structure if editor.structure is not None else editor.index
+        source_of = (shown, editor.edit_count)
+        if entry.explorer_of != source_of and shown is not None:
+            source = StructureSource(editor.structure) if editor.structure is not None else IndexSource(editor.index)
+            if entry.explorer is None:
+                entry.explorer = Explorer(source)
+            else:
+                entry.explorer.set_source(source)
+            entry.explorer_of = source_of
+        
+        clicked = entry.explorer.gui() if entry.explorer is not None else None
+        if clicked is not None:
+            # deeper instances are shown in the level of their parent, if it can be opened
+            path, port = clicked
+            parent = editor.descendant(path[:-1]) if len(path) > 1 else None
+            if parent is not None:
+                entry.path = path[:-1]
+                parent.navigate_to(path[-1:], port)
+            else:
+                entry.path = ()
+                editor.navigate_to(path, port)
+            hello_imgui.get_runner_params().docking_params.focus_dockable_window(entry.label)
+    
     imgui.end()
 
 
@@ -72,6 +606,7 @@ if __name__ == "__main__":
     
     # 状态栏
     runner_params.imgui_window_params.show_status_bar = True
+    runner_params.callbacks.show_status = lambda: gui_status(app_state)
     
     # 菜单栏
     runner_params.imgui_window_params.show_menu_bar = True
@@ -80,6 +615,13 @@ if __name__ == "__main__":
     runner_params.callbacks.show_menus = lambda: gui_menu(runner_params)
     runner_params.callbacks.show_app_menu_items = lambda: gui_app_menu(app_state)
     
+    # 空闲时降低帧率，见 AppState
+    runner_params.fps_idling.remember_enable_idling = False
+    
+    # 后台加载
+    runner_params.callbacks.pre_new_frame = lambda: app_state.update()
+    runner_params.callbacks.before_exit = lambda: app_state.shutdown()
+    
     # 默认分割
     split_main_bottom = hello_imgui.DockingSplit()
     split_main_bottom.initial_dock = "MainDockSpace"
@@ -108,6 +650,7 @@ if __name__ == "__main__":
     add_window("Logs", hello_imgui.log_gui, init_dockspace = "BottomSpace")
     add_window("Inspector", lambda: gui_inspector(app_state), init_dockspace = "LeftSpace")
     add_window("Explorer", lambda: gui_explorer(app_state), init_dockspace = "LeftSpace")
+    add_window("Profiler", lambda: gui_profiler(app_state), init_dockspace = "BottomSpace")
     
     # 配置文件 TODO
     runner_params.ini_folder_type = hello_imgui.IniFolderType.current_folder # hello_imgui.IniFolderType.app_user_config_folder
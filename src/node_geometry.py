@@ -0,0 +1,101 @@
+from typing import Dict, List, Tuple
+
+from imgui_bundle import imgui # type: ignore
+
+from view_model import StructureViewModel
+
+
+"""
+    Text widths of the current font, cached. Everything cached is dropped when the font, its size or the DPI scale
+    change, see key().
+"""
+class TextMetrics:
+    _REFERENCE = "Mg" # whose width tells scaled fonts apart
+    
+    widths: Dict[str, float]
+    line_height: float
+    current_key: Tuple[float, float, float]
+    
+    def __init__(self):
+        self.widths = {}
+        self.line_height = 0.0
+        self.current_key = None
+    
+    @staticmethod
+    def key() -> Tuple[float, float, float]:
+        return (imgui.get_font_size(), imgui.calc_text_size(TextMetrics._REFERENCE).x, imgui.get_io().font_global_scale)
+    
+    def update(self) -> bool:
+        # once per frame, True if the font changed and everything measured with it is stale
+        key = TextMetrics.key()
+        if key == self.current_key:
+            return False
+        self.current_key = key
+        self.widths.clear()
+        self.line_height = imgui.get_text_line_height()
+        return True
+    
+    def width(self, text: str) -> float:
+        w = self.widths.get(text)
+        if w is None:
+            w = self.widths[text] = imgui.calc_text_size(text).x
+        return w
+
+
+"""
+    Layout of a node drawn by the fast renderer (StructureEditor.RENDERER_FAST), relative to the top left corner of
+    its content (inside the node padding), the same as the stack layout nodes:
+        
+        header text, HEADER_HEIGHT high
+        input labels                      output labels (a left aligned column at the right edge)
+        ...                               ...
+    
+    IO nodes follow _draw_io_node instead: the "io" text as a one line header, without springs, then the single pin.
+    
+    Computed once from the text widths, the renderer then only places draw list primitives at these offsets.
+"""
+class NodeGeometry:
+    __slots__ = ("title", "header_height", "width", "height", "input_rows", "output_rows")
+    
+    HEADER_HEIGHT = 28.0 # like the stack layout's header dummy
+    TITLE_SPACING = 24.0 # springs around the title
+    LABEL_SPACING = 8.0 # after each label, inside its pin, like the stack layout's spring(0)
+    COLUMN_GAP = 8.0 # between the input and the output column
+    ROW_SPACING = 4.0
+    ICON_RADIUS = 3.5 # pin icon, centered on the pivot at the node edge, so it does not change the size
+    
+    title: str
+    header_height: float
+    width: float
+    height: float
+    input_rows: List[Tuple[float, float, float, str]] # (y, label x0, label x1, label) per input pin
+    output_rows: List[Tuple[float, float, float, str]] # (y, label x0, label x1, label) per output pin
+    
+    def __init__(self, view_model: StructureViewModel, node_index: int, metrics: TextMetrics):
+        node = view_model.nodes[node_index]
+        pins = view_model.pins
+        # an IO node is titled "io" and its only pin is labelled with the port name
+        self.title = "io" if node.is_io else node.name
+        input_labels = [node.name if node.is_io else pins[i].label for i in node.inputs]
+        output_labels = [node.name if node.is_io else pins[i].label for i in node.outputs]
+        row_height = metrics.line_height + NodeGeometry.ROW_SPACING
+        
+        # pins span label + LABEL_SPACING, both columns are left aligned, the output column is at the right edge
+        input_widths = [metrics.width(label) + NodeGeometry.LABEL_SPACING for label in input_labels]
+        output_widths = [metrics.width(label) + NodeGeometry.LABEL_SPACING for label in output_labels]
+        input_column, output_column = max(input_widths, default = 0.0), max(output_widths, default = 0.0)
+        columns = input_column + output_column + (NodeGeometry.COLUMN_GAP if node.inputs and node.outputs else 0.0)
+        if node.is_io:
+            self.header_height = metrics.line_height
+            self.width = max(metrics.width(self.title), columns)
+        else:
+            self.header_height = NodeGeometry.HEADER_HEIGHT
+            self.width = max(metrics.width(self.title) + NodeGeometry.TITLE_SPACING, columns)
+        
+        # below the header: item spacing, then for substructures one row per pin, each after a spring(0) (spacing)
+        content_y = self.header_height + NodeGeometry.ROW_SPACING
+        y0 = content_y if node.is_io else content_y + NodeGeometry.ROW_SPACING
+        x0 = self.width - output_column
+        self.input_rows = [(y0 + row * row_height, 0.0, w, label) for row, (w, label) in enumerate(zip(input_widths, input_labels))]
+        self.output_rows = [(y0 + row * row_height, x0, x0 + w, label) for row, (w, label) in enumerate(zip(output_widths, output_labels))]
+        self.height = content_y + (metrics.line_height if node.is_io else max(len(node.inputs), len(node.outputs)) * row_height)
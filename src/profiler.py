@@ -0,0 +1,142 @@
+import json
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+"""
+    Frame profiler for the UI thread.
+    
+    Named scopes are summed up per frame; the last HISTORY frames of every scope are kept for the p50/p95/p99 shown in
+    the "Profiler" window, and while a trace is captured every single scope is recorded for a Chrome trace file
+    (chrome://tracing, https://ui.perfetto.dev).
+    
+    Disabled (the default), scope() hands out one shared no-op context manager, and the per node / per pin hot paths
+    (ed_ctx) only test the module level `enabled` flag. Switching on and off takes effect at the next frame, so a
+    scope never sees it change between its begin and its end.
+"""
+HISTORY = 300 # frames
+TRACE_LIMIT = 2_000_000 # scopes, about 2 s of a busy large design; capturing stops there
+
+enabled: bool = False
+_pending_enabled: bool = False
+
+_frame_start: float = 0.0
+_frame: Dict[str, List] = {} # scope name -> [seconds, calls] of the current frame
+_history: Dict[str, Tuple[Deque[float], Deque[int]]] = {} # scope name -> seconds and calls of the last frames
+_trace: Optional[List[Tuple[str, float, float]]] = None # (name, start, end) while capturing
+
+
+class _NullScope:
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NULL_SCOPE = _NullScope()
+
+
+class _Scope:
+    __slots__ = ("name", "start")
+    
+    def __init__(self, name: str):
+        self.name = name
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        record(self.name, self.start)
+        return False
+
+
+def scope(name: str):
+    return _Scope(name) if enabled else _NULL_SCOPE
+
+def now() -> float:
+    return time.perf_counter()
+
+def record(name: str, start: float):
+    # adds a finished scope, start from now()
+    end = time.perf_counter()
+    acc = _frame.get(name)
+    if acc is None:
+        _frame[name] = [end - start, 1]
+    else:
+        acc[0] += end - start
+        acc[1] += 1
+    if _trace is not None and len(_trace) < TRACE_LIMIT:
+        _trace.append((name, start, end))
+
+
+"""
+    frames
+"""
+def set_enabled(value: bool):
+    global _pending_enabled
+    _pending_enabled = value
+
+def new_frame():
+    # once per frame, before anything is profiled (runner callback pre_new_frame); closes the previous frame
+    global enabled, _frame_start, _frame
+    t = time.perf_counter()
+    if enabled:
+        if _frame_start > 0.0:
+            _frame["frame"] = [t - _frame_start, 1]
+            if _trace is not None and len(_trace) < TRACE_LIMIT:
+                _trace.append(("frame", _frame_start, t))
+        for name, (seconds, calls) in _frame.items():
+            history = _history.get(name)
+            if history is None:
+                history = _history[name] = (deque(maxlen = HISTORY), deque(maxlen = HISTORY))
+            history[0].append(seconds)
+            history[1].append(calls)
+        _frame = {}
+    
+    if enabled != _pending_enabled:
+        enabled = _pending_enabled
+        _frame = {}
+        if not enabled:
+            stop_trace()
+    _frame_start = t if enabled else 0.0
+
+def clear():
+    _history.clear()
+
+def stats() -> Dict[str, Tuple[float, float, float, float]]:
+    # scope name -> (p50, p95, p99 in ms, mean calls per frame), over the frames the scope was used in
+    result = {}
+    for name, (seconds, calls) in _history.items():
+        p50, p95, p99 = np.percentile(np.fromiter(seconds, dtype = np.float64, count = len(seconds)), (50, 95, 99)) * 1e3
+        result[name] = (float(p50), float(p95), float(p99), sum(calls) / len(calls))
+    return result
+
+
+"""
+    Chrome trace
+"""
+def start_trace():
+    global _trace
+    _trace = []
+    set_enabled(True)
+
+def is_tracing() -> bool:
+    return _trace is not None
+
+def stop_trace() -> List[Tuple[str, float, float]]:
+    global _trace
+    events, _trace = _trace, None
+    return events if events is not None else []
+
+def save_trace(file_path: str, events: List[Tuple[str, float, float]]):
+    # trace event format, complete ("X") events in microseconds; everything profiled runs on the UI thread
+    trace_events = [{"name": name, "ph": "X", "ts": start * 1e6, "dur": (end - start) * 1e6, "pid": 0, "tid": 0} for name, start, end in events]
+    trace_events.append({"name": "thread_name", "ph": "M", "pid": 0, "tid": 0, "args": {"name": "UI"}})
+    with open(file_path, "w") as f:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
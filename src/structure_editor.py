@@ -1,221 +1,1363 @@
 from nodalhdl.core.structure import Structure, Net, Node
 from nodalhdl.core.signal import Input, Output
 
+import os
 import sys
-import weakref
-from typing import Union, List, Tuple, Dict, Set
+import time
+import itertools
+from concurrent.futures import Future
+from typing import Union, List, Tuple, Dict, Set, Optional, Hashable, Iterator
 
-from imgui_bundle import imgui, imgui_ctx, imgui_node_editor as ed # type: ignore
+import numpy as np
+
+from imgui_bundle import hello_imgui, imgui, imgui_ctx, imgui_node_editor as ed # type: ignore
+from imgui_bundle import portable_file_dialogs as pfd # type: ignore
 import ed_ctx
+import layout
+import layout_store
+import profiler
+import connectivity
+from view_model import StructureViewModel, ViewModelDiff, shared_view_model
+from structure_index import StructureIndex
+from culling import NodeRects
+from node_geometry import TextMetrics, NodeGeometry
+from analysis import AnalysisJob
+from loader import LoadJob
+from commands import CommandLog, Command, ConnectCommand, DisconnectCommand, AddInstanceCommand, DeleteInstanceCommand, CommandGroup
 
 
 class StructureEditor:
-    def __init__(self, structure: Structure = None):
+    CULL_MARGIN = 200.0 # screen pixels around the view in which nodes are still drawn
+    LOD_INV_SCALE = 2.0 # zoomed out further than this, nodes are drawn as named boxes without pin labels
+    MEASURE_BUDGET = 500 # never submitted nodes drawn in full per frame to learn their size, wherever they are
+    SAVE_DELAY = 1.0 # seconds without node moves before the positions are saved
+    HIGHLIGHT_TIME = 2.0 # seconds a pin navigated to stays highlighted
+    REDRAW_TIME = 0.5 # seconds of frames at full rate after a change, for the node editor to settle (sizes, navigation)
+    
+    # rough resident size of the caches release_caches() frees (view model, ids, rects, node editor state), measured
+    # on synthetic designs; only used to compare editors against a memory budget
+    BYTES_PER_PIN = 1500
+    BYTES_PER_NODE = 1000
+    
+    # how nets with more sinks than fanout_threshold are drawn
+    NET_STYLE_LINKS = "links" # one link per sink, like every other net
+    NET_STYLE_BUNDLED = "bundled" # a trunk from the driver with short branches to the sinks
+    NET_STYLE_STUB = "stub" # a labelled stub at the driver and at each sink, no connection drawn
+    
+    # how nodes are drawn in detail
+    RENDERER_STACK = "stack" # imgui stack layouts (begin_horizontal / begin_vertical / spring), measured by imgui
+    RENDERER_FAST = "fast" # NodeGeometry computed once from cached text widths, drawn straight into the draw lists
+    
+    # signal tracing through all hierarchy levels, see connectivity
+    TRACE_DRIVER = "driver" # the port driving the pin's signal, and the ports in between
+    TRACE_SINKS = "sinks" # the whole signal, down to every port it ends at
+    TRACE_FAN_IN = "fan_in" # everything the pins depend on, through nets and leaf substructures
+    TRACE_FAN_OUT = "fan_out" # everything depending on the pins
+    TRACE_COLOR = (1.0, 0.78, 0.0, 1.0)
+    
+    def __init__(self, structure: Structure = None, view_model: StructureViewModel = None, index: StructureIndex = None, parent: "StructureEditor" = None, path: Tuple[str, ...] = ()):
+        # hierarchy: an editor shows one level, the editors of the substructure instances opened from it are created
+        # on first use (see child()) and are read only, they share the structure (and view model) of their definition
+        self.parent: StructureEditor = parent
+        self.path: Tuple[str, ...] = path # instance path from the top level structure, () for the top level
+        self.children: Dict[str, StructureEditor] = {} # instance name -> editor, opened ones only
+        self.open_request: Tuple[Tuple[str, ...], bool] = None # (instance path, in a new tab), for the owner
+        
         # state
         self.structure: Structure = structure
+        self.index: StructureIndex = index # drawn from until the structure is loaded, see set_structure()
+        self.structure_requested: bool = False # something needs self.structure, the owner should load it
+        self.view_model: StructureViewModel = None # built lazily, see get_view_model()
+        self.id_registry: ed_ctx.IdRegistry = ed_ctx.IdRegistry() # kept across frames and view model rebuilds
+        self.node_rects: NodeRects = NodeRects() # canvas rects of view_model.nodes, for culling
+        
+        if view_model is not None and view_model.structure is structure: # prebuilt, e.g. by the loader
+            self.view_model = view_model
+            self.node_rects = NodeRects(len(view_model.nodes))
 
+        # layout, requested once per view model: the saved positions, and the automatic layout for the nodes without
+        self.layout_view_model: StructureViewModel = None
+        self.stored_layout_future: Future = None
+        self.layout_future: Future = None
+        self.layout_nodes: np.ndarray = None # node indices the automatic layout is applied to, None for all
+        self.layout_navigate: bool = True # navigate to the content once the layout is applied, not after a reload
+        self.layout_changed_time: float = None # time.monotonic() of the last node move, None once saved
+        self.layout_save_future: Future = None
+        
+        # high fan-out nets (clock, reset, enable, ...)
+        self.net_style: str = StructureEditor.NET_STYLE_BUNDLED
+        self.fanout_threshold: int = 16
+        self.anchor_pins: Set[int] = set() # pins of bundled nets drawn this frame, their positions are recorded
+        self.pin_anchors: Dict[int, Tuple[float, float]] = {} # pin index -> canvas position where a link attaches
+        
+        # node rendering
+        self.renderer: str = StructureEditor.RENDERER_STACK
+        self.text_metrics: TextMetrics = TextMetrics()
+        self.node_geometry: Dict[int, NodeGeometry] = {} # node index -> geometry, filled lazily by the fast renderer
+        self.geometry_view_model: StructureViewModel = None # node_geometry is for this view model
+        self.frame_style: Tuple[int, float] = None # (text color, half node border width), read once per frame
+        
+        # navigation, e.g. from the Explorer
+        self.navigate_target: Tuple[Hashable, Optional[str]] = None # (node key, pin label or None), until the node is placed
+        self.highlight_pin: int = None
+        self.highlight_until: float = 0.0
+        
+        # signal tracing, the connectivity index of the whole design is built in the background on the first trace and
+        # kept by the top level editor until the structure changes
+        self.connectivity: connectivity.ConnectivityIndex = None
+        self.connectivity_future: Future = None
+        self.connectivity_of: Tuple[Structure, int] = None # (structure, edit count) the index is for
+        self.connectivity_pins_of: Tuple[connectivity.ConnectivityIndex, StructureViewModel] = None # the two below are for
+        self.connectivity_pins: np.ndarray = None # view model pin index of each pin of this level in the index, -1 for none
+        self.connectivity_pin_nodes: np.ndarray = None # node index of each of those pins
+        self.trace_request: Tuple[str, List[Hashable]] = None # (TRACE_* kind, pin keys), until the index is there
+        self.trace_of: Tuple[StructureViewModel, int] = None # (view model, edit count) the trace is for
+        self.trace_pins: np.ndarray = None # bool per pin of the view model, None without a trace
+        self.trace_nodes: np.ndarray = None # bool per node
+        self.context_menu_key: Hashable = None # pin or node key the pin / node context menu was opened for
+        
+        # type deduction / HDL generation, run by the owner in a worker process (see analysis)
+        self.analysis_request: Tuple[str, str] = None # (AnalysisJob kind, output directory), for the owner to start
+        self.analysis_job: AnalysisJob = None # the last one started
+        self.analysis_of: Tuple[Structure, int] = None # (structure, edit count) it was started for
+        self.port_types: Dict[Hashable, str] = {} # pin key -> deduced signal type, from the last finished job
+        
+        # editing
+        self.commands: CommandLog = CommandLog()
+        self.instance_request: Tuple[str, Tuple[float, float]] = None # (file, canvas position) of an instance to add, for the owner to load
+        self.instance_job: LoadJob = None # loading it, handed back to add_loaded_instance()
+        self.edit_count: int = 0 # structure changes made here, for whoever caches something derived from the structure
+        self._pin_index_of_key: Dict[Hashable, int] = None # built on first use, see _pin_index()
+        
         # editor
-        ed_config = ed.Config()
-        ed_config.settings_file = ""
-        self.context: ed.EditorContext = ed.create_editor(ed_config)
+        self.ed_config: ed.Config = ed.Config()
+        self.ed_config.settings_file = ""
+        self.context: ed.EditorContext = ed.create_editor(self.ed_config)
         self.gui_is_first_frame = True
+        self.redraw_until: float = 0.0 # time.monotonic() until which frames are needed at full rate, see mark_dirty()
     
     def __del__(self):
-        ed.destroy_editor(self.context)
+        self.destroy_context()
     
-    def gui(self):
-        # node editor context
-        if self.context is None:
+    def destroy_context(self):
+        # not while the context is in use, i.e. between frames
+        for child in self.children.values():
+            child.destroy_context()
+        if self.context is not None:
+            ed.destroy_editor(self.context)
+            self.context = None
+    
+    """
+        hierarchy
+    """
+    @property
+    def root(self) -> "StructureEditor":
+        editor = self
+        while editor.parent is not None:
+            editor = editor.parent
+        return editor
+    
+    def editable(self) -> bool:
+        # substructures are shared by all instances of their definition, they are edited in their own file
+        return self.structure is not None and self.parent is None
+    
+    def child(self, subs_inst_name: str) -> Optional["StructureEditor"]:
+        # editor of a substructure instance, created when first asked for; None without the structure or the instance
+        if self.structure is None:
+            return None
+        structure = self.structure.substructures.get(subs_inst_name)
+        editor = self.children.get(subs_inst_name)
+        if editor is not None and editor.structure is not structure: # removed, or the structure was replaced
+            editor.release_caches()
+            del self.children[subs_inst_name]
+            editor = None
+        if editor is None and structure is not None:
+            editor = self.children[subs_inst_name] = StructureEditor(structure, shared_view_model(structure), parent = self, path = self.path + (subs_inst_name, ))
+        return editor
+    
+    def descendant(self, path: Tuple[str, ...]) -> Optional["StructureEditor"]:
+        # editor of the instance at path, relative to this level
+        editor = self
+        for subs_inst_name in path:
+            editor = editor.child(subs_inst_name)
+            if editor is None:
+                return None
+        return editor
+    
+    def editors(self) -> Iterator["StructureEditor"]:
+        # this one and the opened descendants
+        yield self
+        for child in self.children.values():
+            yield from child.editors()
+    
+    def drop_structure_requests(self):
+        # the structure could not be loaded: what waits for it (a trace, a drill down) is given up, instead of keeping
+        # the application awake or asking for the structure again
+        self.structure_requested = False
+        for editor in self.editors():
+            editor.trace_request = None
+            editor.open_request = None
+    
+    def _drop_children(self):
+        for child in self.children.values():
+            child.release_caches()
+        self.children = {}
+    
+    """
+        redraw: the application only renders frames when something needs them, see AppState
+    """
+    def mark_dirty(self):
+        # something changed that the next frames have to show
+        self.redraw_until = time.monotonic() + StructureEditor.REDRAW_TIME
+    
+    def needs_redraw(self) -> bool:
+        # frames at full rate: a change being drawn, or nodes still to be measured (MEASURE_BUDGET per frame)
+        return time.monotonic() < self.redraw_until or self.gui_is_first_frame or self.navigate_target is not None or len(self.node_rects.unmeasured) > 0
+    
+    def is_waiting(self) -> bool:
+        # background work or a timer whose end gui() picks up, a few frames per second are enough
+        return (self.stored_layout_future is not None or self.layout_future is not None or self.layout_save_future is not None
+            or self.layout_changed_time is not None or self.connectivity_future is not None or self.trace_request is not None
+            or self.highlight_pin is not None or self.instance_request is not None)
+    
+    def cache_size(self) -> int:
+        # estimated bytes freed by release_caches()
+        size = self.connectivity.nbytes() if self.connectivity is not None else 0
+        size += sum(child.cache_size() for child in self.children.values())
+        if self.view_model is None:
+            return size
+        return size + StructureEditor.BYTES_PER_PIN * len(self.view_model.pins) + StructureEditor.BYTES_PER_NODE * len(self.view_model.nodes)
+    
+    def release_caches(self):
+        # drops everything that can be rebuilt from the structure: moved node positions go to the layout store and come
+        # back from there, the rest is rebuilt lazily by the next gui()
+        if self.layout_changed_time is not None:
+            self.save_layout()
+        self._drop_children()
+        self.destroy_context()
+        self.view_model = None
+        self.node_rects = NodeRects()
+        self.id_registry.clear()
+        self.layout_view_model = None
+        self.stored_layout_future = None
+        self.layout_future = None
+        self.layout_nodes = None
+        self.anchor_pins = set()
+        self.pin_anchors = {}
+        self.highlight_pin = None
+        self._pin_index_of_key = None
+        self.connectivity = None
+        self.connectivity_future = None
+        self.connectivity_of = None
+        self.connectivity_pins_of = None
+        self.clear_trace()
+        self.gui_is_first_frame = True
+    
+    def get_view_model(self) -> StructureViewModel:
+        # None if there is neither a structure nor an index
+        if self.structure is not None:
+            if self.view_model is None or self.view_model.structure is not self.structure:
+                self.view_model = StructureViewModel(self.structure) if self.parent is None else shared_view_model(self.structure)
+                self.node_rects = NodeRects(len(self.view_model.nodes))
+                self._pin_index_of_key = None
+        elif self.view_model is None and self.index is not None:
+            self.view_model = self.index.view_model()
+            self.node_rects = NodeRects(len(self.view_model.nodes))
+            self._pin_index_of_key = None
+        return self.view_model
+    
+    def set_structure(self, structure: Structure, view_model: StructureViewModel = None) -> Optional[ViewModelDiff]:
+        # the structure behind an editor opened from an index, or a new version of it (the file was rewritten); the
+        # editor state of the nodes both versions have is kept (positions, sizes, selection, view), new nodes get the
+        # automatic layout; returns what changed, None if nothing was shown before
+        old_view_model = self.view_model
+        self._drop_children() # opened again from the new structure
+        self.structure = structure
+        self.index = None
+        self.structure_requested = False
+        self.highlight_pin = None
+        self._pin_index_of_key = None
+        self.port_types = {} # deduced for the old version
+        self.commands.clear() # recorded against the old version
+        self.view_model = view_model if view_model is not None and view_model.structure is structure else StructureViewModel(structure)
+        self.mark_dirty()
+        
+        if old_view_model is None:
+            return None
+        diff = ViewModelDiff(old_view_model, self.view_model)
+        self._patch(old_view_model, diff)
+        return diff
+    
+    def _patch(self, old_view_model: StructureViewModel, diff: ViewModelDiff):
+        view_model = self.view_model
+        same_nodes = diff.node_map == list(range(len(old_view_model.nodes))) # same keys in the same order
+        
+        # ids of what is gone, the node editor just stops seeing them
+        for node_index in diff.removed_nodes:
+            self.id_registry.forget(("node", old_view_model.nodes[node_index].key))
+        for pin_index in diff.removed_pins:
+            self.id_registry.forget(("pin", old_view_model.pins[pin_index].key))
+        for link_key in diff.removed_links:
+            self.id_registry.forget(("link", link_key))
+        
+        # rects follow their nodes to the new indices
+        if not same_nodes:
+            old_rects = self.node_rects
+            self.node_rects = NodeRects(len(view_model.nodes))
+            for node_index, old_index in enumerate(diff.node_map):
+                if old_index != -1 and old_index not in old_rects.unmeasured:
+                    self.node_rects.set(node_index, *old_rects.rects[old_index])
+        
+        # layout
+        if self.layout_view_model is not old_view_model: # not requested yet, or for an even older version
             return
-        ed.set_current_editor(self.context)
+        if self.stored_layout_future is not None or self.layout_future is not None: # still pending, start over
+            self.layout_view_model = view_model if same_nodes else None
+            return
+        self.layout_view_model = view_model
+        if diff.added_nodes:
+            self.layout_nodes = np.array(diff.added_nodes, dtype = np.int64)
+            self.layout_future = layout.default_engine().request(view_model)
+            self.layout_navigate = False
+    
+    def navigate_to(self, path: Tuple[str, ...], port: Optional[str] = None):
+        # shows the instance (path from the top level) or port, on the next frame; deeper instances show their top
+        # level ancestor
+        if not path:
+            self.navigate_target = (("io", port), port)
+        else:
+            self.navigate_target = (("subs", path[0]), port if len(path) == 1 else None)
+        self.mark_dirty()
+    
+    def _navigate(self, view_model: StructureViewModel):
+        node_key, pin_label = self.navigate_target
+        node_index = next((i for i, node in enumerate(view_model.nodes) if node.key == node_key), None)
+        if node_index is None:
+            self.navigate_target = None
+            return
+        if self.stored_layout_future is not None or self.layout_future is not None: # not placed yet
+            return
+        self.navigate_target = None
         
-        # structure
-        with ed_ctx.editor(f"editor_{hash(self)}") as ctx:
-            with imgui_ctx.push_id(f"editor_{ctx.editor_id}"):
-                if self.structure is None:
-                    return
-                
-                id_obj_mapping: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
-                obj_id_mapping: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
-                nets: weakref.WeakSet[Net] = weakref.WeakSet()
-                
-                # draw IOs as non-header ed nodes
-                for port_full_name, port in self.structure.ports_inside_flipped.nodes():
-                    nets.add(port.located_net)
-                    
-                    with ed_ctx.style_var([
-                        (ed.StyleVar.node_padding, imgui.ImVec4(8, 4, 8, 8)),
-                        (ed.StyleVar.node_rounding, 8)
-                    ]):
-                        # ed node
-                        with ed_ctx.node(ctx) as n:
-                            with imgui_ctx.push_id(f"io_{n.node_id.id()}"):
-                                # panel
-                                with imgui_ctx.begin_vertical("panel"):
-                                    # io
-                                    with ed_ctx.style_var([
-                                        (ed.StyleVar.pivot_alignment, imgui.ImVec2(0, 0.5)),
-                                        (ed.StyleVar.pivot_size, imgui.ImVec2(0, 0))
-                                    ]):
-                                        imgui.text_unformatted("io")
-                                        text_rect_min = imgui.get_item_rect_min()
-                                        text_rect_max = imgui.get_item_rect_max()
-                                        
-                                        with imgui_ctx.begin_horizontal("io"):
-                                            imgui.spring(0, 0)
-                                            
-                                            if port.origin_signal_type.belongs(Output):
-                                                imgui.spring(1, 0)
-                                            
-                                            with ed_ctx.pin(ctx, ed.PinKind.input if port.origin_signal_type.belongs(Input) else ed.PinKind.output) as p:
-                                                id_obj_mapping[p.pin_id] = port
-                                                obj_id_mapping[port] = p.pin_id
-                                                
-                                                with imgui_ctx.begin_horizontal(p.pin_id.id()):
-                                                    with imgui_ctx.push_style_var(imgui.StyleVar_.alpha, 120):
-                                                        # DrawPinIcon TODO
-                                                        imgui.text_unformatted(port_full_name)
-                                                        imgui.spring(0)
+        ed.select_node(self.id_registry.node_id(node_key))
+        ed.navigate_to_selection(False)
+        node = view_model.nodes[node_index]
+        self.highlight_pin = next((i for i in node.inputs + node.outputs if view_model.pins[i].label == pin_label), None)
+        self.highlight_until = time.monotonic() + StructureEditor.HIGHLIGHT_TIME
+        self.gui_is_first_frame = False # a first frame would navigate to the whole content instead
+        self.mark_dirty() # the navigation is animated
+    
+    """
+        signal tracing
+    """
+    def trace(self, kind: str, pin_keys: List[Hashable]):
+        # highlights the result on the next frames, once the connectivity index is there; the full structure is loaded
+        # first if the editor was opened from an index
+        self.trace_request = (kind, pin_keys)
+        if self.root.structure is None:
+            self.root.structure_requested = True
+    
+    def clear_trace(self):
+        self.mark_dirty()
+        self.trace_request = None
+        self.trace_of = None
+        self.trace_pins = None
+        self.trace_nodes = None
+    
+    def _connectivity_index(self) -> Optional[connectivity.ConnectivityIndex]:
+        # of the whole design, kept by the top level editor; None while it is built, or if that failed
+        root = self.root
+        if root.connectivity_of != (root.structure, root.edit_count):
+            root.connectivity = None
+            root.connectivity_of = (root.structure, root.edit_count)
+            root.connectivity_future = connectivity.build(root.structure)
+        if root.connectivity_future is not None and root.connectivity_future.done():
+            future, root.connectivity_future = root.connectivity_future, None
+            if future.exception() is not None:
+                hello_imgui.log(hello_imgui.LogLevel.error, f"Could not build the connectivity index: {future.exception()}")
+            else:
+                root.connectivity = future.result()
+                hello_imgui.log(hello_imgui.LogLevel.debug, f"Connectivity index: {root.connectivity.vertex_count} ports, {root.connectivity.edge_count} edges")
+        return root.connectivity
+    
+    def _update_trace(self, view_model: StructureViewModel):
+        if self.trace_pins is not None and self.trace_of != (view_model, self.root.edit_count): # drawn for another version
+            self.clear_trace()
+        if self.trace_request is None or self.root.structure is None:
+            return
+        
+        index = self._connectivity_index()
+        if index is None:
+            if self.root.connectivity_future is None: # failed
+                self.trace_request = None
+            return
+        if self.connectivity_pins_of != (index, view_model):
+            pin_indices = [self._pin_index(key) for key in index.pin_keys(self.path)]
+            self.connectivity_pins = np.array([-1 if i is None else i for i in pin_indices], dtype = np.int64)
+            self.connectivity_pin_nodes = np.array([-1 if i is None else view_model.pins[i].node_index for i in pin_indices], dtype = np.int64)
+            self.connectivity_pins_of = (index, view_model)
+        
+        kind, pin_keys = self.trace_request
+        self.trace_request = None
+        self._run_trace(view_model, kind, pin_keys)
+    
+    def _run_trace(self, view_model: StructureViewModel, kind: str, pin_keys: List[Hashable]):
+        index = self.root.connectivity
+        if self.path not in index.levels:
+            hello_imgui.log(hello_imgui.LogLevel.warning, f"{'.'.join(self.path)} is an operator, its signals are not traced inside")
+            return
+        vertices = [v for v in (index.vertex_of_pin(self.path, key) for key in pin_keys) if v is not None]
+        if not vertices:
+            return
+        name = index.vertex_name(vertices[0]) if len(vertices) == 1 else pin_keys[0][0][1]
+        
+        start = time.perf_counter()
+        if kind == StructureEditor.TRACE_DRIVER:
+            route = index.trace_driver(vertices[0])
+            mask = np.zeros(index.vertex_count, dtype = bool)
+            mask[route] = True
+            text = f"Driver of {name}: {index.vertex_name(route[-1])}"
+            if len(route) > 2:
+                text += f", through {', '.join(index.vertex_name(v) for v in route[1:-1])}"
+        elif kind == StructureEditor.TRACE_SINKS:
+            mask = index.trace_sinks(vertices[0])
+            text = f"Signal of {name}: {len(index.sinks(mask))} sinks at all levels"
+        else:
+            forward = kind == StructureEditor.TRACE_FAN_OUT
+            mask = index.cone(vertices, forward)
+            text = f"Fan-{'out' if forward else 'in'} cone of {name}: {int(mask.sum())} ports of {index.instance_count(mask)} instances"
+        elapsed = time.perf_counter() - start
+        
+        level = index.level_pins(self.path, mask)
+        pin_indices, node_indices = self.connectivity_pins[level], self.connectivity_pin_nodes[level]
+        self.trace_pins = np.zeros(len(view_model.pins), dtype = bool)
+        self.trace_pins[pin_indices[pin_indices != -1]] = True
+        self.trace_nodes = np.zeros(len(view_model.nodes), dtype = bool)
+        self.trace_nodes[node_indices[node_indices != -1]] = True
+        self.trace_of = (view_model, self.root.edit_count)
+        self.mark_dirty()
+        hello_imgui.log(hello_imgui.LogLevel.info, f"{text} ({elapsed * 1000:.1f} ms)")
+    
+    """
+        editing, through the commands of self.commands; each keeps the view model and the editor state up to date
+        instead of rebuilding them, except remove_instance (removing a node renumbers the nodes after it)
+    """
+    def _pin_index(self, pin_key: Hashable) -> Optional[int]:
+        if self._pin_index_of_key is None:
+            self._pin_index_of_key = {pin.key: i for i, pin in enumerate(self.view_model.pins)}
+        return self._pin_index_of_key.get(pin_key)
+    
+    def port_of(self, pin_key: Hashable) -> Node:
+        return self.view_model.pins[self._pin_index(pin_key)].port
+    
+    def _net_pin_indices(self, pin_index: int) -> List[int]:
+        # the pins of this level in the net of the pin, including itself
+        pin_index_of_port = self.view_model.pin_index_of_port
+        return [pin_index_of_port[id(node)] for node in self.view_model.pins[pin_index].port.located_net.nodes_weak if id(node) in pin_index_of_port]
+    
+    def _net_driver_index(self, pin_index: int) -> Optional[int]:
+        # driver of the net of the pin if it is a pin of this level
+        return self.view_model.pin_index_of_port.get(id(self.view_model.pins[pin_index].port.located_net.driver()))
+    
+    def net_pin_keys(self, pin_key: Hashable) -> List[Hashable]:
+        pins = self.view_model.pins
+        return sorted((pins[i].key for i in self._net_pin_indices(self._pin_index(pin_key))), key = repr) # WeakSet order is arbitrary
+    
+    def net_peer(self, pin_key: Hashable, other_node: bool = False) -> Optional[Hashable]:
+        # any other pin of this level in the net of the pin (of another node if other_node), without listing the net
+        pins, pin_index_of_port = self.view_model.pins, self.view_model.pin_index_of_port
+        for node in self.port_of(pin_key).located_net.nodes_weak:
+            pin_index = pin_index_of_port.get(id(node))
+            if pin_index is not None and pins[pin_index].key != pin_key and not (other_node and pins[pin_index].key[0] == pin_key[0]):
+                return pins[pin_index].key
+        return None
+    
+    def net_size(self, pin_key: Hashable) -> int:
+        # ports in the net of the pin, without listing them
+        return len(self.port_of(pin_key).located_net.nodes_weak)
+    
+    def instance_pin_keys(self, subs_inst_name: str) -> List[Hashable]:
+        node = next(node for node in self.view_model.nodes if node.key == ("subs", subs_inst_name))
+        return [self.view_model.pins[i].key for i in node.inputs + node.outputs]
+    
+    """
+        connect_pins() / disconnect_pin() / split_pins() update the nets of the view model in place, at the cost of the
+        pins that change net, not of the whole nets
+    """
+    def connect_pins(self, pin_key_a: Hashable, pin_key_b: Hashable):
+        view_model = self.view_model
+        pin_index_a, pin_index_b = self._pin_index(pin_key_a), self._pin_index(pin_key_b)
+        # at most one of the nets has a driver here (see _connect_error), the pins of the other become its sinks
+        joining = self._net_pin_indices(pin_index_b if view_model.pin_nets[pin_index_a] != -1 else pin_index_a)
+        self.structure.connect(view_model.pins[pin_index_a].port, view_model.pins[pin_index_b].port)
+        driver_index = self._net_driver_index(pin_index_a)
+        if driver_index is not None:
+            view_model.add_sinks(driver_index, [i for i in joining if i != driver_index])
+        self.edit_count += 1
+        self.mark_dirty()
+    
+    def disconnect_pin(self, pin_key: Hashable):
+        self.split_pins([pin_key])
+    
+    def split_pins(self, pin_keys: List[Hashable]):
+        # takes the pins, all of one net, out of it into a net of their own
+        view_model = self.view_model
+        pin_indices = [self._pin_index(pin_key) for pin_key in pin_keys]
+        ports = [view_model.pins[i].port for i in pin_indices]
+        for driver_index, sink_index in view_model.remove_pins(pin_indices): # ids of the links gone, like _patch()
+            self.id_registry.forget(("link", (view_model.pins[driver_index].key, view_model.pins[sink_index].key)))
+        for port in ports:
+            self.structure.disconnect(port)
+        for port in ports[1:]:
+            self.structure.connect(ports[0], port)
+        driver_index = self._net_driver_index(pin_indices[0])
+        if driver_index is not None:
+            view_model.add_sinks(driver_index, [i for i in pin_indices if i != driver_index])
+        self.edit_count += 1
+        self.mark_dirty()
+    
+    def add_instance(self, subs_inst_name: str, structure: Structure, position: Tuple[float, float]):
+        self.structure.add_substructure(subs_inst_name, structure)
+        node_index = self.view_model.add_substructure(subs_inst_name)
+        self.node_rects.append()
+        self._pin_index_of_key = None
+        ed.set_node_position(self.id_registry.node_id(self.view_model.nodes[node_index].key), imgui.ImVec2(*position))
+        self.layout_changed_time = time.monotonic()
+        self.edit_count += 1
+        self.mark_dirty()
+    
+    def remove_instance(self, subs_inst_name: str) -> Tuple[Structure, Tuple[float, float]]:
+        # returns what add_instance() needs to bring it back
+        node_key = ("subs", subs_inst_name)
+        position = ed.get_node_position(self.id_registry.node_id(node_key))
+        structure = self.structure.substructures[subs_inst_name]
+        self.structure.remove_substructure(subs_inst_name)
+        child = self.children.pop(subs_inst_name, None)
+        if child is not None:
+            child.release_caches()
+        
+        old_view_model = self.view_model
+        self.view_model = StructureViewModel(self.structure)
+        self._pin_index_of_key = None
+        self.highlight_pin = None
+        self._patch(old_view_model, ViewModelDiff(old_view_model, self.view_model))
+        self.layout_changed_time = time.monotonic()
+        self.edit_count += 1
+        self.mark_dirty()
+        return structure, (position.x, position.y)
+    
+    def _connect_error(self, pin_index_a: int, pin_index_b: int) -> Optional[str]:
+        # why the two pins cannot be connected, None if they can
+        view_model = self.view_model
+        if self.structure is None:
+            return "Load the full structure to edit"
+        if not self.editable():
+            return "Substructures are edited in their own file"
+        if pin_index_a == pin_index_b or view_model.pins[pin_index_a].port.located_net is view_model.pins[pin_index_b].port.located_net:
+            return "Already connected"
+        if view_model.pin_nets[pin_index_a] != -1 and view_model.pin_nets[pin_index_b] != -1:
+            return "Both nets have a driver"
+        return None
+    
+    def run_command(self, command: Command):
+        try:
+            self.commands.run(self, command)
+        except Exception as e:
+            self._command_failed(f"{command.description} failed: {e}")
+    
+    def undo(self):
+        try:
+            self.commands.undo(self)
+        except Exception as e:
+            self._command_failed(f"Undo failed: {e}")
+    
+    def redo(self):
+        try:
+            self.commands.redo(self)
+        except Exception as e:
+            self._command_failed(f"Redo failed: {e}")
+    
+    def _command_failed(self, text: str):
+        # the structure may be changed halfway, the view model (updated in place) is built from it again
+        hello_imgui.log(hello_imgui.LogLevel.error, text)
+        self.edit_count += 1
+        self.invalidate_view_model()
+    
+    def invalidate_view_model(self):
+        # must be called after modifying self.structure in place
+        self.view_model = None
+        self._pin_index_of_key = None
+        self.mark_dirty()
+    
+    def set_port_types(self, port_types: Dict[Hashable, str]):
+        # deduced by an analysis job; only shown, the structure keeps its own (undeduced) types
+        self.port_types = port_types
+        self.mark_dirty()
+    
+    def request_layout(self):
+        # the saved positions are loaded first (lazily, on the first frame the editor is shown), see _apply_stored_layout
+        self.layout_view_model = self.view_model
+        self.layout_future = None
+        self.stored_layout_future = layout_store.default_store().load(self.view_model.structure_id)
+    
+    def _node_ids(self) -> np.ndarray:
+        return np.fromiter((self.id_registry.get_id(("node", node.key)) for node in self.view_model.nodes), dtype = np.uint64, count = len(self.view_model.nodes))
+    
+    def _apply_stored_layout(self, stored: layout_store.StoredLayout):
+        if stored is not None:
+            found, found_positions = stored.lookup(self._node_ids())
+        else:
+            found, found_positions = np.zeros(len(self.view_model.nodes), dtype = bool), None
+        
+        if found.any():
+            positions = np.zeros((len(found), 2), dtype = np.float32)
+            positions[found] = found_positions
+            self._apply_layout(positions, np.flatnonzero(found))
+        
+        # nodes added since the positions were saved (or all of them) get the automatic layout
+        if not found.all():
+            self.layout_nodes = np.flatnonzero(~found) if found.any() else None
+            self.layout_future = layout.default_engine().request(self.view_model)
+    
+    def _apply_layout(self, positions: np.ndarray, node_indices: np.ndarray = None):
+        positions = positions.tolist()
+        for node_index in (range(len(positions)) if node_indices is None else node_indices.tolist()):
+            x, y = positions[node_index]
+            node = self.view_model.nodes[node_index]
+            ed.set_node_position(self.id_registry.node_id(node.key), imgui.ImVec2(x, y))
+            if node_index not in self.node_rects.unmeasured:
+                x0, y0, x1, y1 = self.node_rects.rects[node_index]
+                self.node_rects.set(node_index, x, y, x + x1 - x0, y + y1 - y0)
+        
+        if self.layout_navigate: # navigate to the laid out content
+            self.gui_is_first_frame = True
+        self.layout_navigate = True
+        self.mark_dirty()
+    
+    def save_layout(self):
+        # snapshot of the positions of the measured nodes (all others get the automatic layout again), written in the
+        # background; node_rects hold the positions of the last frame, only drawn nodes can be moved
+        self.layout_changed_time = None
+        if self.view_model is None or len(self.node_rects) != len(self.view_model.nodes):
+            return
+        
+        measured = np.ones(len(self.node_rects), dtype = bool)
+        measured[list(self.node_rects.unmeasured)] = False
+        positions = np.array([rect[:2] for rect in self.node_rects.rects], dtype = np.float32).reshape(-1, 2)
+        self.layout_save_future = layout_store.default_store().save(self.view_model.structure_id, self._node_ids()[measured], positions[measured])
+    
+    def _update_node_rect(self, node_index: int, node_id: ed.NodeId):
+        pos = ed.get_node_position(node_id)
+        size = ed.get_node_size(node_id)
+        self._set_node_rect(node_index, pos.x, pos.y, pos.x + size.x, pos.y + size.y)
+    
+    def _set_node_rect(self, node_index: int, x0: float, y0: float, x1: float, y1: float):
+        if node_index not in self.node_rects.unmeasured:
+            rect = self.node_rects.rects[node_index]
+            if x0 != rect[0] or y0 != rect[1]: # moved by the user
+                self.layout_changed_time = time.monotonic()
+        self.node_rects.set(node_index, x0, y0, x1, y1)
+    
+    def _record_pin_anchor(self, pin_index: int, is_input: bool):
+        # right after the pin content, which is the last item
+        rect_min, rect_max = imgui.get_item_rect_min(), imgui.get_item_rect_max()
+        self.pin_anchors[pin_index] = (rect_min.x if is_input else rect_max.x, (rect_min.y + rect_max.y) * 0.5)
+    
+    def _pin_anchor(self, pin_index: int) -> Optional[Tuple[float, float]]:
+        anchor = self.pin_anchors.get(pin_index)
+        if anchor is None: # not drawn this frame, middle of the node's edge
+            pin = self.view_model.pins[pin_index]
+            if pin.node_index in self.node_rects.unmeasured:
+                return None
+            x0, y0, x1, y1 = self.node_rects.rects[pin.node_index]
+            anchor = (x0 if pin.is_input else x1, (y0 + y1) * 0.5)
+        return anchor
+    
+    def _draw_io_node(self, ctx: ed_ctx._BeginEndEditor, node_index: int, pin_ids: List[ed.PinId]):
+        node = self.view_model.nodes[node_index]
+        pins = self.view_model.pins
+        is_input = len(node.inputs) > 0
+        pin_index = node.inputs[0] if is_input else node.outputs[0]
+        
+        with ed_ctx.style_var([
+            (ed.StyleVar.node_padding, imgui.ImVec4(8, 4, 8, 8)),
+            (ed.StyleVar.node_rounding, 8)
+        ]):
+            # ed node
+            with ed_ctx.node(ctx, node.key) as n:
+                with imgui_ctx.push_id(f"io_{n.node_id.id()}"):
+                    # panel
+                    with imgui_ctx.begin_vertical("panel"):
+                        # io
+                        with ed_ctx.style_var([
+                            (ed.StyleVar.pivot_alignment, imgui.ImVec2(0, 0.5)),
+                            (ed.StyleVar.pivot_size, imgui.ImVec2(0, 0))
+                        ]):
+                            imgui.text_unformatted("io")
+                            text_rect_min = imgui.get_item_rect_min()
+                            text_rect_max = imgui.get_item_rect_max()
+                            
+                            with imgui_ctx.begin_horizontal("io"):
+                                imgui.spring(0, 0)
                                 
-                                panel_rect_min = imgui.get_item_rect_min()
-                                panel_rect_max = imgui.get_item_rect_max()
+                                if not is_input:
+                                    imgui.spring(1, 0)
+                                
+                                with ed_ctx.pin(ctx, pins[pin_index].key, ed.PinKind.input if is_input else ed.PinKind.output) as p:
+                                    pin_ids[pin_index] = p.pin_id
+                                    
+                                    with imgui_ctx.begin_horizontal(pins[pin_index].label):
+                                        with imgui_ctx.push_style_var(imgui.StyleVar_.alpha, 120):
+                                            # DrawPinIcon TODO
+                                            imgui.text_unformatted(node.name)
+                                            imgui.spring(0)
+                                    if pin_index in self.anchor_pins:
+                                        self._record_pin_anchor(pin_index, is_input)
+                    
+                    panel_rect_min = imgui.get_item_rect_min()
+                    panel_rect_max = imgui.get_item_rect_max()
+            
+            # draw node background
+            header_rect_min = panel_rect_min
+            header_rect_max = imgui.ImVec2(panel_rect_max.x, text_rect_max.y + 1)
+            
+            node_bkg_draw_list = ed.get_node_background_draw_list(n.node_id)
+            half_border_width = ed.get_style().node_border_width * 0.5
+            header_color = imgui.IM_COL32(100, 100, 100, 120) # imgui.IM_COL32(0, 0, 0, 120) | (HeaderColor & imgui.IM_COL32(255, 255, 255, 0))
+            
+            if header_rect_max.x > header_rect_min.x and header_rect_max.y > header_rect_min.y:
+                node_bkg_draw_list.add_rect_filled(
+                    header_rect_min - imgui.ImVec2(8 - half_border_width, 4 - half_border_width),
+                    header_rect_max + imgui.ImVec2(8 - half_border_width, 0),
+                    header_color,
+                    ed.get_style().node_rounding,
+                    imgui.ImDrawFlags_.round_corners_top
+                )
+        
+        self._update_node_rect(node_index, n.node_id)
+    
+    def _draw_subs_node(self, ctx: ed_ctx._BeginEndEditor, node_index: int, pin_ids: List[ed.PinId]):
+        node = self.view_model.nodes[node_index]
+        pins = self.view_model.pins
+        
+        with ed_ctx.style_var([
+            (ed.StyleVar.node_padding, imgui.ImVec4(8, 4, 8, 8)),
+            (ed.StyleVar.node_rounding, 8)
+        ]):
+            # ed node
+            with ed_ctx.node(ctx, node.key) as n:
+                with imgui_ctx.push_id(f"node_{n.node_id.id()}"):
+                    # panel
+                    with imgui_ctx.begin_vertical("panel"):
+                        # header
+                        with imgui_ctx.begin_horizontal("header"):
+                            imgui.spring(0)
+                            imgui.text_unformatted(node.name)
+                            imgui.spring(1)
+                            imgui.dummy(imgui.ImVec2(0, 28))
+                            imgui.spring(0)
                         
-                        # draw node background
-                        header_rect_min = panel_rect_min
-                        header_rect_max = imgui.ImVec2(panel_rect_max.x, text_rect_max.y + 1)
+                        header_rect_min = imgui.get_item_rect_min()
+                        header_rect_max = imgui.get_item_rect_max()
                         
-                        node_bkg_draw_list = ed.get_node_background_draw_list(n.node_id)
-                        half_border_width = ed.get_style().node_border_width * 0.5
-                        header_color = imgui.IM_COL32(100, 100, 100, 120) # imgui.IM_COL32(0, 0, 0, 120) | (HeaderColor & imgui.IM_COL32(255, 255, 255, 0))
+                        # ImGui::Spring(0, ImGui::GetStyle().ItemSpacing.y * 2.0f);
                         
-                        if header_rect_max.x > header_rect_min.x and header_rect_max.y > header_rect_min.y:
-                            node_bkg_draw_list.add_rect_filled(
-                                header_rect_min - imgui.ImVec2(8 - half_border_width, 4 - half_border_width),
-                                header_rect_max + imgui.ImVec2(8 - half_border_width, 0),
-                                header_color,
-                                ed.get_style().node_rounding,
-                                imgui.ImDrawFlags_.round_corners_top
-                            )
-                
-                # draw substructures as ed nodes
-                for subs_inst_name, subs in self.structure.substructures.items():
-                    with ed_ctx.style_var([
-                        (ed.StyleVar.node_padding, imgui.ImVec4(8, 4, 8, 8)),
-                        (ed.StyleVar.node_rounding, 8)
-                    ]):
-                        # ed node
-                        with ed_ctx.node(ctx) as n:
-                            id_obj_mapping[n.node_id] = subs
-                            obj_id_mapping[subs] = n.node_id
+                        # content
+                        with imgui_ctx.begin_horizontal("content"):
+                            imgui.spring(0, 0)
                             
-                            with imgui_ctx.push_id(f"node_{n.node_id.id()}"):
-                                # panel
-                                with imgui_ctx.begin_vertical("panel"):
-                                    # header
-                                    with imgui_ctx.begin_horizontal("header"):
+                            # input pins
+                            with imgui_ctx.begin_vertical("inputs", imgui.ImVec2(0, 0), 0.0):
+                                with ed_ctx.style_var([
+                                    (ed.StyleVar.pivot_alignment, imgui.ImVec2(0, 0.5)),
+                                    (ed.StyleVar.pivot_size, imgui.ImVec2(0, 0))
+                                ]):
+                                    for pin_index in node.inputs:
                                         imgui.spring(0)
-                                        imgui.text_unformatted(subs_inst_name)
-                                        imgui.spring(1)
-                                        imgui.dummy(imgui.ImVec2(0, 28))
-                                        imgui.spring(0)
-                                    
-                                    header_rect_min = imgui.get_item_rect_min()
-                                    header_rect_max = imgui.get_item_rect_max()
-                                    
-                                    # ImGui::Spring(0, ImGui::GetStyle().ItemSpacing.y * 2.0f);
-                                    
-                                    # content
-                                    with imgui_ctx.begin_horizontal("content"):
-                                        imgui.spring(0, 0)
-                                        
-                                        # input pins
-                                        with imgui_ctx.begin_vertical("inputs", imgui.ImVec2(0, 0), 0.0):
-                                            with ed_ctx.style_var([
-                                                (ed.StyleVar.pivot_alignment, imgui.ImVec2(0, 0.5)),
-                                                (ed.StyleVar.pivot_size, imgui.ImVec2(0, 0))
-                                            ]):
-                                                for port_full_name, port in self.structure.get_subs_ports_outside(subs_inst_name).nodes():
-                                                    if not port.origin_signal_type.belongs(Input):
-                                                        continue
-                                                    
-                                                    nets.add(port.located_net)
-                                                    
+                                        with ed_ctx.pin(ctx, pins[pin_index].key, ed.PinKind.input) as p:
+                                            pin_ids[pin_index] = p.pin_id
+                                            
+                                            with imgui_ctx.begin_horizontal(pins[pin_index].label):
+                                                with imgui_ctx.push_style_var(imgui.StyleVar_.alpha, 120):
+                                                    # DrawPinIcon TODO
+                                                    imgui.text_unformatted(pins[pin_index].label)
                                                     imgui.spring(0)
-                                                    with ed_ctx.pin(ctx, ed.PinKind.input) as p:
-                                                        id_obj_mapping[p.pin_id] = port
-                                                        obj_id_mapping[port] = p.pin_id
-                                                        
-                                                        with imgui_ctx.begin_horizontal(p.pin_id.id()):
-                                                            with imgui_ctx.push_style_var(imgui.StyleVar_.alpha, 120):
-                                                                # DrawPinIcon TODO
-                                                                imgui.text_unformatted(port_full_name)
-                                                                imgui.spring(0)
-                                            imgui.spring(1, 0)
-                                        
-                                        imgui.spring(1)
-                                        
-                                        # output pins
-                                        with imgui_ctx.begin_vertical("outputs", imgui.ImVec2(0, 0), 0.0):
-                                            with ed_ctx.style_var([
-                                                (ed.StyleVar.pivot_alignment, imgui.ImVec2(1, 0.5)),
-                                                (ed.StyleVar.pivot_size, imgui.ImVec2(0, 0))
-                                            ]):
-                                                for port_full_name, port in self.structure.get_subs_ports_outside(subs_inst_name).nodes():
-                                                    if not port.origin_signal_type.belongs(Output):
-                                                        continue
-                                                    
-                                                    nets.add(port.located_net)
-                                                    
+                                            if pin_index in self.anchor_pins:
+                                                self._record_pin_anchor(pin_index, True)
+                                imgui.spring(1, 0)
+                            
+                            imgui.spring(1)
+                            
+                            # output pins
+                            with imgui_ctx.begin_vertical("outputs", imgui.ImVec2(0, 0), 0.0):
+                                with ed_ctx.style_var([
+                                    (ed.StyleVar.pivot_alignment, imgui.ImVec2(1, 0.5)),
+                                    (ed.StyleVar.pivot_size, imgui.ImVec2(0, 0))
+                                ]):
+                                    for pin_index in node.outputs:
+                                        imgui.spring(0)
+                                        with ed_ctx.pin(ctx, pins[pin_index].key, ed.PinKind.output) as p:
+                                            pin_ids[pin_index] = p.pin_id
+                                            
+                                            with imgui_ctx.begin_horizontal(pins[pin_index].label):
+                                                with imgui_ctx.push_style_var(imgui.StyleVar_.alpha, 120):
+                                                    # DrawPinIcon TODO
+                                                    imgui.text_unformatted(pins[pin_index].label)
                                                     imgui.spring(0)
-                                                    with ed_ctx.pin(ctx, ed.PinKind.output) as p:
-                                                        id_obj_mapping[p.pin_id] = port
-                                                        obj_id_mapping[port] = p.pin_id
-                                                        
-                                                        with imgui_ctx.begin_horizontal(p.pin_id.id()):
-                                                            with imgui_ctx.push_style_var(imgui.StyleVar_.alpha, 120):
-                                                                # DrawPinIcon TODO
-                                                                imgui.text_unformatted(port_full_name)
-                                                                imgui.spring(0)
-                                            imgui.spring(1, 0)
-                                    
-                                    content_rect_min = imgui.get_item_rect_min()
-                                    content_rect_max = imgui.get_item_rect_max()
-                                
-                                panel_rect_min = imgui.get_item_rect_min()
-                                panel_rect_max = imgui.get_item_rect_max()
+                                            if pin_index in self.anchor_pins:
+                                                self._record_pin_anchor(pin_index, False)
+                                imgui.spring(1, 0)
+                        
+                        content_rect_min = imgui.get_item_rect_min()
+                        content_rect_max = imgui.get_item_rect_max()
+                    
+                    panel_rect_min = imgui.get_item_rect_min()
+                    panel_rect_max = imgui.get_item_rect_max()
+            
+            # draw node background
+            node_bkg_draw_list = ed.get_node_background_draw_list(n.node_id)
+            half_border_width = ed.get_style().node_border_width * 0.5
+            header_color = imgui.IM_COL32(100, 100, 100, 120) # imgui.IM_COL32(0, 0, 0, 120) | (HeaderColor & imgui.IM_COL32(255, 255, 255, 0))
+            
+            if header_rect_max.x > header_rect_min.x and header_rect_max.y > header_rect_min.y:
+                node_bkg_draw_list.add_rect_filled(
+                    header_rect_min - imgui.ImVec2(8 - half_border_width, 4 - half_border_width),
+                    header_rect_max + imgui.ImVec2(8 - half_border_width, 0),
+                    header_color,
+                    ed.get_style().node_rounding,
+                    imgui.ImDrawFlags_.round_corners_top
+                )
+        
+        self._update_node_rect(node_index, n.node_id)
+    
+    def _draw_node_fast(self, ctx: ed_ctx._BeginEndEditor, node_index: int, pin_ids: List[ed.PinId]):
+        # the look of _draw_io_node / _draw_subs_node, but no imgui layout (stack layouts, springs, text items): the
+        # geometry is computed once, then every frame is a dummy item, pins and draw list text at fixed offsets
+        view_model = self.view_model
+        node = view_model.nodes[node_index]
+        pins, pin_nets = view_model.pins, view_model.pin_nets
+        geometry = self.node_geometry.get(node_index)
+        if geometry is None:
+            geometry = self.node_geometry[node_index] = NodeGeometry(view_model, node_index, self.text_metrics)
+        text_color, half_border_width = self.frame_style
+        line_height = self.text_metrics.line_height
+        
+        with ed_ctx.style_var([
+            (ed.StyleVar.node_padding, imgui.ImVec4(8, 4, 8, 8)),
+            (ed.StyleVar.node_rounding, 8)
+        ]):
+            # no item spacing, otherwise every pin (an empty group after the dummy) adds a line to the node
+            with ed_ctx.node(ctx, node.key) as n, imgui_ctx.push_style_var(imgui.StyleVar_.item_spacing, imgui.ImVec2(0, 0)):
+                origin = imgui.get_cursor_screen_pos() # node position + padding
+                ox, oy = origin.x, origin.y
+                imgui.dummy(imgui.ImVec2(geometry.width, geometry.height))
+                
+                draw_list = imgui.get_window_draw_list()
+                draw_list.add_text(imgui.ImVec2(ox, oy + (geometry.header_height - line_height) * 0.5), text_color, geometry.title)
+                
+                for pin_indices, rows, kind, is_input in (
+                    (node.inputs, geometry.input_rows, ed.PinKind.input, True),
+                    (node.outputs, geometry.output_rows, ed.PinKind.output, False)
+                ):
+                    for pin_index, (y, label_x0, label_x1, label) in zip(pin_indices, rows):
+                        x0, y0, x1, y1 = ox + label_x0, oy + y, ox + label_x1, oy + y + line_height
+                        draw_list.add_text(imgui.ImVec2(x0, y0), text_color, label)
                         
-                        # draw node background
-                        node_bkg_draw_list = ed.get_node_background_draw_list(n.node_id)
-                        half_border_width = ed.get_style().node_border_width * 0.5
-                        header_color = imgui.IM_COL32(100, 100, 100, 120) # imgui.IM_COL32(0, 0, 0, 120) | (HeaderColor & imgui.IM_COL32(255, 255, 255, 0))
+                        # pivot like pivot_alignment (0 / 1, 0.5) with pivot_size 0: on the outer edge of the pin, on the
+                        # left edge for both kinds in IO nodes
+                        pivot = imgui.ImVec2(x0 if is_input or node.is_io else x1, (y0 + y1) * 0.5)
+                        with ed_ctx.pin(ctx, pins[pin_index].key, kind) as p:
+                            pin_ids[pin_index] = p.pin_id
+                            ed.pin_rect(imgui.ImVec2(x0, y0), imgui.ImVec2(x1, y1))
+                            ed.pin_pivot_rect(pivot, pivot)
                         
-                        if header_rect_max.x > header_rect_min.x and header_rect_max.y > header_rect_min.y:
-                            node_bkg_draw_list.add_rect_filled(
-                                header_rect_min - imgui.ImVec2(8 - half_border_width, 4 - half_border_width),
-                                header_rect_max + imgui.ImVec2(8 - half_border_width, 0),
-                                header_color,
-                                ed.get_style().node_rounding,
-                                imgui.ImDrawFlags_.round_corners_top
-                            )
+                        # icon: filled if the pin is connected
+                        if pin_nets[pin_index] != -1:
+                            draw_list.add_circle_filled(pivot, NodeGeometry.ICON_RADIUS, text_color)
+                        else:
+                            draw_list.add_circle(pivot, NodeGeometry.ICON_RADIUS, text_color)
+                        if pin_index in self.anchor_pins:
+                            self.pin_anchors[pin_index] = (x0 if is_input else x1, pivot.y)
+            
+            # draw node background
+            ed.get_node_background_draw_list(n.node_id).add_rect_filled(
+                imgui.ImVec2(ox - 8 + half_border_width, oy - 4 + half_border_width),
+                imgui.ImVec2(ox + geometry.width + 8 - half_border_width, oy + geometry.header_height + (1 if node.is_io else 0)),
+                imgui.IM_COL32(100, 100, 100, 120),
+                8,
+                imgui.ImDrawFlags_.round_corners_top
+            )
+        
+        self._set_node_rect(node_index, ox - 8, oy - 4, ox + geometry.width + 8, oy + geometry.height + 8)
+    
+    def _draw_node(self, ctx: ed_ctx._BeginEndEditor, node_index: int, pin_ids: List[ed.PinId]):
+        if self.renderer == StructureEditor.RENDERER_FAST:
+            with profiler.scope("editor.fast_node"):
+                self._draw_node_fast(ctx, node_index, pin_ids)
+        elif node_index < self.view_model.io_node_count:
+            with profiler.scope("editor.io_node"):
+                self._draw_io_node(ctx, node_index, pin_ids)
+        else:
+            with profiler.scope("editor.subs_node"):
+                self._draw_subs_node(ctx, node_index, pin_ids)
+    
+    def _draw_node_box(self, ctx: ed_ctx._BeginEndEditor, node_index: int, pin_ids: List[ed.PinId], show_name: bool):
+        # cheap stand-in for a node: keeps the last measured size and puts all pins on the left / right edge
+        node = self.view_model.nodes[node_index]
+        pins = self.view_model.pins
+        x0, y0, x1, y1 = self.node_rects.rects[node_index]
+        y_mid = (y0 + y1) * 0.5
+        
+        with ed_ctx.style_var([
+            (ed.StyleVar.node_padding, imgui.ImVec4(8, 4, 8, 8)),
+            (ed.StyleVar.node_rounding, 8)
+        ]):
+            with ed_ctx.node(ctx, node.key) as n:
+                # no item spacing, otherwise every (empty) pin group adds a line to the node
+                with imgui_ctx.push_style_var(imgui.StyleVar_.item_spacing, imgui.ImVec2(0, 0)):
+                    imgui.dummy(imgui.ImVec2(max(x1 - x0 - 16, 0), max(y1 - y0 - 12, 0)))
+                    
+                    for pin_indices, kind, x in ((node.inputs, ed.PinKind.input, x0), (node.outputs, ed.PinKind.output, x1)):
+                        for pin_index in pin_indices:
+                            with ed_ctx.pin(ctx, pins[pin_index].key, kind) as p:
+                                pin_ids[pin_index] = p.pin_id
+                                ed.pin_rect(imgui.ImVec2(x, y_mid), imgui.ImVec2(x, y_mid))
+                                ed.pin_pivot_rect(imgui.ImVec2(x, y_mid), imgui.ImVec2(x, y_mid))
+                            if pin_index in self.anchor_pins:
+                                self.pin_anchors[pin_index] = (x, y_mid)
+        
+        if show_name:
+            ed.get_node_background_draw_list(n.node_id).add_text(imgui.ImVec2(x0 + 8, y0 + 4), imgui.get_color_u32(imgui.Col_.text), node.name)
+        
+        self._update_node_rect(node_index, n.node_id)
+    
+    def _draw_net_bundle(self, draw_list: imgui.ImDrawList, driver_index: int, sink_indices: List[int], sink_count: int):
+        # sink_indices: sinks on drawn nodes, sink_count: all sinks of the net
+        pins, nodes = self.view_model.pins, self.view_model.nodes
+        color = imgui.IM_COL32(255, 255, 255, 255)
+        driver = self._pin_anchor(driver_index)
+        sinks = [self.pin_anchors[i] for i in sink_indices if i in self.pin_anchors]
+        
+        if self.net_style == StructureEditor.NET_STYLE_STUB:
+            driver_pin = pins[driver_index]
+            driver_node = nodes[driver_pin.node_index]
+            label = driver_node.name if driver_node.is_io else f"{driver_node.name}.{driver_pin.label}"
+            if driver is not None and driver_index in self.pin_anchors:
+                dx, dy = driver
+                draw_list.add_line(imgui.ImVec2(dx, dy), imgui.ImVec2(dx + 20, dy), color, 2.0)
+                draw_list.add_text(imgui.ImVec2(dx + 24, dy - 7), color, f"{label} x{sink_count}")
+            if sinks:
+                label_width = imgui.calc_text_size(label).x
+                for sx, sy in sinks:
+                    draw_list.add_line(imgui.ImVec2(sx - 20, sy), imgui.ImVec2(sx, sy), color, 2.0)
+                    draw_list.add_text(imgui.ImVec2(sx - 24 - label_width, sy - 7), color, label)
+            return
+        
+        # bundled: driver -> junction -> vertical trunk -> one short branch per sink
+        if driver is None or (not sinks and driver_index not in self.pin_anchors):
+            return
+        dx, dy = driver
+        trunk_x = max(dx + 20, min((sx for sx, _ in sinks), default = dx + 60) - 30)
+        trunk_y0 = min([dy] + [sy for _, sy in sinks])
+        trunk_y1 = max([dy] + [sy for _, sy in sinks])
+        draw_list.add_line(imgui.ImVec2(dx, dy), imgui.ImVec2(trunk_x, dy), color, 2.0)
+        if trunk_y1 > trunk_y0:
+            draw_list.add_line(imgui.ImVec2(trunk_x, trunk_y0), imgui.ImVec2(trunk_x, trunk_y1), color, 2.0)
+        draw_list.add_circle_filled(imgui.ImVec2(trunk_x, dy), 3.0, color)
+        for sx, sy in sinks:
+            draw_list.add_line(imgui.ImVec2(trunk_x, sy), imgui.ImVec2(sx, sy), color, 1.0)
+        if driver_index in self.pin_anchors:
+            draw_list.add_text(imgui.ImVec2(trunk_x + 4, dy - 16), color, f"x{sink_count}")
+    
+    def _gui_trace_menu_items(self, pin_keys: List[Hashable], inputs: List[Hashable], outputs: List[Hashable]):
+        # pin_keys: a single pin to trace the signal of, empty for a node; inputs / outputs: the cone starts
+        if pin_keys:
+            clicked, _ = imgui.menu_item("Trace Driver", "", False)
+            if clicked:
+                self.trace(StructureEditor.TRACE_DRIVER, pin_keys)
+            clicked, _ = imgui.menu_item("Trace All Sinks", "", False)
+            if clicked:
+                self.trace(StructureEditor.TRACE_SINKS, pin_keys)
+        clicked, _ = imgui.menu_item("Highlight Fan-in Cone", "", False, len(inputs) > 0)
+        if clicked:
+            self.trace(StructureEditor.TRACE_FAN_IN, inputs)
+        clicked, _ = imgui.menu_item("Highlight Fan-out Cone", "", False, len(outputs) > 0)
+        if clicked:
+            self.trace(StructureEditor.TRACE_FAN_OUT, outputs)
+        if self.trace_pins is not None:
+            imgui.separator()
+            clicked, _ = imgui.menu_item("Clear Highlight", "", False)
+            if clicked:
+                self.clear_trace()
+    
+    def _gui_context_menu(self):
+        context_pin, context_node = ed.PinId(), ed.NodeId()
+        ed.suspend()
+        if ed.show_pin_context_menu(context_pin):
+            self.context_menu_key = self.id_registry.get_key(context_pin)
+            imgui.open_popup("editor_pin")
+        elif ed.show_node_context_menu(context_node):
+            self.context_menu_key = self.id_registry.get_key(context_node)
+            imgui.open_popup("editor_node")
+        elif ed.show_background_context_menu():
+            imgui.open_popup("editor_background")
+        
+        # keys are ("pin", pin key) / ("node", node key), None if the id is not known (anymore)
+        if imgui.begin_popup("editor_pin"):
+            pin_index = self._pin_index(self.context_menu_key[1]) if self.context_menu_key is not None else None
+            if pin_index is not None:
+                pin = self.view_model.pins[pin_index]
+                imgui.text_disabled(pin.label)
+                self._gui_trace_menu_items([pin.key], [pin.key], [pin.key])
+            imgui.end_popup()
+        if imgui.begin_popup("editor_node"):
+            node = next((node for node in self.view_model.nodes if self.context_menu_key is not None and node.key == self.context_menu_key[1]), None)
+            if node is not None:
+                pins = self.view_model.pins
+                imgui.text_disabled(node.name)
+                if not node.is_io:
+                    clicked, _ = imgui.menu_item("Open", "Double-click", False)
+                    if clicked:
+                        self.open_request = (self.path + (node.name, ), False)
+                    clicked, _ = imgui.menu_item("Open in New Tab", "", False)
+                    if clicked:
+                        self.open_request = (self.path + (node.name, ), True)
+                    imgui.separator()
+                self._gui_trace_menu_items([], [pins[i].key for i in node.inputs], [pins[i].key for i in node.outputs])
+            imgui.end_popup()
+        if imgui.begin_popup("editor_background"):
+            if self.editable():
+                undo_text = f"Undo {self.commands.done[-1].description}" if self.commands.can_undo() else "Undo"
+                clicked, _ = imgui.menu_item(undo_text, "Ctrl+Z", False, self.commands.can_undo())
+                if clicked:
+                    self.undo()
+                redo_text = f"Redo {self.commands.undone[-1].description}" if self.commands.can_redo() else "Redo"
+                clicked, _ = imgui.menu_item(redo_text, "Ctrl+Y", False, self.commands.can_redo())
+                if clicked:
+                    self.redo()
+                clicked, _ = imgui.menu_item("Add Instance From File...", "", False, self.instance_request is None)
+                if clicked:
+                    position = ed.screen_to_canvas(imgui.get_mouse_pos_on_opening_current_popup())
+                    self._add_instance_from_file((position.x, position.y))
+                imgui.separator()
+            
+            imgui.text_disabled(f"Nets with more than {self.fanout_threshold} sinks")
+            for net_style, text in (
+                (StructureEditor.NET_STYLE_LINKS, "Links"),
+                (StructureEditor.NET_STYLE_BUNDLED, "Bundled"),
+                (StructureEditor.NET_STYLE_STUB, "Stubs")
+            ):
+                clicked, _ = imgui.menu_item(text, "", self.net_style == net_style)
+                if clicked:
+                    self.net_style = net_style
+                    self.mark_dirty()
+            imgui.separator()
+            if self.trace_pins is not None:
+                clicked, _ = imgui.menu_item("Clear Highlight", "", False)
+                if clicked:
+                    self.clear_trace()
+                imgui.separator()
+            imgui.text_disabled("Nodes")
+            for renderer, text in (
+                (StructureEditor.RENDERER_STACK, "Stack Layout"),
+                (StructureEditor.RENDERER_FAST, "Fast")
+            ):
+                clicked, _ = imgui.menu_item(text, "", self.renderer == renderer)
+                if clicked:
+                    self.renderer = renderer
+                    self.mark_dirty()
+            
+            if self.structure is None: # opened from the index
+                imgui.separator()
+                clicked, _ = imgui.menu_item("Load Full Structure", "", False, not self.structure_requested)
+                if clicked:
+                    self.structure_requested = True
+            
+            # analysis of the whole file, the owner loads the structure first if needed
+            if self.parent is None:
+                imgui.separator()
+                job = self.analysis_job
+                idle = self.analysis_request is None and (job is None or job.state != AnalysisJob.RUNNING)
+                clicked, _ = imgui.menu_item("Deduce Types", "", False, idle)
+                if clicked:
+                    self.analysis_request = (AnalysisJob.DEDUCE, None)
+                clicked, _ = imgui.menu_item("Generate HDL...", "", False, idle)
+                if clicked:
+                    output_dir = pfd.select_folder("Output directory for the HDL").result()
+                    if output_dir:
+                        self.analysis_request = (AnalysisJob.GENERATE, output_dir)
+                if job is not None and job.state == AnalysisJob.RUNNING:
+                    clicked, _ = imgui.menu_item(f"Cancel ({job.status})", "", False)
+                    if clicked:
+                        job.cancel()
+            imgui.end_popup()
+        ed.resume()
+    
+    def _add_instance_from_file(self, position: Tuple[float, float]):
+        # the file is loaded in the background by the owner, like any file, see add_loaded_instance()
+        res = pfd.open_file("Select the structure to instantiate").result()
+        if res:
+            self.instance_request = (res[0], position)
+    
+    def add_loaded_instance(self, job: LoadJob):
+        file_path, position = self.instance_request
+        self.instance_request = None
+        self.instance_job = None
+        if job.state != LoadJob.DONE:
+            if job.state == LoadJob.FAILED:
+                hello_imgui.log(hello_imgui.LogLevel.error, f"Could not load {file_path}: {job.error}")
+            return
+        if not self.editable(): # reloaded or closed meanwhile
+            return
+        base_name = f"u_{os.path.splitext(os.path.basename(file_path))[0]}"
+        subs_inst_name = next(f"{base_name}_{i}" for i in itertools.count() if f"{base_name}_{i}" not in self.structure.substructures)
+        self.run_command(AddInstanceCommand(subs_inst_name, job.structure, position))
+    
+    def _gui_hint(self, text: str):
+        # next to the mouse, while a link is being dragged
+        ed.suspend()
+        with imgui_ctx.begin_tooltip():
+            imgui.text_unformatted(text)
+        ed.resume()
+    
+    def _gui_pin_tooltip(self, view_model: StructureViewModel):
+        hovered = ed.get_hovered_pin()
+        if hovered.id() == 0:
+            return
+        key = self.id_registry.get_key(hovered)
+        if key is None:
+            return
+        pin_key = key[1]
+        
+        pin_index = self._pin_index(pin_key)
+        if pin_index is None:
+            return
+        pin = view_model.pins[pin_index]
+        
+        deduced = self.port_types.get(pin_key)
+        if pin.port is not None:
+            declared = str(pin.port.signal_type)
+        else:
+            declared = self.index.pin_type(pin_index) if self.index is not None else "?"
+        
+        ed.suspend()
+        with imgui_ctx.begin_tooltip():
+            imgui.text_unformatted(pin.label)
+            imgui.text_disabled(f"declared: {declared}")
+            if deduced is not None:
+                imgui.text_unformatted(f"deduced: {deduced}")
+        ed.resume()
+    
+    def gui(self):
+        # node editor context, recreated after release_caches()
+        if self.context is None:
+            self.context = ed.create_editor(self.ed_config)
+        ed.set_current_editor(self.context)
+        
+        with profiler.scope("editor.gui"):
+            self._gui()
+    
+    def _gui(self):
+        # structure
+        with ed_ctx.editor(f"editor_{hash(self)}", registry = self.id_registry) as ctx:
+            with imgui_ctx.push_id(f"editor_{ctx.editor_id}"):
+                view_model = self.get_view_model()
+                if view_model is None:
+                    return
+                
+                pins = view_model.pins
+                pin_ids: List[ed.PinId] = [None] * len(pins)
+                
+                # layout, computed in the background
+                profile_start = profiler.now() if profiler.enabled else 0.0
+                if self.layout_view_model is not view_model:
+                    self.request_layout()
+                if self.stored_layout_future is not None and self.stored_layout_future.done():
+                    future, self.stored_layout_future = self.stored_layout_future, None
+                    if future.exception() is not None:
+                        hello_imgui.log(hello_imgui.LogLevel.warning, f"Could not read the saved layout: {future.exception()}")
+                    if self.layout_view_model is view_model:
+                        self._apply_stored_layout(future.result() if future.exception() is None else None)
+                if self.layout_future is not None and self.layout_future.done():
+                    future, self.layout_future = self.layout_future, None
+                    if future.exception() is not None:
+                        hello_imgui.log(hello_imgui.LogLevel.error, f"Layout failed: {future.exception()}")
+                    elif self.layout_view_model is view_model:
+                        self._apply_layout(future.result(), self.layout_nodes)
+                
+                # moved nodes are saved once they have been left alone for a moment
+                if self.layout_changed_time is not None and time.monotonic() - self.layout_changed_time > StructureEditor.SAVE_DELAY:
+                    self.save_layout()
+                if self.layout_save_future is not None and self.layout_save_future.done():
+                    future, self.layout_save_future = self.layout_save_future, None
+                    if future.exception() is not None:
+                        hello_imgui.log(hello_imgui.LogLevel.error, f"Could not save the layout: {future.exception()}")
+                if profiler.enabled:
+                    profiler.record("editor.layout", profile_start)
+                
+                # signal tracing, the index is built in the background
+                self._update_trace(view_model)
+                
+                # culling: nodes intersecting the view (plus a margin), and some of the nodes never measured so far
+                profile_start = profiler.now() if profiler.enabled else 0.0
+                inv_scale = ed.get_current_zoom() # imgui-node-editor returns the inverse of the view scale
+                margin = StructureEditor.CULL_MARGIN * inv_scale
+                view_x0, view_y0, view_x1, view_y1 = ctx.get_view_rect()
+                visible = self.node_rects.query(view_x0 - margin, view_y0 - margin, view_x1 + margin, view_y1 + margin)
+                visible.update(itertools.islice(self.node_rects.unmeasured, StructureEditor.MEASURE_BUDGET))
+                
+                # links with at least one visible endpoint, their other endpoints are submitted as bare boxes
+                link_indices: Set[int] = set()
+                for node_index in visible:
+                    link_indices.update(view_model.node_links[node_index])
+                
+                # high fan-out nets are drawn from the pins on visible nodes only, their far ends are not pulled in
+                bundles: Dict[int, List[int]] = {} # net index -> sinks on visible nodes
+                self.anchor_pins = set()
+                self.pin_anchors = {}
+                if self.net_style != StructureEditor.NET_STYLE_LINKS:
+                    nets, link_nets = view_model.nets, view_model.link_nets
+                    for link_index in [i for i in link_indices if len(nets[link_nets[i]].sinks) > self.fanout_threshold]:
+                        link_indices.discard(link_index)
+                        driver_index, sink_index = view_model.links[link_index]
+                        sinks = bundles.setdefault(link_nets[link_index], [])
+                        if pins[sink_index].node_index in visible:
+                            sinks.append(sink_index)
+                            self.anchor_pins.add(sink_index)
+                        if pins[driver_index].node_index in visible:
+                            self.anchor_pins.add(driver_index)
+                
+                # traced pins on visible nodes get a marker
+                trace_pins, trace_nodes = self.trace_pins, self.trace_nodes
+                if trace_pins is not None:
+                    for node_index in visible:
+                        if trace_nodes[node_index]:
+                            node = view_model.nodes[node_index]
+                            self.anchor_pins.update(i for i in node.inputs + node.outputs if trace_pins[i])
+                
+                if self.highlight_pin is not None:
+                    if time.monotonic() < self.highlight_until and self.highlight_pin < len(pins):
+                        self.anchor_pins.add(self.highlight_pin)
+                    else:
+                        self.highlight_pin = None
+                
+                proxies: Set[int] = set()
+                for link_index in link_indices:
+                    driver_index, sink_index = view_model.links[link_index]
+                    proxies.add(pins[driver_index].node_index)
+                    proxies.add(pins[sink_index].node_index)
+                proxies -= visible
+                if profiler.enabled:
+                    profiler.record("editor.culling", profile_start)
+                
+                # level of detail: labels are unreadable when zoomed out, draw named boxes instead
+                detailed = inv_scale <= StructureEditor.LOD_INV_SCALE
+                
+                # fast renderer: geometry is measured again only for another font (size, DPI) or view model
+                if self.renderer == StructureEditor.RENDERER_FAST:
+                    if self.text_metrics.update() or self.geometry_view_model is not view_model:
+                        self.node_geometry = {}
+                        self.geometry_view_model = view_model
+                    self.frame_style = (imgui.get_color_u32(imgui.Col_.text), ed.get_style().node_border_width * 0.5)
+                
+                # boxes need a measured size, so never measured nodes are always drawn in full
+                for node_index in sorted(visible):
+                    if node_index in self.node_rects.unmeasured or detailed:
+                        self._draw_node(ctx, node_index, pin_ids)
+                    else:
+                        with profiler.scope("editor.node_box"):
+                            self._draw_node_box(ctx, node_index, pin_ids, True)
+                
+                for node_index in sorted(proxies):
+                    if node_index in self.node_rects.unmeasured:
+                        self._draw_node(ctx, node_index, pin_ids)
+                    else:
+                        with profiler.scope("editor.node_box"):
+                            self._draw_node_box(ctx, node_index, pin_ids, False)
                 
                 # draw nets
-                for net in nets:
-                    driver_pin_id = obj_id_mapping.get(net.driver())
-                    if driver_pin_id is None:
-                        continue
-                    
-                    for node in net.nodes_weak:
-                        node_pin_id = obj_id_mapping.get(node)
-                        if node_pin_id is None or node_pin_id is driver_pin_id:
-                            continue
-                        
-                        ed_ctx.link(ctx, driver_pin_id, node_pin_id)
+                with profiler.scope("editor.links"):
+                    for link_index in link_indices:
+                        driver_index, sink_index = view_model.links[link_index]
+                        if trace_pins is not None and trace_pins[driver_index] and trace_pins[sink_index]:
+                            ed_ctx.link(ctx, (pins[driver_index].key, pins[sink_index].key), pin_ids[driver_index], pin_ids[sink_index], imgui.ImVec4(*StructureEditor.TRACE_COLOR), 3.0)
+                        else:
+                            ed_ctx.link(ctx, (pins[driver_index].key, pins[sink_index].key), pin_ids[driver_index], pin_ids[sink_index])
+                
+                if bundles:
+                    with profiler.scope("editor.net_bundles"):
+                        draw_list = imgui.get_window_draw_list()
+                        for net_index in sorted(bundles):
+                            net_view = view_model.nets[net_index]
+                            self._draw_net_bundle(draw_list, net_view.driver, bundles[net_index], len(net_view.sinks))
+                
+                if trace_pins is not None:
+                    with profiler.scope("editor.trace"):
+                        draw_list = imgui.get_window_draw_list()
+                        trace_color = imgui.IM_COL32(*(int(c * 255) for c in StructureEditor.TRACE_COLOR))
+                        for node_index in visible:
+                            if trace_nodes[node_index] and node_index not in self.node_rects.unmeasured:
+                                x0, y0, x1, y1 = self.node_rects.rects[node_index]
+                                draw_list.add_rect(imgui.ImVec2(x0, y0), imgui.ImVec2(x1, y1), trace_color, 8.0, 0, 2.0)
+                        for pin_index, (x, y) in self.pin_anchors.items():
+                            if trace_pins[pin_index]:
+                                draw_list.add_circle_filled(imgui.ImVec2(x, y), 4.0, trace_color)
+                
+                if self.highlight_pin is not None and self.highlight_pin in self.pin_anchors:
+                    x, y = self.pin_anchors[self.highlight_pin]
+                    imgui.get_window_draw_list().add_circle(imgui.ImVec2(x, y), 8.0, imgui.IM_COL32(255, 200, 0, 255), 0, 2.0)
+                
+                if self.navigate_target is not None:
+                    self._navigate(view_model)
                 
                 # link on_create
-                with ed_ctx.on_create():
-                    with ed_ctx.new_link() as (input_pin_id, output_pin_id):
-                        if ed.accept_new_item():
-                            pass
+                with ed_ctx.on_create() as creating:
+                    if creating:
+                        new_link = ed_ctx.new_link()
+                        if new_link is not None:
+                            pin_key_a, pin_key_b = (self.id_registry.get_key(pin_id)[1] for pin_id in new_link)
+                            error = self._connect_error(self._pin_index(pin_key_a), self._pin_index(pin_key_b))
+                            if error is not None:
+                                ed.reject_new_item(imgui.ImVec4(1, 0.3, 0.3, 1), 2.0)
+                                self._gui_hint(error)
+                            elif ed.accept_new_item():
+                                self.run_command(ConnectCommand(pin_key_a, pin_key_b))
+                
+                # deleted links and nodes, as one command
+                with ed_ctx.on_delete() as deleting:
+                    if deleting:
+                        deleted: List[Command] = []
+                        for link_id in ed_ctx.deleted_links():
+                            key = self.id_registry.get_key(link_id)
+                            if not self.editable() or key is None:
+                                ed.reject_deleted_item()
+                            elif ed.accept_deleted_item():
+                                deleted.append(DisconnectCommand(key[1][1])) # the sink leaves the net
+                        for node_id in ed_ctx.deleted_nodes():
+                            key = self.id_registry.get_key(node_id)
+                            if not self.editable() or key is None or key[1][0] != "subs": # IO ports stay
+                                ed.reject_deleted_item()
+                            elif ed.accept_deleted_item():
+                                deleted.append(DeleteInstanceCommand(key[1][1]))
+                        if deleted:
+                            self.run_command(CommandGroup(deleted))
+                
+                # double-clicked instance, opened by the owner (the structure is loaded first if needed)
+                double_clicked = ed.get_double_clicked_node()
+                if double_clicked.id() != 0:
+                    key = self.id_registry.get_key(double_clicked)
+                    if key is not None and key[1][0] == "subs":
+                        self.open_request = (self.path + (key[1][1], ), False)
+                
+                self._gui_context_menu()
+                self._gui_pin_tooltip(view_model)
+        
+        # undo / redo
+        if self.editable() and imgui.is_window_focused(imgui.FocusedFlags_.root_and_child_windows):
+            if imgui.is_key_chord_pressed(imgui.Key.mod_ctrl | imgui.Key.z) and self.commands.can_undo():
+                self.undo()
+            elif (imgui.is_key_chord_pressed(imgui.Key.mod_ctrl | imgui.Key.y) or imgui.is_key_chord_pressed(imgui.Key.mod_ctrl | imgui.Key.mod_shift | imgui.Key.z)) and self.commands.can_redo():
+                self.redo()
         
         # locate
         if self.gui_is_first_frame:
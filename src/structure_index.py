@@ -0,0 +1,230 @@
+from nodalhdl.core.structure import Structure
+
+import os
+import json
+import mmap
+import struct
+import hashlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from view_model import StructureViewModel
+
+
+"""
+    Index sidecar of a structure file (<file>.nhidx next to it), enough to draw the top level and to browse the
+    instance hierarchy without unpickling the structure:
+        
+        header: magic b"NHIX", version, length of the table of contents, source size, source mtime (ns), source hash
+        table of contents: JSON, {"meta": {...}, "arrays": {name: [dtype, count, offset]}}
+        arrays, 8 byte aligned, little endian
+    
+    The file is memory-mapped and the arrays are views into the mapping, so opening costs one page fault per array
+    touched. An index only counts if the source file still has the recorded size, mtime and hash; the hash covers the
+    first and last HASH_SPAN bytes, reading all of a big file would cost about as much as unpickling it.
+"""
+MAGIC = b"NHIX"
+VERSION = 1
+SUFFIX = ".nhidx"
+HASH_SPAN = 1 << 20
+MAX_HIERARCHY = 1 << 22 # instances, deeper levels of bigger hierarchies are left out (meta "hierarchy_truncated")
+
+_HEADER = struct.Struct("<4sIIIQQ16s")
+
+
+def index_path(source_path: str) -> str:
+    return source_path + SUFFIX
+
+def _source_signature(source_path: str) -> Tuple[int, int, bytes]:
+    st = os.stat(source_path)
+    h = hashlib.blake2b(digest_size = 16)
+    h.update(st.st_size.to_bytes(8, "little"))
+    with open(source_path, "rb") as f:
+        h.update(f.read(HASH_SPAN))
+        if st.st_size > HASH_SPAN:
+            f.seek(max(st.st_size - HASH_SPAN, HASH_SPAN))
+            h.update(f.read(HASH_SPAN))
+    return st.st_size, st.st_mtime_ns, h.digest()
+
+
+"""
+    strings, stored as one utf-8 blob plus offsets
+"""
+class _StringTable:
+    def __init__(self):
+        self.index_of: Dict[str, int] = {}
+        self.strings: List[str] = []
+    
+    def add(self, s: str) -> int:
+        i = self.index_of.get(s)
+        if i is None:
+            i = self.index_of[s] = len(self.strings)
+            self.strings.append(s)
+        return i
+    
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        encoded = [s.encode() for s in self.strings]
+        offsets = np.zeros(len(encoded) + 1, dtype = "<u8")
+        np.cumsum([len(e) for e in encoded], out = offsets[1:])
+        return np.frombuffer(b"".join(encoded), dtype = np.uint8), offsets
+
+
+"""
+    writing, in the loader's worker after a full load
+"""
+def _hierarchy(structure: Structure, strings: _StringTable) -> Tuple[Dict[str, np.ndarray], bool]:
+    # instance tree in depth first preorder, so the subtree of i is i + 1 .. end[i] - 1
+    parents, names, structure_ids, ends = [-1], [strings.add("")], [strings.add(str(structure.id))], [0]
+    stack: List[Tuple[int, Iterator]] = [(0, iter(structure.substructures.items()))]
+    truncated = False
+    while stack:
+        parent, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            ends[parent] = len(parents)
+            stack.pop()
+            continue
+        if len(parents) >= MAX_HIERARCHY:
+            truncated = True
+            continue
+        name, subs = child
+        parents.append(parent)
+        names.append(strings.add(name))
+        structure_ids.append(strings.add(str(subs.id)))
+        ends.append(0)
+        stack.append((len(parents) - 1, iter(subs.substructures.items())))
+    return {
+        "hier_parent": np.array(parents, dtype = "<i4"),
+        "hier_name": np.array(names, dtype = "<u4"),
+        "hier_structure": np.array(structure_ids, dtype = "<u4"),
+        "hier_end": np.array(ends, dtype = "<u4"),
+    }, truncated
+
+def write_index(source_path: str, structure: Structure, view_model: StructureViewModel):
+    size, mtime_ns, digest = _source_signature(source_path)
+    strings = _StringTable()
+    
+    pins = view_model.pins
+    arrays: Dict[str, np.ndarray] = {
+        "node_name": np.array([strings.add(node.name) for node in view_model.nodes], dtype = "<u4"),
+        "node_is_io": np.array([node.is_io for node in view_model.nodes], dtype = np.uint8),
+        "node_pin_start": np.array([0] + [len(node.inputs) + len(node.outputs) for node in view_model.nodes], dtype = "<u4").cumsum(dtype = "<u4"),
+        "pin_label": np.array([strings.add(pin.label) for pin in pins], dtype = "<u4"),
+        "pin_is_input": np.array([pin.is_input for pin in pins], dtype = np.uint8),
+        "pin_type": np.array([strings.add(str(pin.port.signal_type)) for pin in pins], dtype = "<u4"),
+    }
+    links = np.array([link for link in view_model.links if link is not None], dtype = "<u4").reshape(-1, 2)
+    arrays["link_driver"], arrays["link_sink"] = links[:, 0].copy(), links[:, 1].copy()
+    hierarchy, truncated = _hierarchy(structure, strings)
+    arrays.update(hierarchy)
+    arrays["string_blob"], arrays["string_offsets"] = strings.arrays()
+    
+    meta = {"structure_id": str(structure.id), "hierarchy_truncated": truncated}
+    
+    # layout: header, table of contents, arrays; offsets depend on the toc length, so it is padded to a fixed size
+    toc = {"meta": meta, "arrays": {name: [a.dtype.str, int(a.size), 0] for name, a in arrays.items()}}
+    toc_size = len(json.dumps(toc)) + 32 * len(arrays) + 64
+    offset = (_HEADER.size + toc_size + 7) & ~7
+    for name, a in arrays.items():
+        toc["arrays"][name][2] = offset
+        offset = (offset + a.nbytes + 7) & ~7
+    toc_bytes = json.dumps(toc).encode().ljust(toc_size)
+    
+    path = index_path(source_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, toc_size, 0, size, mtime_ns, digest))
+        f.write(toc_bytes)
+        for name, a in arrays.items():
+            f.seek(toc["arrays"][name][2])
+            f.write(np.ascontiguousarray(a).tobytes())
+        f.truncate(offset)
+    os.replace(tmp_path, path)
+
+
+"""
+    reading
+"""
+class StructureIndex:
+    source_path: str
+    meta: dict
+    arrays: Dict[str, np.ndarray] # read-only views into the mapping
+    
+    def __init__(self, source_path: str, mapping: mmap.mmap, meta: dict, arrays: Dict[str, np.ndarray]):
+        self.source_path = source_path
+        self._mapping = mapping
+        self.meta = meta
+        self.arrays = arrays
+        self._strings: Dict[int, str] = {}
+    
+    @property
+    def structure_id(self) -> str:
+        return self.meta["structure_id"]
+    
+    def string(self, i: int) -> str:
+        s = self._strings.get(i)
+        if s is None:
+            offsets = self.arrays["string_offsets"]
+            s = self._strings[i] = bytes(self.arrays["string_blob"][offsets[i]:offsets[i + 1]]).decode()
+        return s
+    
+    def view_model(self) -> StructureViewModel:
+        a = self.arrays
+        node_name, node_is_io, node_pin_start = a["node_name"].tolist(), a["node_is_io"].tolist(), a["node_pin_start"].tolist()
+        pin_label, pin_is_input = a["pin_label"].tolist(), a["pin_is_input"].tolist()
+        nodes = []
+        for i in range(len(node_name)):
+            node_pins = [(self.string(pin_label[p]), bool(pin_is_input[p])) for p in range(node_pin_start[i], node_pin_start[i + 1])]
+            nodes.append((self.string(node_name[i]), bool(node_is_io[i]), node_pins))
+        return StructureViewModel.from_arrays(self.structure_id, nodes, zip(a["link_driver"].tolist(), a["link_sink"].tolist()))
+    
+    def pin_type(self, pin_index: int) -> str:
+        return self.string(int(self.arrays["pin_type"][pin_index]))
+    
+    """
+        instance hierarchy, 0 is the top level structure
+    """
+    def hierarchy_size(self) -> int:
+        return len(self.arrays["hier_parent"])
+    
+    def children(self, i: int) -> Iterator[int]:
+        end = self.arrays["hier_end"]
+        j, stop = i + 1, int(end[i])
+        while j < stop:
+            yield j
+            j = int(end[j])
+    
+    def instance_name(self, i: int) -> str:
+        return self.string(int(self.arrays["hier_name"][i]))
+    
+    def instance_structure_id(self, i: int) -> str:
+        return self.string(int(self.arrays["hier_structure"][i]))
+
+def open_index(source_path: str) -> Optional[StructureIndex]:
+    # None if there is no index or it does not match the source file (any more)
+    path = index_path(source_path)
+    try:
+        with open(path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+    except (OSError, ValueError): # missing, or empty
+        return None
+    
+    arrays = {}
+    try:
+        magic, version, toc_size, _, size, mtime_ns, digest = _HEADER.unpack_from(mapping)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not an index of this version")
+        if (size, mtime_ns, digest) != _source_signature(source_path):
+            raise ValueError("stale index")
+        toc = json.loads(bytes(mapping[_HEADER.size:_HEADER.size + toc_size]))
+        for name, (dtype, count, offset) in toc["arrays"].items():
+            arrays[name] = np.frombuffer(mapping, dtype = np.dtype(dtype), count = count, offset = offset)
+    except (OSError, ValueError, KeyError, TypeError, OverflowError, struct.error): # corrupt, e.g. truncated
+        arrays.clear() # the views created so far export the mapping, it cannot be closed while they exist
+        try:
+            mapping.close()
+        except BufferError: # still exported somewhere, the mapping goes with its last view
+            pass
+        return None
+    return StructureIndex(source_path, mapping, toc["meta"], arrays)
@@ -0,0 +1,348 @@
+from nodalhdl.core.structure import Structure, Net, Node
+from nodalhdl.core.signal import Input, Output
+
+import bisect
+import weakref
+from typing import List, Tuple, Dict, Set, Hashable, Iterable, Optional
+
+
+"""
+    pin: a port of an IO node or of a substructure
+"""
+class PinView:
+    __slots__ = ("key", "port", "label", "is_input", "node_index")
+    
+    key: Hashable # (node key, port full name), stable across frames and reloads
+    port: Node # None when built from a StructureIndex
+    label: str
+    is_input: bool # ed.PinKind.input if True else ed.PinKind.output
+    node_index: int
+    
+    def __init__(self, key: Hashable, port: Node, label: str, is_input: bool, node_index: int):
+        self.key = key
+        self.port = port
+        self.label = label
+        self.is_input = is_input
+        self.node_index = node_index
+
+
+"""
+    node: an IO port of the structure (is_io) or a substructure instance
+"""
+class NodeView:
+    __slots__ = ("key", "name", "is_io", "inputs", "outputs")
+    
+    key: Hashable # ("io", port full name) or ("subs", instance name), stable across frames and reloads
+    name: str # port full name for IO nodes, instance name for substructures
+    is_io: bool
+    inputs: List[int] # indices into StructureViewModel.pins
+    outputs: List[int]
+    
+    def __init__(self, name: str, is_io: bool):
+        self.key = ("io" if is_io else "subs", name)
+        self.name = name
+        self.is_io = is_io
+        self.inputs = []
+        self.outputs = []
+
+
+"""
+    net: one driver pin and its sink pins, nets without a driver in this structure level have no NetView
+"""
+class NetView:
+    __slots__ = ("driver", "sinks", "links")
+    
+    driver: int # pin index
+    sinks: List[int] # pin indices, sorted
+    links: List[int] # link indices, parallel to sinks
+    
+    def __init__(self, driver: int):
+        self.driver = driver
+        self.sinks = []
+        self.links = []
+
+
+"""
+    Flat, precomputed view of one level of a Structure.
+    
+    Built once per Structure and reused every frame, so that the editor only iterates plain lists instead of walking
+    ports_inside_flipped / substructures / nets. It does not observe the structure: whoever modifies the structure
+    must drop the view model (see StructureEditor.invalidate_view_model) so that it is rebuilt on the next frame, or,
+    if only connections changed, update the nets with add_sinks() / remove_pins() (or refresh_ports(), which rebuilds
+    the whole nets of the given ports); substructures added later can be appended with add_substructure().
+    
+    A removed link leaves a None in links until a new link reuses its slot, so that the indices of the other links
+    stay valid and links does not grow with every edit.
+    
+    Can also be built from a StructureIndex (see structure_index) without the Structure; such a view model has no
+    structure and no ports, and is only good for drawing until the structure is loaded.
+"""
+class StructureViewModel:
+    structure: Structure
+    structure_id: str
+    
+    nodes: List[NodeView]
+    pins: List[PinView]
+    links: List[Optional[Tuple[int, int]]] # (driver pin index, sink pin index), None once removed
+    node_links: List[Set[int]] # link indices touching each node
+    
+    nets: Dict[int, NetView] # net index -> net
+    pin_nets: List[int] # net index of each pin, -1 if it is not part of a net
+    link_nets: List[int] # net index of each link
+    pin_index_of_port: Dict[int, int] # id(port) -> pin index, ports are kept alive by the structure
+    _next_net_index: int
+    _free_links: List[int] # indices of the None slots in links
+    
+    io_node_count: int # nodes[:io_node_count] are IO nodes, the rest are substructures
+    
+    def __init__(self, structure: Structure):
+        self._init_empty(structure, structure.id)
+        
+        pin_index_of_port = self.pin_index_of_port
+        nets: Dict[int, Net] = {} # id(net) -> net, insertion ordered
+        
+        def add_pin(node: NodeView, port: Node, label: str, is_input: bool):
+            pin_index = len(self.pins)
+            self.pins.append(PinView((node.key, label), port, label, is_input, len(self.nodes) - 1))
+            (node.inputs if is_input else node.outputs).append(pin_index)
+            pin_index_of_port[id(port)] = pin_index
+            net = port.located_net
+            nets.setdefault(id(net), net)
+        
+        # IOs
+        for port_full_name, port in structure.ports_inside_flipped.nodes():
+            node = NodeView(port_full_name, True)
+            self.nodes.append(node)
+            add_pin(node, port, port_full_name, port.origin_signal_type.belongs(Input))
+        
+        self.io_node_count = len(self.nodes)
+        
+        # substructures
+        for subs_inst_name in structure.substructures.keys():
+            node = NodeView(subs_inst_name, False)
+            self.nodes.append(node)
+            for port_full_name, port in structure.get_subs_ports_outside(subs_inst_name).nodes():
+                if port.origin_signal_type.belongs(Input):
+                    add_pin(node, port, port_full_name, True)
+                elif port.origin_signal_type.belongs(Output):
+                    add_pin(node, port, port_full_name, False)
+        
+        # nets, driver -> sinks
+        self.pin_nets = [-1] * len(self.pins)
+        self.node_links = [set() for _ in self.nodes]
+        for net in nets.values():
+            self._add_net(net)
+    
+    def _init_empty(self, structure: Structure, structure_id: str):
+        self.structure = structure
+        self.structure_id = structure_id
+        
+        self.nodes = []
+        self.pins = []
+        self.links = []
+        self.node_links = []
+        
+        self.nets = {}
+        self.pin_nets = []
+        self.link_nets = []
+        self.pin_index_of_port = {}
+        self._next_net_index = 0
+        self._free_links = []
+    
+    @staticmethod
+    def from_arrays(structure_id: str, nodes: List[Tuple[str, bool, List[Tuple[str, bool]]]], links: Iterable[Tuple[int, int]]) -> "StructureViewModel":
+        # nodes: (name, is_io, [(pin label, is_input), ...]), IO nodes first; links: (driver pin index, sink pin index)
+        view_model = StructureViewModel.__new__(StructureViewModel)
+        view_model._init_empty(None, structure_id)
+        for name, is_io, node_pins in nodes:
+            node = NodeView(name, is_io)
+            view_model.nodes.append(node)
+            for label, is_input in node_pins:
+                pin_index = len(view_model.pins)
+                view_model.pins.append(PinView((node.key, label), None, label, is_input, len(view_model.nodes) - 1))
+                (node.inputs if is_input else node.outputs).append(pin_index)
+        view_model.io_node_count = sum(1 for node in view_model.nodes if node.is_io)
+        
+        view_model.pin_nets = [-1] * len(view_model.pins)
+        view_model.node_links = [set() for _ in view_model.nodes]
+        sinks_of_driver: Dict[int, List[int]] = {}
+        for driver_index, sink_index in links:
+            sinks_of_driver.setdefault(driver_index, []).append(sink_index)
+        for driver_index, sink_indices in sinks_of_driver.items():
+            view_model._add_net_view(driver_index, sink_indices)
+        return view_model
+    
+    def add_substructure(self, subs_inst_name: str) -> int:
+        # appends the node of a substructure added to the structure after the view model was built, returns its index
+        node = NodeView(subs_inst_name, False)
+        self.nodes.append(node)
+        self.node_links.append(set())
+        ports = []
+        for port_full_name, port in self.structure.get_subs_ports_outside(subs_inst_name).nodes():
+            if port.origin_signal_type.belongs(Input):
+                is_input = True
+            elif port.origin_signal_type.belongs(Output):
+                is_input = False
+            else:
+                continue
+            pin_index = len(self.pins)
+            self.pins.append(PinView((node.key, port_full_name), port, port_full_name, is_input, len(self.nodes) - 1))
+            (node.inputs if is_input else node.outputs).append(pin_index)
+            self.pin_index_of_port[id(port)] = pin_index
+            self.pin_nets.append(-1)
+            ports.append(port)
+        self.refresh_ports(ports)
+        return len(self.nodes) - 1
+    
+    def _add_net(self, net: Net):
+        driver_index = self.pin_index_of_port.get(id(net.driver()))
+        if driver_index is None:
+            return
+        
+        sink_indices = []
+        for node in net.nodes_weak:
+            sink_index = self.pin_index_of_port.get(id(node))
+            if sink_index is None or sink_index == driver_index:
+                continue
+            sink_indices.append(sink_index)
+        self._add_net_view(driver_index, sink_indices)
+    
+    def _add_net_view(self, driver_index: int, sink_indices: List[int]):
+        net_index = self._next_net_index
+        self._next_net_index += 1
+        net_view = NetView(driver_index)
+        for pin_index in [driver_index] + sink_indices: # a pin is in one net only
+            if self.pin_nets[pin_index] != -1:
+                self._remove_net(self.pin_nets[pin_index])
+            self.pin_nets[pin_index] = net_index
+        
+        self.nets[net_index] = net_view
+        for sink_index in sorted(sink_indices): # WeakSet order is arbitrary
+            net_view.sinks.append(sink_index)
+            net_view.links.append(self._new_link(net_index, driver_index, sink_index))
+    
+    def _new_link(self, net_index: int, driver_index: int, sink_index: int) -> int:
+        if self._free_links:
+            link_index = self._free_links.pop()
+            self.links[link_index] = (driver_index, sink_index)
+            self.link_nets[link_index] = net_index
+        else:
+            link_index = len(self.links)
+            self.links.append((driver_index, sink_index))
+            self.link_nets.append(net_index)
+        self.node_links[self.pins[driver_index].node_index].add(link_index)
+        self.node_links[self.pins[sink_index].node_index].add(link_index)
+        return link_index
+    
+    def _free_link(self, link_index: int) -> Tuple[int, int]:
+        link = driver_index, sink_index = self.links[link_index]
+        self.links[link_index] = None
+        self.node_links[self.pins[driver_index].node_index].discard(link_index)
+        self.node_links[self.pins[sink_index].node_index].discard(link_index)
+        self._free_links.append(link_index)
+        return link
+    
+    def _remove_net(self, net_index: int) -> List[Tuple[int, int]]:
+        net_view = self.nets.pop(net_index)
+        for pin_index in [net_view.driver] + net_view.sinks:
+            self.pin_nets[pin_index] = -1
+        return [self._free_link(link_index) for link_index in net_view.links]
+    
+    def add_sinks(self, driver_index: int, sink_indices: Iterable[int]):
+        # the pins joined the net of the driver (after connect), which gets a NetView if it had none
+        net_index = self.pin_nets[driver_index]
+        if net_index == -1:
+            self._add_net_view(driver_index, list(sink_indices))
+            return
+        net_view = self.nets[net_index]
+        for sink_index in sink_indices:
+            if self.pin_nets[sink_index] != -1:
+                self._remove_net(self.pin_nets[sink_index])
+            self.pin_nets[sink_index] = net_index
+            position = bisect.bisect_left(net_view.sinks, sink_index)
+            net_view.sinks.insert(position, sink_index)
+            net_view.links.insert(position, self._new_link(net_index, driver_index, sink_index))
+    
+    def remove_pins(self, pin_indices: Iterable[int]) -> List[Tuple[int, int]]:
+        # the pins left their net (before disconnect); if the driver is among them the rest of the net has no driver
+        # any more and loses its NetView too; returns the removed links, (driver pin index, sink pin index)
+        removed = []
+        for pin_index in pin_indices:
+            net_index = self.pin_nets[pin_index]
+            if net_index == -1:
+                continue
+            net_view = self.nets[net_index]
+            if pin_index == net_view.driver:
+                removed.extend(self._remove_net(net_index))
+                continue
+            position = bisect.bisect_left(net_view.sinks, pin_index)
+            del net_view.sinks[position]
+            removed.append(self._free_link(net_view.links.pop(position)))
+            self.pin_nets[pin_index] = -1
+        return removed
+    
+    def refresh_ports(self, ports: Iterable[Node]):
+        # rebuilds the nets of the given ports, including the nets they were part of before, so both merged and split
+        # nets are covered; costs as much as the whole nets, prefer add_sinks() / remove_pins() for single edits
+        pin_indices = {self.pin_index_of_port[id(port)] for port in ports if id(port) in self.pin_index_of_port}
+        for net_index in {self.pin_nets[pin_index] for pin_index in pin_indices} - {-1}:
+            net_view = self.nets[net_index]
+            pin_indices.add(net_view.driver)
+            pin_indices.update(net_view.sinks)
+            self._remove_net(net_index)
+        
+        nets: Dict[int, Net] = {}
+        for pin_index in sorted(pin_indices):
+            net = self.pins[pin_index].port.located_net
+            nets.setdefault(id(net), net)
+        for net in nets.values():
+            self._add_net(net)
+
+
+_shared_view_models: "weakref.WeakValueDictionary[int, StructureViewModel]" = weakref.WeakValueDictionary()
+
+def shared_view_model(structure: Structure) -> StructureViewModel:
+    # one view model per Structure object, for the (read only) editors of substructures: a definition instantiated many
+    # times is built once, while any editor still holds it
+    view_model = _shared_view_models.get(id(structure))
+    if view_model is None or view_model.structure is not structure: # id reused by another object
+        view_model = _shared_view_models[id(structure)] = StructureViewModel(structure)
+    return view_model
+
+
+"""
+    Difference between two view models of (versions of) the same structure, matched by node / pin keys: substructures
+    and IO ports added or removed, pins added or removed, and links (net connections) added or removed.
+"""
+class ViewModelDiff:
+    node_map: List[int] # new node index -> old node index, -1 for added nodes
+    added_nodes: List[int] # indices into the new nodes
+    removed_nodes: List[int] # indices into the old nodes
+    added_pins: List[int] # indices into the new pins
+    removed_pins: List[int] # indices into the old pins
+    added_links: List[Tuple[Hashable, Hashable]] # (driver pin key, sink pin key)
+    removed_links: List[Tuple[Hashable, Hashable]]
+    
+    def __init__(self, old: StructureViewModel, new: StructureViewModel):
+        old_node_index = {node.key: i for i, node in enumerate(old.nodes)}
+        self.node_map = [old_node_index.get(node.key, -1) for node in new.nodes]
+        self.added_nodes = [i for i, old_index in enumerate(self.node_map) if old_index == -1]
+        kept_nodes = set(self.node_map)
+        self.removed_nodes = [i for i in range(len(old.nodes)) if i not in kept_nodes]
+        
+        old_pin_keys = {pin.key for pin in old.pins}
+        new_pin_keys = {pin.key for pin in new.pins}
+        self.added_pins = [i for i, pin in enumerate(new.pins) if pin.key not in old_pin_keys]
+        self.removed_pins = [i for i, pin in enumerate(old.pins) if pin.key not in new_pin_keys]
+        
+        old_links = {(old.pins[d].key, old.pins[s].key) for d, s in filter(None, old.links)}
+        new_links = {(new.pins[d].key, new.pins[s].key) for d, s in filter(None, new.links)}
+        self.added_links = sorted(new_links - old_links, key = repr)
+        self.removed_links = sorted(old_links - new_links, key = repr)
+    
+    def __bool__(self) -> bool:
+        return bool(self.added_nodes or self.removed_nodes or self.added_pins or self.removed_pins or self.added_links or self.removed_links)
+    
+    def summary(self) -> str:
+        return (f"+{len(self.added_nodes)} -{len(self.removed_nodes)} nodes, +{len(self.added_pins)} -{len(self.removed_pins)} pins, "
+            f"+{len(self.added_links)} -{len(self.removed_links)} links")